@@ -0,0 +1,136 @@
+# backend/alembic/versions/0b4d6f8a1c3e_add_row_version.py
+
+"""add row_version to leads and messages for delta sync
+
+Колонка добавляется с DEFAULT 0 (без перезаписи таблицы), существующим
+строкам версии раздаются пачками. PostgreSQL: индекс по секционированной
+messages строится CONCURRENTLY по секциям и подключается к родительскому.
+
+Revision ID: 0b4d6f8a1c3e
+Revises: f1a3c5e7b9d2
+Create Date: 2026-10-19 16:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0b4d6f8a1c3e'
+down_revision: Union[str, None] = 'f1a3c5e7b9d2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH = 10000
+
+TABLES = ('leads', 'messages')
+
+
+def _backfill_postgresql(table: str) -> None:
+    bind = op.get_bind()
+    max_id = bind.execute(sa.text(f"SELECT coalesce(max(id), 0) FROM {table}")).scalar()
+    for start in range(0, max_id + 1, BACKFILL_BATCH):
+        with op.get_context().autocommit_block():
+            bind.execute(sa.text(
+                f"UPDATE {table} SET row_version = nextval('row_version_seq') "
+                f"WHERE id >= :start AND id < :stop"
+            ), {"start": start, "stop": start + BACKFILL_BATCH})
+
+
+def _index_partitioned_messages() -> None:
+    bind = op.get_bind()
+    partitions = bind.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'messages'"
+    )).scalars().all()
+    if not partitions:
+        with op.get_context().autocommit_block():
+            op.execute("CREATE INDEX CONCURRENTLY ix_messages_row_version "
+                       "ON messages (row_version)")
+        return
+
+    op.execute("CREATE INDEX ix_messages_row_version ON ONLY messages (row_version)")
+    for partition in partitions:
+        with op.get_context().autocommit_block():
+            op.execute(f"CREATE INDEX CONCURRENTLY ix_{partition}_row_version "
+                       f"ON {partition} (row_version)")
+        op.execute(f"ALTER INDEX ix_messages_row_version "
+                   f"ATTACH PARTITION ix_{partition}_row_version")
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        op.add_column(table, sa.Column('row_version', sa.BigInteger(), nullable=False,
+                                       server_default='0'))
+
+    if dialect == 'postgresql':
+        op.execute("CREATE SEQUENCE IF NOT EXISTS row_version_seq")
+        op.execute(
+            "CREATE OR REPLACE FUNCTION set_row_version() RETURNS trigger AS $$ "
+            "BEGIN NEW.row_version := nextval('row_version_seq'); RETURN NEW; END "
+            "$$ LANGUAGE plpgsql"
+        )
+        for table in TABLES:
+            op.execute(f"CREATE TRIGGER {table}_row_version BEFORE INSERT OR UPDATE "
+                       f"ON {table} FOR EACH ROW EXECUTE FUNCTION set_row_version()")
+        # После триггеров: строки, вставленные во время бэкфилла, уже с версией
+        for table in TABLES:
+            _backfill_postgresql(table)
+        with op.get_context().autocommit_block():
+            op.execute("CREATE INDEX CONCURRENTLY ix_leads_row_version "
+                       "ON leads (row_version)")
+            op.execute("CREATE INDEX CONCURRENTLY ix_leads_manager_row_version "
+                       "ON leads (assigned_manager_id, row_version)")
+        _index_partitioned_messages()
+        return
+
+    if dialect == 'sqlite':
+        # Версии без пересечений между таблицами: сначала лиды, потом сообщения
+        op.execute("UPDATE leads SET row_version = id")
+        op.execute("UPDATE messages SET row_version = id + "
+                   "(SELECT coalesce(max(id), 0) FROM leads)")
+        op.execute("CREATE TABLE IF NOT EXISTS row_version_counter "
+                   "(id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL)")
+        op.execute("INSERT OR IGNORE INTO row_version_counter (id, value) VALUES (1, 0)")
+        op.execute("UPDATE row_version_counter SET value = max("
+                   "(SELECT coalesce(max(row_version), 0) FROM leads), "
+                   "(SELECT coalesce(max(row_version), 0) FROM messages))")
+        for table in TABLES:
+            bump = (
+                "BEGIN UPDATE row_version_counter SET value = value + 1; "
+                f"UPDATE {table} SET row_version = (SELECT value FROM row_version_counter) "
+                "WHERE id = new.id; END"
+            )
+            op.execute(f"CREATE TRIGGER {table}_row_version_ai AFTER INSERT ON {table} {bump}")
+            op.execute(f"CREATE TRIGGER {table}_row_version_au AFTER UPDATE ON {table} "
+                       f"WHEN new.row_version = old.row_version {bump}")
+
+    op.create_index('ix_leads_row_version', 'leads', ['row_version'])
+    op.create_index('ix_leads_manager_row_version', 'leads',
+                    ['assigned_manager_id', 'row_version'])
+    op.create_index('ix_messages_row_version', 'messages', ['row_version'])
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    op.drop_index('ix_messages_row_version', table_name='messages')
+    op.drop_index('ix_leads_manager_row_version', table_name='leads')
+    op.drop_index('ix_leads_row_version', table_name='leads')
+
+    if dialect == 'postgresql':
+        for table in TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_row_version ON {table}")
+        op.execute("DROP FUNCTION IF EXISTS set_row_version()")
+        op.execute("DROP SEQUENCE IF EXISTS row_version_seq")
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_row_version_au")
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_row_version_ai")
+        op.execute("DROP TABLE IF EXISTS row_version_counter")
+
+    for table in TABLES:
+        op.drop_column(table, 'row_version')
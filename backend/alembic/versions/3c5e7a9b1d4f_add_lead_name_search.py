@@ -0,0 +1,83 @@
+# backend/alembic/versions/3c5e7a9b1d4f_add_lead_name_search.py
+
+"""add trigram search on lead username and name
+
+PostgreSQL: расширение pg_trgm, GIN-индексы gin_trgm_ops и btree-индексы
+text_pattern_ops по lower(username) и lower(имя фамилия); строятся
+CONCURRENTLY, без блокировки записи в leads. SQLite: FTS5-таблица
+leads_search с токенизатором trigram и триггерами.
+
+Revision ID: 3c5e7a9b1d4f
+Revises: 0b4d6f8a1c3e
+Create Date: 2026-10-19 17:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5e7a9b1d4f'
+down_revision: Union[str, None] = '0b4d6f8a1c3e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+USERNAME = "lower(coalesce(telegram_username, ''))"
+FULL_NAME = "lower(coalesce(telegram_first_name, '') || ' ' || coalesce(telegram_last_name, ''))"
+
+POSTGRES_INDEXES = {
+    'ix_leads_username_trgm': f"USING gin ({USERNAME} gin_trgm_ops)",
+    'ix_leads_full_name_trgm': f"USING gin ({FULL_NAME} gin_trgm_ops)",
+    'ix_leads_username_prefix': f"({USERNAME} text_pattern_ops)",
+    'ix_leads_full_name_prefix': f"({FULL_NAME} text_pattern_ops)",
+}
+
+SQLITE_FULL_NAME = ("coalesce(new.telegram_first_name, '') || ' ' || "
+                    "coalesce(new.telegram_last_name, '')")
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        with op.get_context().autocommit_block():
+            for name, definition in POSTGRES_INDEXES.items():
+                op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} "
+                           f"ON leads {definition}")
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE leads_search USING fts5("
+                   "username, full_name, tokenize='trigram')")
+        op.execute(
+            "CREATE TRIGGER leads_search_ai AFTER INSERT ON leads BEGIN "
+            "INSERT INTO leads_search(rowid, username, full_name) VALUES (new.id, "
+            f"coalesce(new.telegram_username, ''), {SQLITE_FULL_NAME}); END"
+        )
+        op.execute(
+            "CREATE TRIGGER leads_search_ad AFTER DELETE ON leads BEGIN "
+            "DELETE FROM leads_search WHERE rowid = old.id; END"
+        )
+        op.execute(
+            "CREATE TRIGGER leads_search_au AFTER UPDATE OF "
+            "telegram_username, telegram_first_name, telegram_last_name ON leads BEGIN "
+            "UPDATE leads_search SET username = coalesce(new.telegram_username, ''), "
+            f"full_name = {SQLITE_FULL_NAME} WHERE rowid = new.id; END"
+        )
+        op.execute(
+            "INSERT INTO leads_search(rowid, username, full_name) "
+            "SELECT id, coalesce(telegram_username, ''), "
+            "coalesce(telegram_first_name, '') || ' ' || coalesce(telegram_last_name, '') "
+            "FROM leads"
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for name in POSTGRES_INDEXES:
+            op.execute(f"DROP INDEX IF EXISTS {name}")
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS leads_search_au")
+        op.execute("DROP TRIGGER IF EXISTS leads_search_ad")
+        op.execute("DROP TRIGGER IF EXISTS leads_search_ai")
+        op.execute("DROP TABLE IF EXISTS leads_search")
@@ -0,0 +1,38 @@
+# backend/alembic/versions/5b7d2c9e4a10_add_realtime_events.py
+
+"""add realtime_events for websocket replay spill
+
+Revision ID: 5b7d2c9e4a10
+Revises: e28495ec07a6
+Create Date: 2026-10-19 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7d2c9e4a10'
+down_revision: Union[str, None] = 'e28495ec07a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('realtime_events',
+    sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('manager_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_realtime_events_manager_id'), 'realtime_events', ['manager_id'], unique=False)
+    op.create_index(op.f('ix_realtime_events_created_at'), 'realtime_events', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_realtime_events_created_at'), table_name='realtime_events')
+    op.drop_index(op.f('ix_realtime_events_manager_id'), table_name='realtime_events')
+    op.drop_table('realtime_events')
@@ -0,0 +1,45 @@
+# backend/alembic/versions/7e3a1f0c5d21_add_messages_keyset_index.py
+
+"""add (lead_id, created_at, id) index for message history pagination
+
+PostgreSQL: индекс строится CONCURRENTLY вне транзакции - messages самая
+большая таблица, и входящие сообщения из Telegram не должны ждать сборки.
+
+Revision ID: 7e3a1f0c5d21
+Revises: 5b7d2c9e4a10
+Create Date: 2026-10-19 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7e3a1f0c5d21'
+down_revision: Union[str, None] = '5b7d2c9e4a10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEX = 'ix_messages_lead_id_created_at_id'
+
+COLUMNS = ['lead_id', 'created_at', 'id']
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.create_index(INDEX, 'messages', COLUMNS, unique=False,
+                            postgresql_concurrently=True)
+    else:
+        op.create_index(INDEX, 'messages', COLUMNS, unique=False)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index(INDEX, table_name='messages', postgresql_concurrently=True)
+    else:
+        op.drop_index(INDEX, table_name='messages')
@@ -0,0 +1,31 @@
+# backend/alembic/versions/8f2a4c6e0b13_add_project_auto_close_after_days.py
+
+"""add per-project auto-close threshold
+
+NULL - автозакрытие выключено: существующие проекты включают его явно, а
+колонка добавляется без перезаписи таблицы и без бэкфилла.
+
+Revision ID: 8f2a4c6e0b13
+Revises: 3c5e7a9b1d4f
+Create Date: 2026-10-19 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f2a4c6e0b13'
+down_revision: Union[str, None] = '3c5e7a9b1d4f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('projects', sa.Column('auto_close_after_days', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('projects', 'auto_close_after_days')
@@ -0,0 +1,86 @@
+# backend/alembic/versions/a4c2e8d1b3f6_add_lead_conversation_summary.py
+
+"""add denormalized conversation summary to leads
+
+Revision ID: a4c2e8d1b3f6
+Revises: 7e3a1f0c5d21
+Create Date: 2026-10-19 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c2e8d1b3f6'
+down_revision: Union[str, None] = '7e3a1f0c5d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Лидов на одну пачку бэкфилла. Каждая пачка - отдельная транзакция, поэтому
+# блокировки держатся недолго, а прерванную миграцию можно перезапустить.
+BACKFILL_BATCH = 1000
+
+PREVIEW_LENGTH = 200
+
+# Последнее сообщение и счетчики берутся по индексу (lead_id, created_at, id).
+# Непрочитанные - сообщения лида после последнего ответа менеджера, только для
+# лидов в статусе "new" (прочие менеджер уже видел).
+BACKFILL_SQL = sa.text(f"""
+UPDATE leads SET
+    message_count = (
+        SELECT count(*) FROM messages m WHERE m.lead_id = leads.id
+    ),
+    last_message_at = (
+        SELECT m.created_at FROM messages m WHERE m.lead_id = leads.id
+        ORDER BY m.created_at DESC, m.id DESC LIMIT 1
+    ),
+    last_message_preview = (
+        SELECT substr(m.text, 1, {PREVIEW_LENGTH}) FROM messages m
+        WHERE m.lead_id = leads.id
+        ORDER BY m.created_at DESC, m.id DESC LIMIT 1
+    ),
+    last_message_sender = (
+        SELECT m.sender FROM messages m WHERE m.lead_id = leads.id
+        ORDER BY m.created_at DESC, m.id DESC LIMIT 1
+    ),
+    unread_count = CASE WHEN leads.status = 'new' THEN (
+        SELECT count(*) FROM messages m
+        WHERE m.lead_id = leads.id AND m.sender = 'lead'
+          AND NOT EXISTS (
+              SELECT 1 FROM messages r
+              WHERE r.lead_id = leads.id AND r.sender = 'manager'
+                AND r.created_at >= m.created_at
+          )
+    ) ELSE 0 END
+WHERE leads.id >= :start AND leads.id < :stop
+""")
+
+
+def upgrade() -> None:
+    op.add_column('leads', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+    op.add_column('leads', sa.Column('last_message_preview', sa.String(length=200), nullable=True))
+    op.add_column('leads', sa.Column('last_message_sender', sa.String(), nullable=True))
+    op.add_column('leads', sa.Column('message_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('leads', sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False))
+
+    bind = op.get_bind()
+    bounds = bind.execute(sa.text("SELECT min(id), max(id) FROM leads")).first()
+    if bounds is None or bounds[0] is None:
+        return
+
+    low, high = bounds
+    with op.get_context().autocommit_block():
+        for start in range(low, high + 1, BACKFILL_BATCH):
+            bind.execute(BACKFILL_SQL, {"start": start,
+                                        "stop": start + BACKFILL_BATCH})
+
+
+def downgrade() -> None:
+    op.drop_column('leads', 'unread_count')
+    op.drop_column('leads', 'message_count')
+    op.drop_column('leads', 'last_message_sender')
+    op.drop_column('leads', 'last_message_preview')
+    op.drop_column('leads', 'last_message_at')
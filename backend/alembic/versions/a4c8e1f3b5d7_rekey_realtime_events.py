@@ -0,0 +1,62 @@
+# backend/alembic/versions/a4c8e1f3b5d7_rekey_realtime_events.py
+
+"""rekey realtime_events on a surrogate id
+
+event_id выдают часы каждого воркера: у двух воркеров он может совпасть, и
+вставка пачки с таким id падала целиком. Теперь event_id - обычная колонка,
+ключ - суррогатный id.
+
+Таблица пересоздается без переноса строк: после перезапуска воркер не
+повторяет события старше своего старта (ReplayBuffer.floor), так что старые
+записи все равно не нужны.
+
+Revision ID: a4c8e1f3b5d7
+Revises: 8f2a4c6e0b13
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4c8e1f3b5d7'
+down_revision: Union[str, None] = '8f2a4c6e0b13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_index(op.f('ix_realtime_events_created_at'), table_name='realtime_events')
+    op.drop_index(op.f('ix_realtime_events_manager_id'), table_name='realtime_events')
+    op.drop_table('realtime_events')
+
+    op.create_table('realtime_events',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('event_id', sa.BigInteger(), nullable=False),
+    sa.Column('manager_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_realtime_events_manager_id_event_id', 'realtime_events',
+                    ['manager_id', 'event_id'], unique=False)
+    op.create_index(op.f('ix_realtime_events_created_at'), 'realtime_events', ['created_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_realtime_events_created_at'), table_name='realtime_events')
+    op.drop_index('ix_realtime_events_manager_id_event_id', table_name='realtime_events')
+    op.drop_table('realtime_events')
+
+    op.create_table('realtime_events',
+    sa.Column('id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('manager_id', sa.Integer(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_realtime_events_manager_id'), 'realtime_events', ['manager_id'], unique=False)
+    op.create_index(op.f('ix_realtime_events_created_at'), 'realtime_events', ['created_at'], unique=False)
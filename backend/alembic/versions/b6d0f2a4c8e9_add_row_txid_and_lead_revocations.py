@@ -0,0 +1,174 @@
+# backend/alembic/versions/b6d0f2a4c8e9_add_row_txid_and_lead_revocations.py
+
+"""add row_txid to synced tables and lead_revocations
+
+row_txid - транзакция, записавшая row_version (PostgreSQL, txid_current()):
+/sync отдает только строки завершенных транзакций, чтобы строка долгой
+транзакции не оказалась ниже уже пройденного курсора. Существующие строки
+получают 0 - их транзакции давно завершены. lead_revocations заполняет триггер
+на смену assigned_manager_id: так /sync сообщает клиенту прежнего менеджера,
+что лид нужно убрать.
+
+Колонки добавляются с DEFAULT 0 без перезаписи таблиц, индексы на PostgreSQL
+строятся CONCURRENTLY (у messages - по секциям).
+
+Revision ID: b6d0f2a4c8e9
+Revises: a4c8e1f3b5d7
+Create Date: 2026-10-19 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d0f2a4c8e9'
+down_revision: Union[str, None] = 'a4c8e1f3b5d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('leads', 'messages')
+
+LEAD_INDEXES = {
+    'ix_leads_row_txid_version': ['row_txid', 'row_version'],
+    'ix_leads_manager_row_txid_version': ['assigned_manager_id', 'row_txid', 'row_version'],
+}
+
+OLD_LEAD_INDEXES = {
+    'ix_leads_row_version': ['row_version'],
+    'ix_leads_manager_row_version': ['assigned_manager_id', 'row_version'],
+}
+
+
+def _set_row_version_function(with_txid: bool) -> None:
+    txid = "NEW.row_txid := txid_current(); " if with_txid else ""
+    op.execute(
+        "CREATE OR REPLACE FUNCTION set_row_version() RETURNS trigger AS $$ "
+        f"BEGIN NEW.row_version := nextval('row_version_seq'); {txid}RETURN NEW; END "
+        "$$ LANGUAGE plpgsql"
+    )
+
+
+def _index_messages(name: str, column_sql: str) -> None:
+    """Индекс messages: по секциям CONCURRENTLY, затем подключается к родительскому"""
+    bind = op.get_bind()
+    partitions = bind.execute(sa.text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = 'messages'"
+    )).scalars().all()
+    if not partitions:
+        with op.get_context().autocommit_block():
+            op.execute(f"CREATE INDEX CONCURRENTLY {name} ON messages ({column_sql})")
+        return
+
+    op.execute(f"CREATE INDEX {name} ON ONLY messages ({column_sql})")
+    for partition in partitions:
+        with op.get_context().autocommit_block():
+            op.execute(f"CREATE INDEX CONCURRENTLY {name}_{partition} "
+                       f"ON {partition} ({column_sql})")
+        op.execute(f"ALTER INDEX {name} ATTACH PARTITION {name}_{partition}")
+
+
+def _replace_lead_indexes(create: dict, drop: dict, concurrently: bool) -> None:
+    if concurrently:
+        with op.get_context().autocommit_block():
+            for name, columns in create.items():
+                op.create_index(name, 'leads', columns, unique=False,
+                                postgresql_concurrently=True)
+            for name in drop:
+                op.drop_index(name, table_name='leads', postgresql_concurrently=True)
+        return
+    for name, columns in create.items():
+        op.create_index(name, 'leads', columns, unique=False)
+    for name in drop:
+        op.drop_index(name, table_name='leads')
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        op.add_column(table, sa.Column('row_txid', sa.BigInteger(), nullable=False,
+                                       server_default='0'))
+    op.create_table('lead_revocations',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('lead_id', sa.Integer(), nullable=False),
+    sa.Column('manager_id', sa.Integer(), nullable=False),
+    sa.Column('row_version', sa.BigInteger(), server_default='0', nullable=False),
+    sa.Column('row_txid', sa.BigInteger(), server_default='0', nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_lead_revocations_manager_row_txid_version', 'lead_revocations',
+                    ['manager_id', 'row_txid', 'row_version'], unique=False)
+
+    if dialect == 'postgresql':
+        _set_row_version_function(with_txid=True)
+        op.execute("CREATE TRIGGER lead_revocations_row_version BEFORE INSERT OR UPDATE "
+                   "ON lead_revocations FOR EACH ROW EXECUTE FUNCTION set_row_version()")
+        op.execute(
+            "CREATE OR REPLACE FUNCTION log_lead_revocation() RETURNS trigger AS $$ "
+            "BEGIN INSERT INTO lead_revocations (lead_id, manager_id) "
+            "VALUES (OLD.id, OLD.assigned_manager_id); RETURN NULL; END "
+            "$$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE TRIGGER leads_revocation AFTER UPDATE OF assigned_manager_id ON leads "
+            "FOR EACH ROW WHEN (OLD.assigned_manager_id IS NOT NULL AND "
+            "OLD.assigned_manager_id IS DISTINCT FROM NEW.assigned_manager_id) "
+            "EXECUTE FUNCTION log_lead_revocation()"
+        )
+        _replace_lead_indexes(LEAD_INDEXES, OLD_LEAD_INDEXES, concurrently=True)
+        _index_messages('ix_messages_row_txid_version', 'row_txid, row_version')
+        op.execute("DROP INDEX ix_messages_row_version")
+        return
+
+    if dialect == 'sqlite':
+        bump = (
+            "BEGIN UPDATE row_version_counter SET value = value + 1; "
+            "UPDATE lead_revocations SET row_version = "
+            "(SELECT value FROM row_version_counter) WHERE id = new.id; END"
+        )
+        op.execute(f"CREATE TRIGGER lead_revocations_row_version_ai "
+                   f"AFTER INSERT ON lead_revocations {bump}")
+        op.execute(f"CREATE TRIGGER lead_revocations_row_version_au "
+                   f"AFTER UPDATE ON lead_revocations "
+                   f"WHEN new.row_version = old.row_version {bump}")
+        op.execute(
+            "CREATE TRIGGER leads_revocation AFTER UPDATE OF assigned_manager_id ON leads "
+            "WHEN old.assigned_manager_id IS NOT NULL "
+            "AND old.assigned_manager_id IS NOT new.assigned_manager_id "
+            "BEGIN INSERT INTO lead_revocations (lead_id, manager_id) "
+            "VALUES (old.id, old.assigned_manager_id); END"
+        )
+
+    _replace_lead_indexes(LEAD_INDEXES, OLD_LEAD_INDEXES, concurrently=False)
+    op.create_index('ix_messages_row_txid_version', 'messages', ['row_txid', 'row_version'])
+    op.drop_index('ix_messages_row_version', table_name='messages')
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'postgresql':
+        op.execute("DROP TRIGGER IF EXISTS leads_revocation ON leads")
+        op.execute("DROP FUNCTION IF EXISTS log_lead_revocation()")
+        _set_row_version_function(with_txid=False)
+        _replace_lead_indexes(OLD_LEAD_INDEXES, LEAD_INDEXES, concurrently=True)
+        _index_messages('ix_messages_row_version', 'row_version')
+        op.execute("DROP INDEX ix_messages_row_txid_version")
+    else:
+        if dialect == 'sqlite':
+            op.execute("DROP TRIGGER IF EXISTS leads_revocation")
+            op.execute("DROP TRIGGER IF EXISTS lead_revocations_row_version_au")
+            op.execute("DROP TRIGGER IF EXISTS lead_revocations_row_version_ai")
+        _replace_lead_indexes(OLD_LEAD_INDEXES, LEAD_INDEXES, concurrently=False)
+        op.create_index('ix_messages_row_version', 'messages', ['row_version'])
+        op.drop_index('ix_messages_row_txid_version', table_name='messages')
+
+    op.drop_index('ix_lead_revocations_manager_row_txid_version',
+                  table_name='lead_revocations')
+    op.drop_table('lead_revocations')
+    for table in TABLES:
+        op.drop_column(table, 'row_txid')
@@ -0,0 +1,31 @@
+# backend/alembic/versions/c8e2a4b6d0f1_add_message_archive_daily_counts.py
+
+"""add per-day message counts to message_archives
+
+Дневная статистика считает и архивные сообщения. Колонка добавляется без
+бэкфилла: для старых архивов (NULL) счетчики берутся из payload.
+
+Revision ID: c8e2a4b6d0f1
+Revises: b6d0f2a4c8e9
+Create Date: 2026-10-19 20:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e2a4b6d0f1'
+down_revision: Union[str, None] = 'b6d0f2a4c8e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('message_archives', sa.Column('daily_counts', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('message_archives', 'daily_counts')
@@ -0,0 +1,211 @@
+# backend/alembic/versions/d2f6b8a0c3e5_partition_messages_and_add_archives.py
+
+"""partition messages by month and add message_archives
+
+message_archives - сжатая переписка давно закрытых лидов (см. app/archive.py).
+
+PostgreSQL: messages переносится в таблицу, секционированную по created_at
+помесячно (messages_yYYYYmMM плюс DEFAULT-секция). Строки копируются пачками
+по id, каждая пачка в своей транзакции. Пока идет копирование, триггер пишет
+id каждой вставленной, измененной и удаленной строки в messages_copy_log; в
+конце под EXCLUSIVE-блокировкой (чтение не блокируется) эти строки заново
+переносятся из старой таблицы и таблицы меняются местами.
+Будущие секции создает python -m app.archive (ensure_partitions).
+SQLite: секционирования нет, создается только message_archives.
+
+Revision ID: d2f6b8a0c3e5
+Revises: c7d9e2f4a8b1
+Create Date: 2026-10-19 15:10:00.000000
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f6b8a0c3e5'
+down_revision: Union[str, None] = 'c7d9e2f4a8b1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COPY_BATCH = 50000
+
+PARTITIONS_AHEAD = 3
+
+COLUMNS = "id, lead_id, sender, text, created_at"
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _create_partitioned_table() -> None:
+    op.execute("""
+        CREATE TABLE messages_partitioned (
+            id integer NOT NULL DEFAULT nextval('messages_id_seq'),
+            lead_id integer NOT NULL REFERENCES leads (id),
+            sender varchar NOT NULL,
+            text text NOT NULL,
+            created_at timestamp NOT NULL DEFAULT now(),
+            search_vector tsvector
+                GENERATED ALWAYS AS (to_tsvector('russian', text)) STORED,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text("SELECT min(created_at) FROM messages")).scalar()
+    now = datetime.utcnow()
+    start = _month_start(oldest or now)
+    last = _month_start(now)
+    for _ in range(PARTITIONS_AHEAD):
+        last = _next_month(last)
+    while start <= last:
+        end = _next_month(start)
+        op.execute(
+            f"CREATE TABLE messages_y{start.year}m{start.month:02d} "
+            f"PARTITION OF messages_partitioned "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        )
+        start = end
+    op.execute("CREATE TABLE messages_default PARTITION OF messages_partitioned DEFAULT")
+
+    # Индексы на пустой таблице строятся мгновенно, на секциях - при вставке
+    op.execute(
+        "CREATE INDEX ix_messages_p_lead_id_created_at_id "
+        "ON messages_partitioned (lead_id, created_at, id)"
+    )
+    op.execute(
+        "CREATE INDEX ix_messages_p_search_vector "
+        "ON messages_partitioned USING gin (search_vector)"
+    )
+    op.execute("CREATE INDEX ix_messages_p_id ON messages_partitioned (id)")
+
+
+def _track_changes(source: str) -> None:
+    """
+    Журнал id строк source, измененных во время копирования
+
+    Ловит то, что не видит копирование по возрастанию id: UPDATE и DELETE уже
+    скопированных строк и вставки, чей id выдан раньше, а коммит прошел позже
+    пачки. CREATE TRIGGER дожидается идущих транзакций записи, поэтому все
+    изменения после него попадают в журнал.
+    """
+    with op.get_context().autocommit_block():
+        op.execute("CREATE TABLE messages_copy_log (id integer NOT NULL)")
+        op.execute(
+            "CREATE FUNCTION messages_copy_log() RETURNS trigger AS $$ "
+            "BEGIN "
+            "IF TG_OP <> 'INSERT' THEN INSERT INTO messages_copy_log VALUES (OLD.id); END IF; "
+            "IF TG_OP <> 'DELETE' THEN INSERT INTO messages_copy_log VALUES (NEW.id); END IF; "
+            "RETURN NULL; END "
+            "$$ LANGUAGE plpgsql"
+        )
+        op.execute(f"CREATE TRIGGER messages_copy_log AFTER INSERT OR UPDATE OR DELETE "
+                   f"ON {source} FOR EACH ROW EXECUTE FUNCTION messages_copy_log()")
+
+
+def _copy(source: str, target: str, created_at: str) -> None:
+    """Копирует source в target пачками по id, каждая пачка - своя транзакция"""
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        with op.get_context().autocommit_block():
+            copied = bind.execute(sa.text(f"""
+                INSERT INTO {target} ({COLUMNS})
+                SELECT id, lead_id, sender, text, {created_at} FROM {source}
+                WHERE id > :last_id ORDER BY id LIMIT :batch
+                RETURNING id
+            """), {"last_id": last_id, "batch": COPY_BATCH}).scalars().all()
+        if not copied:
+            return
+        last_id = max(copied)
+
+
+def _swap(old: str, new: str, created_at: str) -> None:
+    """
+    Перенести строки из журнала и поменять таблицы местами в одной транзакции
+
+    Строка из журнала удаляется из new и копируется из old в текущем виде:
+    так применяются и поздние вставки, и UPDATE, и DELETE.
+    """
+    op.execute(f"LOCK TABLE {old} IN EXCLUSIVE MODE")
+    op.execute("CREATE TEMPORARY TABLE messages_changed ON COMMIT DROP AS "
+               "SELECT DISTINCT id FROM messages_copy_log")
+    op.execute(f"DELETE FROM {new} WHERE id IN (SELECT id FROM messages_changed)")
+    op.execute(f"""
+        INSERT INTO {new} ({COLUMNS})
+        SELECT id, lead_id, sender, text, {created_at} FROM {old}
+        WHERE id IN (SELECT id FROM messages_changed)
+    """)
+    op.execute(f"ALTER SEQUENCE messages_id_seq OWNED BY {new}.id")
+    op.execute(f"DROP TABLE {old}")
+    op.execute("DROP FUNCTION messages_copy_log()")
+    op.execute("DROP TABLE messages_copy_log")
+    op.execute(f"ALTER TABLE {new} RENAME TO messages")
+
+
+def upgrade() -> None:
+    op.create_table(
+        'message_archives',
+        sa.Column('lead_id', sa.Integer(), sa.ForeignKey('leads.id'), primary_key=True),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('first_message_at', sa.DateTime(), nullable=True),
+        sa.Column('last_message_at', sa.DateTime(), nullable=True),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=True),
+    )
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    # payload уже сжат zlib - TOAST не должен пытаться сжимать его еще раз
+    op.execute("ALTER TABLE message_archives ALTER COLUMN payload SET STORAGE EXTERNAL")
+
+    _create_partitioned_table()
+    _track_changes("messages")
+    _copy("messages", "messages_partitioned", "coalesce(created_at, now())")
+    _swap("messages", "messages_partitioned", "coalesce(created_at, now())")
+
+    op.execute("ALTER INDEX ix_messages_p_lead_id_created_at_id "
+               "RENAME TO ix_messages_lead_id_created_at_id")
+    op.execute("ALTER INDEX ix_messages_p_search_vector RENAME TO ix_messages_search_vector")
+    op.execute("ALTER INDEX ix_messages_p_id RENAME TO ix_messages_id")
+    op.execute("ALTER TABLE messages "
+               "RENAME CONSTRAINT messages_partitioned_pkey TO messages_pkey")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("""
+            CREATE TABLE messages_plain (
+                id integer NOT NULL DEFAULT nextval('messages_id_seq') PRIMARY KEY,
+                lead_id integer NOT NULL REFERENCES leads (id),
+                sender varchar NOT NULL,
+                text text NOT NULL,
+                created_at timestamp,
+                search_vector tsvector
+                    GENERATED ALWAYS AS (to_tsvector('russian', text)) STORED
+            )
+        """)
+        _track_changes("messages")
+        _copy("messages", "messages_plain", "created_at")
+        _swap("messages", "messages_plain", "created_at")
+        op.execute("ALTER TABLE messages RENAME CONSTRAINT messages_plain_pkey TO messages_pkey")
+        op.execute("CREATE INDEX ix_messages_id ON messages (id)")
+        op.execute(
+            "CREATE INDEX ix_messages_lead_id_created_at_id "
+            "ON messages (lead_id, created_at, id)"
+        )
+        op.execute(
+            "CREATE INDEX ix_messages_search_vector ON messages USING gin (search_vector)"
+        )
+
+    op.drop_table('message_archives')
@@ -0,0 +1,45 @@
+# backend/alembic/versions/f1a3c5e7b9d2_add_leads_inbox_indexes.py
+
+"""add composite indexes for leads inbox keyset pagination
+
+На PostgreSQL индексы строятся CONCURRENTLY, без блокировки записи в leads.
+
+Revision ID: f1a3c5e7b9d2
+Revises: d2f6b8a0c3e5
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1a3c5e7b9d2'
+down_revision: Union[str, None] = 'd2f6b8a0c3e5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = {
+    'ix_leads_manager_status_updated': ['assigned_manager_id', 'status', 'last_updated_at', 'id'],
+    'ix_leads_manager_updated': ['assigned_manager_id', 'last_updated_at', 'id'],
+    'ix_leads_manager_created': ['assigned_manager_id', 'created_at', 'id'],
+    'ix_leads_status_updated': ['status', 'last_updated_at', 'id'],
+    'ix_leads_created_id': ['created_at', 'id'],
+}
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, columns in INDEXES.items():
+                op.create_index(name, 'leads', columns, unique=False,
+                                postgresql_concurrently=True)
+    else:
+        for name, columns in INDEXES.items():
+            op.create_index(name, 'leads', columns, unique=False)
+
+
+def downgrade() -> None:
+    for name in INDEXES:
+        op.drop_index(name, table_name='leads')
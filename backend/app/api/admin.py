@@ -1,14 +1,18 @@
 # backend/app/api/admin.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List
-from datetime import datetime
+from datetime import date, datetime
+from .. import fast_json
 from ..database import get_db
-from ..models import User, Bot, Project, Lead
+from ..models import User, Bot, Project, Lead, project_managers
 from ..auth import require_admin, get_password_hash
 from ..telegram_handler import set_telegram_webhook
+from ..export import MEDIA_TYPES, export_stream, filename
 
 router = APIRouter(prefix="/admin")
 
@@ -58,6 +62,7 @@ class ProjectResponse(BaseModel):
     id: int
     name: str
     created_at: datetime
+    auto_close_after_days: int | None = None
 
     class Config:
         from_attributes = True
@@ -69,6 +74,8 @@ class ProjectWithManagersResponse(ProjectResponse):
 
 class ProjectCreate(BaseModel):
     name: str
+    # None или 0 - автозакрытие выключено
+    auto_close_after_days: int | None = Field(None, ge=0)
 
 
 class AddManagersRequest(BaseModel):
@@ -89,6 +96,18 @@ class BotResponse(BaseModel):
         from_attributes = True
 
 
+class ConnectionStats(BaseModel):
+    connection_id: str
+    manager_id: int
+    transport: str
+    queue_size: int
+    queue_capacity: int
+    high_water: int
+    overflows: int
+    subprotocol: str | None = None
+    projects: List[int] = []
+
+
 class BotCreate(BaseModel):
     identifier: str
     name: str
@@ -106,6 +125,25 @@ class BotUpdate(BaseModel):
 
 # ========== MANAGERS ==========
 
+def managers_fast(db: Session) -> List[dict]:
+    """Список для get_managers двумя запросами по колонкам, без ORM-объектов"""
+    projects_by_user = {}
+    for user_id, project_id, project_name in db.execute(
+            select(project_managers.c.user_id, Project.id, Project.name)
+            .join(Project, Project.id == project_managers.c.project_id)
+            .order_by(Project.id)):
+        projects_by_user.setdefault(user_id, []).append({"id": project_id, "name": project_name})
+
+    users = fast_json.rows_to_dicts(db.execute(
+        select(User.id, User.username, User.role, User.full_name, User.is_active,
+               User.created_at).order_by(User.id)
+    ).all())
+    for user in users:
+        user["projects"] = (projects_by_user.get(user["id"], [])
+                            if user["role"] == "manager" else [])
+    return users
+
+
 @router.get(
     "/managers",
     response_model=List[ManagerResponse],
@@ -117,6 +155,9 @@ async def get_managers(
         current_user: User = Depends(require_admin),
         db: Session = Depends(get_db)
 ):
+    if fast_json.enabled():
+        return fast_json.json_response(managers_fast(db))
+
     users = db.query(User).order_by(User.id).all()
 
     result = []
@@ -280,6 +321,7 @@ async def get_project(
         "id": project.id,
         "name": project.name,
         "created_at": project.created_at,
+        "auto_close_after_days": project.auto_close_after_days,
         "managers": [
             {"id": m.id, "username": m.username, "full_name": m.full_name}
             for m in project.managers
@@ -303,7 +345,8 @@ async def create_project(
     if existing:
         raise HTTPException(status_code=400, detail="Project already exists")
 
-    new_project = Project(name=project_data.name, created_at=datetime.utcnow())
+    new_project = Project(name=project_data.name, created_at=datetime.utcnow(),
+                          auto_close_after_days=project_data.auto_close_after_days)
     db.add(new_project)
     db.commit()
     db.refresh(new_project)
@@ -316,7 +359,7 @@ async def create_project(
     response_model=ProjectResponse,
     tags=["Admin - Projects"],
     summary="Обновить проект",
-    description="Обновляет название проекта"
+    description="Обновляет название проекта и порог автозакрытия лидов"
 )
 async def update_project(
         project_id: int,
@@ -336,6 +379,8 @@ async def update_project(
         raise HTTPException(status_code=400, detail="Project name already exists")
 
     project.name = project_data.name
+    if "auto_close_after_days" in project_data.model_fields_set:
+        project.auto_close_after_days = project_data.auto_close_after_days
     db.commit()
     db.refresh(project)
 
@@ -576,4 +621,51 @@ async def delete_bot(
     db.delete(bot)
     db.commit()
 
-    return {"status": "deleted", "bot_id": bot_id}
\ No newline at end of file
+    return {"status": "deleted", "bot_id": bot_id}
+
+
+# ========== REALTIME ==========
+
+@router.get(
+    "/realtime/connections",
+    response_model=List[ConnectionStats],
+    tags=["Admin - Realtime"],
+    summary="Состояние WebSocket-подключений",
+    description="Очереди отправки подключений этого воркера: текущий размер, "
+                "максимум (high-water) и число переполнений"
+)
+async def get_realtime_connections(
+        current_user: User = Depends(require_admin)
+):
+    from ..websocket import manager as ws_manager
+    return ws_manager.stats()
+
+
+# ========== EXPORT ==========
+
+@router.get(
+    "/export",
+    tags=["Admin - Export"],
+    summary="Выгрузка лидов с перепиской",
+    description="Потоковая выгрузка в NDJSON (лид на строку) или CSV (сообщение на "
+                "строку), опционально gzip. Фильтры: проект, бот, статус и дата "
+                "создания лида (включительно)"
+)
+async def export_leads(
+        format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+        gzip: bool = False,
+        project_id: int | None = None,
+        bot_id: int | None = None,
+        status: str | None = None,
+        date_from: date | None = None,
+        date_to: date | None = None,
+        current_user: User = Depends(require_admin)
+):
+    # Без Depends(get_db): поток открывает свою сессию на время выгрузки
+    stream = export_stream(format, gzip, project_id=project_id, bot_id=bot_id,
+                           status=status, date_from=date_from, date_to=date_to)
+    return StreamingResponse(
+        stream,
+        media_type="application/gzip" if gzip else MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename(format, gzip)}"'}
+    )
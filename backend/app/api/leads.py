@@ -1,16 +1,31 @@
 # backend/app/api/leads.py
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import and_, not_, select, tuple_, update
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Tuple
 from datetime import datetime
+import base64
+from .. import fast_json
 from ..database import get_db
-from ..models import User, Lead
-from ..auth import require_manager
+from ..models import User, Lead, Project, project_managers
+from ..auth import require_manager, require_admin
+from ..etag import check_lead_etag
+from ..lead_search import search_leads
+from ..lead_summary import reset_unread
+from ..websocket import manager as ws_manager
 
 router = APIRouter(prefix="/leads", tags=["leads"])
 
+MAX_PAGE_SIZE = 200
+
+MAX_BULK_IDS = 1000
+
+MAX_SEARCH_RESULTS = 50
+
+SORT_COLUMNS = {"created_at": Lead.created_at, "last_updated_at": Lead.last_updated_at}
+
 
 class LeadResponse(BaseModel):
     id: int
@@ -25,65 +40,78 @@ class LeadResponse(BaseModel):
     status: str
     created_at: datetime
     last_updated_at: datetime
+    last_message_at: datetime | None = None
+    last_message_preview: str | None = None
+    last_message_sender: str | None = None
+    message_count: int = 0
+    unread_count: int = 0
 
     class Config:
         from_attributes = True
 
 
-@router.get("", response_model=List[LeadResponse])
-async def get_leads(
-        status: str | None = None,
-        current_user: User = Depends(require_manager),
-        db: Session = Depends(get_db)
-):
-    """Получить список лидов"""
-    query = db.query(Lead)
+class LeadFilter(BaseModel):
+    status: List[str] | None = None
+    project_id: int | None = None
+    bot_id: int | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+    updated_from: datetime | None = None
+    updated_to: datetime | None = None
+
 
+def lead_conditions(current_user: User, lead_filter: LeadFilter | None = None) -> list:
+    """Условия WHERE: доступ по роли плюс фильтр; общие для списка и массовых операций"""
+    conditions = []
     if current_user.role == "manager":
-        query = query.filter(Lead.assigned_manager_id == current_user.id)
-
-    if status:
-        query = query.filter(Lead.status == status)
-
-    leads = query.order_by(Lead.created_at.desc()).all()
-
-    result = []
-    for lead in leads:
-        lead_dict = {
-            "id": lead.id,
-            "telegram_chat_id": lead.telegram_chat_id,
-            "telegram_username": lead.telegram_username,
-            "telegram_first_name": lead.telegram_first_name,
-            "telegram_last_name": lead.telegram_last_name,
-            "bot_id": lead.bot_id,
-            "project_id": lead.project_id,
-            "project_name": lead.project.name,
-            "assigned_manager_id": lead.assigned_manager_id,
-            "status": lead.status,
-            "created_at": lead.created_at,
-            "last_updated_at": lead.last_updated_at
-        }
-        result.append(lead_dict)
-
-    return result
+        conditions.append(Lead.assigned_manager_id == current_user.id)
+    if lead_filter is None:
+        return conditions
 
+    if lead_filter.status:
+        conditions.append(Lead.status.in_(lead_filter.status))
+    if lead_filter.project_id is not None:
+        conditions.append(Lead.project_id == lead_filter.project_id)
+    if lead_filter.bot_id is not None:
+        conditions.append(Lead.bot_id == lead_filter.bot_id)
+    if lead_filter.created_from is not None:
+        conditions.append(Lead.created_at >= lead_filter.created_from)
+    if lead_filter.created_to is not None:
+        conditions.append(Lead.created_at < lead_filter.created_to)
+    if lead_filter.updated_from is not None:
+        conditions.append(Lead.last_updated_at >= lead_filter.updated_from)
+    if lead_filter.updated_to is not None:
+        conditions.append(Lead.last_updated_at < lead_filter.updated_to)
+    return conditions
 
-@router.get("/{lead_id}", response_model=LeadResponse)
-async def get_lead(
-        lead_id: int,
-        current_user: User = Depends(require_manager),
-        db: Session = Depends(get_db)
-):
-    """Получить детали лида"""
-    lead = db.query(Lead).filter(Lead.id == lead_id).first()
 
-    if not lead:
-        raise HTTPException(status_code=404, detail="Lead not found")
+def encode_cursor(value: datetime, lead_id: int) -> str:
+    raw = f"{value.isoformat()}|{lead_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-    if current_user.role == "manager":
-        if lead.assigned_manager_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Access denied")
 
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """ValueError, если курсор поврежден"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        value, lead_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(value), int(lead_id)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+# Колонки LeadResponse для быстрого пути (fast_json): без ORM-объектов
+LEAD_COLUMNS = (
+    Lead.id, Lead.telegram_chat_id, Lead.telegram_username, Lead.telegram_first_name,
+    Lead.telegram_last_name, Lead.bot_id, Lead.project_id,
+    Project.name.label("project_name"), Lead.assigned_manager_id, Lead.status,
+    Lead.created_at, Lead.last_updated_at, Lead.last_message_at,
+    Lead.last_message_preview, Lead.last_message_sender, Lead.message_count,
+    Lead.unread_count,
+)
+
+
+def lead_to_dict(lead: Lead, project_name: str) -> dict:
     return {
         "id": lead.id,
         "telegram_chat_id": lead.telegram_chat_id,
@@ -92,14 +120,119 @@ async def get_lead(
         "telegram_last_name": lead.telegram_last_name,
         "bot_id": lead.bot_id,
         "project_id": lead.project_id,
-        "project_name": lead.project.name,
+        "project_name": project_name,
         "assigned_manager_id": lead.assigned_manager_id,
         "status": lead.status,
         "created_at": lead.created_at,
-        "last_updated_at": lead.last_updated_at
+        "last_updated_at": lead.last_updated_at,
+        "last_message_at": lead.last_message_at,
+        "last_message_preview": lead.last_message_preview,
+        "last_message_sender": lead.last_message_sender,
+        "message_count": lead.message_count,
+        "unread_count": lead.unread_count
     }
 
 
+@router.get("", response_model=List[LeadResponse])
+async def get_leads(
+        response: Response,
+        status: List[str] | None = Query(None),
+        project_id: int | None = None,
+        bot_id: int | None = None,
+        created_from: datetime | None = None,
+        created_to: datetime | None = None,
+        updated_from: datetime | None = None,
+        updated_to: datetime | None = None,
+        sort: str = Query("created_at", pattern="^(created_at|last_updated_at)$"),
+        limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        cursor: str | None = None,
+        current_user: User = Depends(require_manager),
+        db: Session = Depends(get_db)
+):
+    """
+    Получить список лидов
+
+    Сортировка по sort (created_at или last_updated_at), новые сверху.
+    status можно передать несколько раз. С limit отдается страница, курсор
+    следующей - в заголовке X-Next-Cursor; без limit - все лиды.
+    """
+    sort_column = SORT_COLUMNS[sort]
+    lead_filter = LeadFilter(status=status, project_id=project_id, bot_id=bot_id,
+                             created_from=created_from, created_to=created_to,
+                             updated_from=updated_from, updated_to=updated_to)
+    conditions = lead_conditions(current_user, lead_filter)
+
+    if cursor is not None:
+        try:
+            value, lead_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        conditions.append(tuple_(sort_column, Lead.id) < tuple_(value, lead_id))
+
+    fast = fast_json.enabled()
+    query = select(*LEAD_COLUMNS) if fast else select(Lead, Project.name)
+    query = query.join(Project, Project.id == Lead.project_id).where(
+        *conditions
+    ).order_by(sort_column.desc(), Lead.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    rows = db.execute(query).all()
+
+    if limit is not None and len(rows) == limit:
+        last = rows[-1] if fast else rows[-1][0]
+        response.headers["X-Next-Cursor"] = encode_cursor(getattr(last, sort), last.id)
+
+    if fast:
+        return fast_json.json_response(fast_json.rows_to_dicts(rows), response)
+    return [lead_to_dict(lead, project_name) for lead, project_name in rows]
+
+
+@router.get("/search", response_model=List[LeadResponse])
+async def search(
+        q: str = Query(..., min_length=1, max_length=100),
+        limit: int = Query(20, ge=1, le=MAX_SEARCH_RESULTS),
+        current_user: User = Depends(require_manager),
+        db: Session = Depends(get_db)
+):
+    """
+    Поиск лидов по telegram username и имени
+
+    Сначала лиды, у которых username или имя начинаются с q, затем
+    содержащие q. Запрос короче трех символов ищется только как префикс.
+    Менеджер ищет только среди своих лидов.
+    """
+    manager_id = current_user.id if current_user.role == "manager" else None
+    lead_ids = search_leads(db, q, limit, manager_id=manager_id)
+    if not lead_ids:
+        return []
+
+    rows = db.query(Lead, Project.name).join(
+        Project, Project.id == Lead.project_id
+    ).filter(Lead.id.in_(lead_ids)).all()
+    by_id = {lead.id: (lead, project_name) for lead, project_name in rows}
+    return [lead_to_dict(*by_id[lead_id]) for lead_id in lead_ids if lead_id in by_id]
+
+
+@router.get("/{lead_id}", response_model=LeadResponse)
+async def get_lead(
+        lead_id: int,
+        request: Request,
+        response: Response,
+        current_user: User = Depends(require_manager),
+        db: Session = Depends(get_db)
+):
+    """Получить детали лида (поддерживает If-None-Match)"""
+    not_modified = check_lead_etag(db, lead_id, current_user, request, response)
+    if not_modified:
+        return not_modified
+
+    lead, project_name = db.query(Lead, Project.name).join(
+        Project, Project.id == Lead.project_id
+    ).filter(Lead.id == lead_id).first()
+
+    return lead_to_dict(lead, project_name)
+
+
 @router.put("/{lead_id}/mark-read")
 async def mark_lead_as_read(
         lead_id: int,
@@ -119,10 +252,20 @@ async def mark_lead_as_read(
     if lead.status == "closed":
         raise HTTPException(status_code=400, detail="Cannot mark closed lead as read")
 
+    status_changed = lead.status != "read"
     lead.status = "read"
+    reset_unread(lead)
     lead.last_updated_at = datetime.utcnow()
     db.commit()
 
+    if status_changed:
+        await ws_manager.notify_lead_status(
+            lead_id=lead.id,
+            manager_id=lead.assigned_manager_id,
+            status="read",
+            project_id=lead.project_id
+        )
+
     return {"status": "read", "lead_id": lead_id}
 
 
@@ -142,9 +285,214 @@ async def close_lead(
         if lead.assigned_manager_id != current_user.id:
             raise HTTPException(status_code=403, detail="Access denied")
 
+    status_changed = lead.status != "closed"
     lead.status = "closed"
     lead.closed_at = datetime.utcnow()
     lead.last_updated_at = datetime.utcnow()
     db.commit()
 
-    return {"status": "closed", "lead_id": lead_id}
\ No newline at end of file
+    if status_changed:
+        await ws_manager.notify_lead_status(
+            lead_id=lead.id,
+            manager_id=lead.assigned_manager_id,
+            status="closed",
+            project_id=lead.project_id
+        )
+
+    return {"status": "closed", "lead_id": lead_id}
+
+# ========== BULK ==========
+
+class BulkLeadsRequest(BaseModel):
+    """
+    Либо lead_ids, либо непустой filter (как у GET /leads)
+
+    По фильтру за один запрос обновляется не больше MAX_BULK_IDS лидов;
+    has_more в ответе - повторить тот же запрос для следующей порции.
+    """
+    lead_ids: List[int] | None = Field(None, min_length=1, max_length=MAX_BULK_IDS)
+    filter: LeadFilter | None = None
+
+
+class BulkReassignRequest(BulkLeadsRequest):
+    manager_id: int
+
+
+class BulkResult(BaseModel):
+    lead_id: int
+    result: str
+
+
+class BulkResponse(BaseModel):
+    action: str
+    updated: int
+    results: List[BulkResult]
+    has_more: bool = False
+
+
+def _bulk_target(current_user: User, request: BulkLeadsRequest, *extra) -> list:
+    """
+    Условия WHERE массовой операции; extra - условия самой операции
+
+    Фильтр ограничен первыми MAX_BULK_IDS подходящими лидами по id: обновленные
+    перестают подходить под extra, так что повторный запрос берет следующие.
+    """
+    if (request.lead_ids is None) == (request.filter is None):
+        raise HTTPException(status_code=400, detail="Use either lead_ids or filter")
+    if request.lead_ids is not None:
+        return lead_conditions(current_user) + [Lead.id.in_(request.lead_ids), *extra]
+    if not any(value not in (None, []) for value in request.filter.model_dump().values()):
+        raise HTTPException(status_code=400, detail="Filter must not be empty")
+    chunk = (
+        select(Lead.id)
+        .where(*lead_conditions(current_user, request.filter), *extra)
+        .order_by(Lead.id)
+        .limit(MAX_BULK_IDS)
+    )
+    return [Lead.id.in_(chunk)]
+
+
+def _has_more(request: BulkLeadsRequest, updated: int) -> bool:
+    return request.filter is not None and updated >= MAX_BULK_IDS
+
+
+def _bulk_results(db: Session, current_user: User, request: BulkLeadsRequest,
+                  updated: List[int], success: str, reason) -> List[dict]:
+    """
+    Результат по каждому id: success для обновленных, для остальных - почему нет
+
+    reason(lead) объясняет, почему видимый пользователю лид не подошел.
+    Для фильтра отчитываемся только об обновленных.
+    """
+    results = [{"lead_id": lead_id, "result": success} for lead_id in updated]
+    if request.lead_ids is None:
+        return results
+
+    skipped = set(request.lead_ids) - set(updated)
+    leads = {
+        lead.id: lead for lead in db.query(
+            Lead.id, Lead.assigned_manager_id, Lead.status, Lead.project_id
+        ).filter(Lead.id.in_(skipped))
+    } if skipped else {}
+    for lead_id in sorted(skipped):
+        lead = leads.get(lead_id)
+        if lead is None:
+            result = "not_found"
+        elif current_user.role == "manager" and lead.assigned_manager_id != current_user.id:
+            result = "forbidden"
+        else:
+            result = reason(lead)
+        results.append({"lead_id": lead_id, "result": result})
+    return results
+
+
+@router.post("/bulk/close", response_model=BulkResponse)
+async def bulk_close_leads(
+        request: BulkLeadsRequest,
+        current_user: User = Depends(require_manager),
+        db: Session = Depends(get_db)
+):
+    """Закрыть лиды списком или по фильтру одним UPDATE"""
+    now = datetime.utcnow()
+    rows = db.execute(
+        update(Lead)
+        .where(*_bulk_target(current_user, request, Lead.status != "closed"))
+        .values(status="closed", closed_at=now, last_updated_at=now)
+        .returning(Lead.id, Lead.assigned_manager_id, Lead.project_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+
+    await ws_manager.notify_bulk([
+        (row.assigned_manager_id, row.project_id,
+         {"type": "lead_status", "lead_id": row.id, "status": "closed"})
+        for row in rows
+    ])
+
+    results = _bulk_results(db, current_user, request, [row.id for row in rows],
+                            "closed", lambda lead: "already_closed")
+    return {"action": "close", "updated": len(rows), "results": results,
+            "has_more": _has_more(request, len(rows))}
+
+
+@router.post("/bulk/mark-read", response_model=BulkResponse)
+async def bulk_mark_leads_read(
+        request: BulkLeadsRequest,
+        current_user: User = Depends(require_manager),
+        db: Session = Depends(get_db)
+):
+    """Пометить лиды прочитанными списком или по фильтру одним UPDATE"""
+    rows = db.execute(
+        update(Lead)
+        .where(*_bulk_target(current_user, request,
+                             Lead.status != "closed",
+                             not_(and_(Lead.status == "read", Lead.unread_count == 0))))
+        .values(status="read", unread_count=0, last_updated_at=datetime.utcnow())
+        .returning(Lead.id, Lead.assigned_manager_id, Lead.project_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+    db.commit()
+
+    await ws_manager.notify_bulk([
+        (row.assigned_manager_id, row.project_id,
+         {"type": "lead_status", "lead_id": row.id, "status": "read"})
+        for row in rows
+    ])
+
+    results = _bulk_results(
+        db, current_user, request, [row.id for row in rows], "read",
+        lambda lead: "lead_closed" if lead.status == "closed" else "unchanged")
+    return {"action": "mark_read", "updated": len(rows), "results": results,
+            "has_more": _has_more(request, len(rows))}
+
+
+@router.post("/bulk/reassign", response_model=BulkResponse)
+async def bulk_reassign_leads(
+        request: BulkReassignRequest,
+        current_user: User = Depends(require_admin),
+        db: Session = Depends(get_db)
+):
+    """Переназначить лиды другому менеджеру (только для админа)"""
+    target = db.query(User).filter(
+        User.id == request.manager_id,
+        User.role == "manager",
+        User.is_active == True
+    ).first()
+    if not target:
+        raise HTTPException(status_code=404, detail="Manager not found")
+
+    target_projects = select(project_managers.c.project_id).where(
+        project_managers.c.user_id == target.id)
+    conditions = _bulk_target(current_user, request,
+                              Lead.assigned_manager_id != target.id,
+                              Lead.project_id.in_(target_projects))
+
+    # RETURNING отдает только новые значения: прежних менеджеров читаем под
+    # блокировкой строк, чтобы между чтением и UPDATE их никто не поменял
+    previous = dict(db.query(Lead.id, Lead.assigned_manager_id).filter(
+        *conditions).with_for_update().all())
+    rows = []
+    if previous:
+        rows = db.execute(
+            update(Lead)
+            .where(Lead.id.in_(previous))
+            .values(assigned_manager_id=target.id, last_updated_at=datetime.utcnow())
+            .returning(Lead.id, Lead.project_id)
+            .execution_options(synchronize_session=False)
+        ).all()
+    db.commit()
+
+    events = []
+    for row in rows:
+        event = {"type": "lead_reassigned", "lead_id": row.id,
+                 "from_manager_id": previous[row.id], "to_manager_id": target.id}
+        events.append((target.id, row.project_id, event))
+        events.append((previous[row.id], row.project_id, event))
+    await ws_manager.notify_bulk(events)
+
+    results = _bulk_results(
+        db, current_user, request, [row.id for row in rows], "reassigned",
+        lambda lead: "unchanged" if lead.assigned_manager_id == target.id
+        else "manager_not_in_project")
+    return {"action": "reassign", "updated": len(rows), "results": results,
+            "has_more": _has_more(request, len(rows))}
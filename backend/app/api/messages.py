@@ -1,18 +1,35 @@
 # backend/app/api/messages.py
 
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import (APIRouter, Depends, HTTPException, Query, Request, Response,
+                     WebSocket, WebSocketDisconnect)
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import List
 from datetime import datetime
+from functools import partial
 import json
-from ..database import get_db
+import logging
+from .. import fast_json
+from ..database import get_db, session_scope
 from ..models import User, Lead, Message, Bot
-from ..auth import require_manager
+from ..auth import require_manager, authenticate_websocket_token
+from ..archive import load_archived
+from ..etag import check_lead_etag
+from ..lead_summary import apply_message
+from ..search import search_messages
 from ..telegram_handler import send_telegram_message
+from ..send_pipeline import KeyedPipeline
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
+logger = logging.getLogger(__name__)
+
+MAX_PAGE_SIZE = 500
+
+# Отправки из чат-сокетов: по порядку внутри лида, параллельно между лидами
+send_pipeline = KeyedPipeline()
+
 
 class MessageResponse(BaseModel):
     id: int
@@ -24,30 +41,139 @@ class MessageResponse(BaseModel):
         from_attributes = True
 
 
+# Колонки MessageResponse для быстрого пути (fast_json)
+MESSAGE_COLUMNS = (Message.id, Message.sender, Message.text, Message.created_at)
+
+
+def message_to_dict(message) -> dict:
+    """Строка MESSAGE_COLUMNS или объект Message из архива"""
+    return {"id": message.id, "sender": message.sender, "text": message.text,
+            "created_at": message.created_at}
+
+
 class SendMessageRequest(BaseModel):
     text: str
 
 
-@router.get("/{lead_id}", response_model=List[MessageResponse])
-async def get_messages(
-        lead_id: int,
+class MessageSearchResult(BaseModel):
+    id: int
+    lead_id: int
+    sender: str
+    created_at: datetime
+    score: float
+    snippet: str
+
+
+@router.get("/search", response_model=List[MessageSearchResult])
+async def search(
+        response: Response,
+        q: str = Query(..., min_length=1, max_length=200),
+        lead_id: int | None = None,
+        limit: int = Query(20, ge=1, le=100),
+        cursor: str | None = None,
         current_user: User = Depends(require_manager),
         db: Session = Depends(get_db)
 ):
-    """Получить историю сообщений лида"""
-    lead = db.query(Lead).filter(Lead.id == lead_id).first()
-
-    if not lead:
-        raise HTTPException(status_code=404, detail="Lead not found")
+    """
+    Полнотекстовый поиск по сообщениям
+
+    Менеджер ищет только по своим лидам, админ - по всем. Результаты по
+    убыванию релевантности; совпадения в snippet выделены <mark>. Курсор
+    следующей страницы - в заголовке X-Next-Cursor.
+    """
+    manager_id = current_user.id if current_user.role == "manager" else None
+    try:
+        results, next_cursor = search_messages(
+            db, q, limit, manager_id=manager_id, lead_id=lead_id, cursor=cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    except NotImplementedError as e:
+        raise HTTPException(status_code=501, detail=str(e))
 
-    if current_user.role == "manager":
-        if lead.assigned_manager_id != current_user.id:
-            raise HTTPException(status_code=403, detail="Access denied")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return results
 
-    messages = db.query(Message).filter(
-        Message.lead_id == lead_id
-    ).order_by(Message.created_at).all()
 
+@router.get("/{lead_id}", response_model=List[MessageResponse])
+async def get_messages(
+        lead_id: int,
+        request: Request,
+        response: Response,
+        after_id: int | None = None,
+        before_id: int | None = None,
+        limit: int | None = Query(None, ge=1, le=MAX_PAGE_SIZE),
+        current_user: User = Depends(require_manager),
+        db: Session = Depends(get_db)
+):
+    """
+    Получить историю сообщений лида
+
+    Без параметров - вся история. after_id - только более новые сообщения
+    (для опроса), before_id - страница более старых (прокрутка вверх), limit -
+    размер страницы; без курсора с limit отдаются последние limit сообщений.
+    Порядок всегда по (created_at, id) по возрастанию. Поддерживает
+    If-None-Match: при неизменной версии лида - 304 без чтения сообщений.
+    Заархивированная переписка (см. archive.py) отдается вместе с горячей.
+    """
+    not_modified = check_lead_etag(db, lead_id, current_user, request, response)
+    if not_modified:
+        return not_modified
+
+    if after_id is not None and before_id is not None:
+        raise HTTPException(status_code=400,
+                            detail="Use either after_id or before_id")
+
+    fast = fast_json.enabled()
+    archived = load_archived(db, lead_id)
+    query = db.query(*MESSAGE_COLUMNS) if fast else db.query(Message)
+    query = query.filter(Message.lead_id == lead_id)
+    key = tuple_(Message.created_at, Message.id)
+
+    cursor_id = after_id if after_id is not None else before_id
+    cursor = None
+    if cursor_id is not None:
+        cursor = db.query(Message.created_at, Message.id).filter(
+            Message.id == cursor_id,
+            Message.lead_id == lead_id
+        ).first()
+        if not cursor:
+            cursor = next((m for m in archived if m.id == cursor_id), None)
+        if not cursor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if after_id is not None:
+            query = query.filter(key > tuple_(cursor.created_at, cursor.id))
+        else:
+            query = query.filter(key < tuple_(cursor.created_at, cursor.id))
+
+    if after_id is not None or limit is None:
+        query = query.order_by(Message.created_at, Message.id)
+        if limit is not None:
+            query = query.limit(limit)
+        messages = query.all()
+    else:
+        # Страница "до курсора" или последняя страница: берем с конца и разворачиваем
+        messages = query.order_by(
+            Message.created_at.desc(), Message.id.desc()
+        ).limit(limit).all()[::-1]
+
+    if not archived:
+        if fast:
+            return fast_json.json_response(fast_json.rows_to_dicts(messages), response)
+        return messages
+
+    # Архив целиком в памяти: тот же фильтр по курсору, слияние и повторный limit
+    if cursor is not None:
+        cursor_key = (cursor.created_at, cursor.id)
+        if after_id is not None:
+            archived = [m for m in archived if (m.created_at, m.id) > cursor_key]
+        else:
+            archived = [m for m in archived if (m.created_at, m.id) < cursor_key]
+    messages = sorted(archived + messages, key=lambda m: (m.created_at, m.id))
+    if limit is not None:
+        messages = messages[:limit] if after_id is not None else messages[-limit:]
+    if fast:
+        return fast_json.json_response([message_to_dict(m) for m in messages], response)
     return messages
 
 
@@ -87,8 +213,10 @@ async def send_message(
         created_at=datetime.utcnow()
     )
     db.add(new_message)
+    apply_message(lead, new_message)
 
     # Меняем статус на "in_progress" и обновляем last_updated_at
+    status_changed = lead.status != "in_progress"
     lead.status = "in_progress"
     lead.last_updated_at = datetime.utcnow()
 
@@ -99,6 +227,7 @@ async def send_message(
     await ws_manager.notify_new_message(
         lead_id=lead.id,
         manager_id=current_user.id,
+        project_id=lead.project_id,
         message_data={
             "id": new_message.id,
             "text": request.text,
@@ -106,6 +235,13 @@ async def send_message(
             "created_at": new_message.created_at.isoformat()
         }
     )
+    if status_changed:
+        await ws_manager.notify_lead_status(
+            lead_id=lead.id,
+            manager_id=lead.assigned_manager_id,
+            status="in_progress",
+            project_id=lead.project_id
+        )
 
     return {
         "status": "sent",
@@ -118,11 +254,108 @@ async def send_message(
     }
 
 
+async def _send_chat_message(lead_id: int, text: str) -> dict:
+    """
+    Отправка сообщения из чат-сокета
+
+    Каждый шаг берет сессию только на время своей работы: во время запроса
+    к Telegram соединение с БД не удерживается.
+    """
+    with session_scope() as db:
+        lead = db.query(Lead).filter(Lead.id == lead_id).first()
+        if not lead:
+            return {"type": "error", "message": "Lead not found"}
+        if lead.status == "closed":
+            return {"type": "error", "message": "Lead is closed"}
+
+        bot = db.query(Bot).filter(Bot.id == lead.bot_id).first()
+        if not bot:
+            return {"type": "error", "message": "Bot not configured"}
+
+        bot_token = bot.token
+        telegram_chat_id = lead.telegram_chat_id
+
+    success = await send_telegram_message(bot_token, telegram_chat_id, text)
+    if not success:
+        return {"type": "error", "message": "Failed to send message"}
+
+    with session_scope() as db:
+        # Лид могли удалить, пока шел запрос к Telegram
+        lead = db.query(Lead).filter(Lead.id == lead_id).first()
+        if not lead:
+            return {"type": "error", "message": "Lead not found"}
+
+        new_message = Message(
+            lead_id=lead_id,
+            sender="manager",
+            text=text,
+            created_at=datetime.utcnow()
+        )
+        db.add(new_message)
+        apply_message(lead, new_message)
+
+        # Меняем статус на "in_progress" и обновляем last_updated_at
+        status_changed = lead.status != "in_progress"
+        lead.status = "in_progress"
+        lead.last_updated_at = datetime.utcnow()
+
+        db.commit()
+        db.refresh(new_message)
+        message_id = new_message.id
+        created_at = new_message.created_at
+        assigned_manager_id = lead.assigned_manager_id
+        project_id = lead.project_id
+
+    # Рассылка может ждать NOTIFY и очередь - соединение к этому моменту уже в пуле
+    if status_changed:
+        from ..websocket import manager as ws_manager
+        await ws_manager.notify_lead_status(
+            lead_id=lead_id,
+            manager_id=assigned_manager_id,
+            status="in_progress",
+            project_id=project_id
+        )
+
+    return {
+        "type": "message_sent",
+        "message": {
+            "id": message_id,
+            "text": text,
+            "sender": "manager",
+            "created_at": created_at.isoformat()
+        }
+    }
+
+
+async def _deliver_chat_message(lead_id: int, user_id: int, connection_id: str,
+                                temp_id, text: str):
+    """
+    Задача конвейера: отправка и ответ message_sent / message_failed в сокет
+
+    Ответ уходит всегда: клиент, получивший message_accepted, иначе так и
+    не узнал бы, что стало с его temp_id.
+    """
+    try:
+        reply = await _send_chat_message(lead_id, text)
+    except Exception as e:
+        logger.error(f"Chat message for lead {lead_id} failed: {e!r}")
+        reply = {"type": "error", "message": "Failed to send message"}
+    if reply["type"] == "message_sent":
+        reply = {**reply, "temp_id": temp_id}
+    else:
+        reply = {"type": "message_failed", "temp_id": temp_id,
+                 "error": reply["message"]}
+
+    from ..websocket import manager as ws_manager
+    ws_manager.send_to_connection(user_id, connection_id, reply)
+
+
 @router.websocket("/ws/{lead_id}")
 async def websocket_chat(websocket: WebSocket, lead_id: int):
     """WebSocket для real-time чата с лидом"""
     await websocket.accept()
     user = None
+    connection_id = None
 
     try:
         token = websocket.query_params.get("token")
@@ -130,109 +363,55 @@ async def websocket_chat(websocket: WebSocket, lead_id: int):
             await websocket.close(code=4001)
             return
 
-        from jose import jwt, JWTError
-        from ..config import settings
-
-        try:
-            payload = jwt.decode(
-                token,
-                settings.JWT_SECRET_KEY,
-                algorithms=[settings.JWT_ALGORITHM]
-            )
-            username = payload.get("sub")
+        user = authenticate_websocket_token(token)
+        if not user or user.role not in ["admin", "manager"]:
+            await websocket.close(code=4003)
+            return
 
-            db = next(get_db())
+        with session_scope() as db:
+            lead = db.query(Lead).filter(Lead.id == lead_id).first()
+            assigned_manager_id = lead.assigned_manager_id if lead else None
 
-            user = db.query(User).filter(User.username == username).first()
+        if not lead:
+            await websocket.close(code=4004)
+            return
 
-            if not user or user.role not in ["admin", "manager"]:
+        if user.role == "manager":
+            if assigned_manager_id != user.id:
                 await websocket.close(code=4003)
                 return
 
-            lead = db.query(Lead).filter(Lead.id == lead_id).first()
-            if not lead:
-                await websocket.close(code=4004)
-                return
-
-            if user.role == "manager":
-                if lead.assigned_manager_id != user.id:
-                    await websocket.close(code=4003)
-                    return
-
-            from ..websocket import manager as ws_manager
-            await ws_manager.connect(user.id, websocket)
-
-            while True:
-                data = await websocket.receive_text()
-                message_data = json.loads(data)
-
-                if message_data.get("action") == "send_message":
-                    text = message_data.get("text")
-
-                    if lead.status == "closed":
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": "Lead is closed"
-                        })
-                        continue
-
-                    bot = db.query(Bot).filter(Bot.id == lead.bot_id).first()
-                    if not bot:
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": "Bot not configured"
-                        })
-                        continue
-
-                    success = await send_telegram_message(
-                        bot.token,
-                        lead.telegram_chat_id,
-                        text
-                    )
-
-                    if not success:
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": "Failed to send message"
-                        })
-                        continue
-
-                    new_message = Message(
-                        lead_id=lead.id,
-                        sender="manager",
-                        text=text,
-                        created_at=datetime.utcnow()
-                    )
-                    db.add(new_message)
-
-                    # Меняем статус на "in_progress" и обновляем last_updated_at
-                    lead.status = "in_progress"
-                    lead.last_updated_at = datetime.utcnow()
-
-                    db.commit()
-                    db.refresh(new_message)
-
-                    await websocket.send_json({
-                        "type": "message_sent",
-                        "message": {
-                            "id": new_message.id,
-                            "text": text,
-                            "sender": "manager",
-                            "created_at": new_message.created_at.isoformat()
-                        }
-                    })
-
-        except JWTError:
-            await websocket.close(code=4003)
-            return
+        from ..websocket import manager as ws_manager
+        connection_id = await ws_manager.connect(user.id, websocket)
+
+        while True:
+            data = await websocket.receive_text()
+            ws_manager.touch(user.id, connection_id)
+            message_data = json.loads(data)
+
+            if message_data.get("action") == "send_message":
+                # Не ждем Telegram: подтверждаем прием по temp_id клиента,
+                # результат придет отдельным событием
+                temp_id = message_data.get("temp_id")
+                text = message_data.get("text")
+                if not text:
+                    reply = {"type": "message_failed", "temp_id": temp_id,
+                             "error": "Text is required"}
+                elif send_pipeline.submit(lead_id, partial(
+                        _deliver_chat_message, lead_id, user.id,
+                        connection_id, temp_id, text)):
+                    reply = {"type": "message_accepted", "temp_id": temp_id}
+                else:
+                    reply = {"type": "message_failed", "temp_id": temp_id,
+                             "error": "Too many pending messages"}
+                ws_manager.send_to_connection(user.id, connection_id, reply)
 
     except WebSocketDisconnect:
-        if user:
-            from ..websocket import manager as ws_manager
-            ws_manager.disconnect(user.id)
+        pass
     except Exception as e:
         import logging
         logging.error(f"WebSocket error: {e}")
-        if user:
+    finally:
+        if connection_id:
             from ..websocket import manager as ws_manager
-            ws_manager.disconnect(user.id)
\ No newline at end of file
+            ws_manager.disconnect(user.id, connection_id)
@@ -5,14 +5,20 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, time, timedelta
 from ..database import get_db
 from ..models import User, Lead, Message
 from ..auth import require_manager, require_admin
+from ..archive import archived_daily_counts, archived_message_count
 
 router = APIRouter(prefix="/stats", tags=["stats"])
 
 
+def _created_between(start_date: date, end_date: date):
+    return (Message.created_at >= datetime.combine(start_date, time.min),
+            Message.created_at < datetime.combine(end_date + timedelta(days=1), time.min))
+
+
 class OverviewStats(BaseModel):
     total_leads: int
     active_leads: int
@@ -78,6 +84,7 @@ async def get_overview_stats(
     lead_ids = [lead.id for lead in query.all()]
     total_messages = db.query(Message).filter(
         Message.lead_id.in_(lead_ids)).count() if lead_ids else 0
+    total_messages += archived_message_count(db, lead_ids)
 
     managers_count = db.query(User).filter(
         User.role == "manager",
@@ -116,6 +123,7 @@ async def get_all_managers_stats(
         lead_ids = [lead.id for lead in leads]
         total_messages = db.query(Message).filter(
             Message.lead_id.in_(lead_ids)).count() if lead_ids else 0
+        total_messages += archived_message_count(db, lead_ids)
 
         result.append({
             "manager_id": manager.id,
@@ -154,6 +162,7 @@ async def get_manager_stats(
     lead_ids = [lead.id for lead in leads]
     total_messages = db.query(Message).filter(
         Message.lead_id.in_(lead_ids)).count() if lead_ids else 0
+    total_messages += archived_message_count(db, lead_ids)
 
     return {
         "manager_id": manager.id,
@@ -220,8 +229,10 @@ async def get_daily_stats(
 
     lead_ids = [lead.id for lead in leads]
     if lead_ids:
+        # Диапазон по created_at отсекает лишние месячные секции messages
         messages = db.query(Message).filter(
-            Message.lead_id.in_(lead_ids)).all()
+            Message.lead_id.in_(lead_ids),
+            *_created_between(start_date, end_date)).all()
         for msg in messages:
             msg_date = msg.created_at.date()
             if start_date <= msg_date <= end_date:
@@ -233,6 +244,14 @@ async def get_daily_stats(
                     }
                 stats_dict[msg_date]["messages_count"] += 1
 
+    # Переписка давно закрытых лидов лежит в архиве, как и в итогах /overview
+    for msg_date, count in archived_daily_counts(db, lead_ids, start_date, end_date).items():
+        stats_dict.setdefault(msg_date, {
+            "new_leads": 0,
+            "closed_leads": 0,
+            "messages_count": 0
+        })["messages_count"] += count
+
     result = [
         {
             "date": date_key,
@@ -328,7 +347,8 @@ async def get_daily_managers_stats(
         lead_ids = [lead.id for lead in leads]
         if lead_ids:
             messages = db.query(Message).filter(
-                Message.lead_id.in_(lead_ids)
+                Message.lead_id.in_(lead_ids),
+                *_created_between(start_date, end_date)
             ).all()
             for msg in messages:
                 msg_date = msg.created_at.date()
@@ -341,6 +361,14 @@ async def get_daily_managers_stats(
                         }
                     stats_dict[msg_date]["messages_count"] += 1
 
+        for msg_date, count in archived_daily_counts(
+                db, lead_ids, start_date, end_date).items():
+            stats_dict.setdefault(msg_date, {
+                "new_leads": 0,
+                "closed_leads": 0,
+                "messages_count": 0
+            })["messages_count"] += count
+
         # Формируем результат
         for date_key, values in stats_dict.items():
             result.append({
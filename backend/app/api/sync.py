@@ -0,0 +1,69 @@
+# backend/app/api/sync.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from typing import List
+from datetime import datetime
+from ..database import get_db
+from ..models import User
+from ..auth import require_manager
+from ..sync import changes_since, decode_cursor, encode_cursor
+from .leads import LeadResponse, lead_to_dict
+
+router = APIRouter(prefix="/sync", tags=["sync"])
+
+MAX_PAGE_SIZE = 1000
+
+
+class SyncMessage(BaseModel):
+    id: int
+    lead_id: int
+    sender: str
+    text: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class SyncResponse(BaseModel):
+    leads: List[LeadResponse]
+    messages: List[SyncMessage]
+    revoked: List[int]
+    cursor: str
+    has_more: bool
+
+
+@router.get("", response_model=SyncResponse)
+async def sync(
+        cursor: str | None = None,
+        limit: int = Query(500, ge=1, le=MAX_PAGE_SIZE),
+        include_messages: bool = True,
+        current_user: User = Depends(require_manager),
+        db: Session = Depends(get_db)
+):
+    """
+    Изменения лидов и сообщений с момента курсора
+
+    Без курсора - первая загрузка. Лиды приходят целиком (upsert по id, в том
+    числе смена статуса), сообщения - только новые и измененные;
+    include_messages=false - только лиды (для списка). revoked - id лидов,
+    которые больше не видны менеджеру: убрать их до применения leads.
+    Пока has_more, запрашивать дальше с полученным cursor.
+    """
+    try:
+        position = decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    leads, messages, revoked, next_position, has_more = changes_since(
+        db, current_user, position, limit, include_messages)
+
+    return {
+        "leads": [lead_to_dict(lead, project_name) for lead, project_name in leads],
+        "messages": messages,
+        "revoked": revoked,
+        "cursor": encode_cursor(next_position),
+        "has_more": has_more
+    }
@@ -0,0 +1,351 @@
+# backend/app/archive.py
+
+"""
+Архивирование переписки закрытых лидов
+
+Сообщения лидов, закрытых больше ARCHIVE_AFTER_DAYS дней назад, переносятся
+из messages в message_archives: одна строка на лид, вся переписка - сжатый
+zlib JSON. Горячая таблица (и ее месячные секции в PostgreSQL) остается
+маленькой, а get_messages читает архив прозрачно.
+
+Если в закрытый лид после архивации пришли новые сообщения, следующий запуск
+дописывает их в тот же архив.
+
+Запуск (из каталога backend), например из cron раз в сутки:
+    python -m app.archive --older-than-days 90
+
+Будущие секции messages приложение создает само: при старте и раз в
+PARTITIONS_CHECK_INTERVAL_HOURS часов (start_partition_maintenance), чтобы
+новые сообщения не копились в DEFAULT-секции.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, List
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from .models import Lead, Message, MessageArchive
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_LEVEL = 9
+
+# Сколько будущих месяцев держать заранее созданными секциями messages
+PARTITIONS_AHEAD = 3
+
+# Ключ pg_try_advisory_lock: секции создает один воркер
+PARTITIONS_LOCK_KEY = 7_302_114_916
+
+_partitions_task: asyncio.Task | None = None
+
+
+def pack_messages(messages: List[Message]) -> bytes:
+    rows = [
+        [m.id, m.sender, m.text, m.created_at.isoformat() if m.created_at else None]
+        for m in messages
+    ]
+    raw = json.dumps(rows, ensure_ascii=False, separators=(",", ":"))
+    return zlib.compress(raw.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def unpack_messages(lead_id: int, payload: bytes) -> List[Message]:
+    """Сообщения архива как несвязанные с сессией объекты Message"""
+    rows = json.loads(zlib.decompress(payload))
+    return [
+        Message(id=message_id, lead_id=lead_id, sender=sender, text=body,
+                created_at=datetime.fromisoformat(created_at) if created_at else None)
+        for message_id, sender, body, created_at in rows
+    ]
+
+
+def load_archived(db: Session, lead_id: int) -> List[Message]:
+    archive = db.get(MessageArchive, lead_id)
+    if archive is None:
+        return []
+    return unpack_messages(lead_id, archive.payload)
+
+
+def archived_message_count(db: Session, lead_ids: List[int]) -> int:
+    if not lead_ids:
+        return 0
+    return db.query(func.coalesce(func.sum(MessageArchive.message_count), 0)).filter(
+        MessageArchive.lead_id.in_(lead_ids)
+    ).scalar()
+
+
+def count_by_day(messages: List[Message]) -> Dict[str, int]:
+    """{"YYYY-MM-DD": число сообщений}; сообщения без даты не учитываются"""
+    return dict(Counter(m.created_at.date().isoformat() for m in messages if m.created_at))
+
+
+def archived_daily_counts(db: Session, lead_ids: List[int], start_date: date,
+                          end_date: date) -> Dict[date, int]:
+    """Сообщения архивов лидов по дням в [start_date, end_date]"""
+    if not lead_ids:
+        return {}
+    archives = db.query(MessageArchive).filter(
+        MessageArchive.lead_id.in_(lead_ids),
+        MessageArchive.first_message_at < datetime.combine(
+            end_date + timedelta(days=1), datetime.min.time()),
+        MessageArchive.last_message_at >= datetime.combine(start_date, datetime.min.time())
+    )
+
+    totals: Counter = Counter()
+    for archive in archives:
+        if archive.daily_counts is not None:
+            by_day = json.loads(archive.daily_counts)
+        else:
+            by_day = count_by_day(unpack_messages(archive.lead_id, archive.payload))
+        for day, count in by_day.items():
+            day = date.fromisoformat(day)
+            if start_date <= day <= end_date:
+                totals[day] += count
+    return dict(totals)
+
+
+def archive_lead(db: Session, lead_id: int) -> Dict[str, int]:
+    """Переносит горячие сообщения лида в архив; коммит - за вызывающим"""
+    hot = db.query(Message).filter(Message.lead_id == lead_id).order_by(
+        Message.created_at, Message.id).all()
+    if not hot:
+        return {"messages": 0, "raw_bytes": 0, "compressed_bytes": 0}
+
+    archive = db.get(MessageArchive, lead_id)
+    messages = (unpack_messages(lead_id, archive.payload) if archive else []) + hot
+    payload = pack_messages(messages)
+
+    if archive is None:
+        archive = MessageArchive(lead_id=lead_id)
+        db.add(archive)
+    archive.payload = payload
+    archive.message_count = len(messages)
+    archive.first_message_at = messages[0].created_at
+    archive.last_message_at = messages[-1].created_at
+    archive.daily_counts = json.dumps(count_by_day(messages))
+    archive.archived_at = datetime.utcnow()
+
+    db.query(Message).filter(
+        Message.id.in_([m.id for m in hot])
+    ).delete(synchronize_session=False)
+
+    return {
+        "messages": len(hot),
+        "raw_bytes": sum(len(m.text.encode("utf-8")) for m in hot),
+        "compressed_bytes": len(payload)
+    }
+
+
+def archive_closed_leads(session_factory, older_than_days: int,
+                         batch_size: int = 100, max_leads: int | None = None) -> Dict:
+    """
+    Архивирует лиды, закрытые раньше чем older_than_days дней назад
+
+    Каждая пачка из batch_size лидов - отдельная транзакция, так что
+    блокировки короткие, а прерванный запуск можно просто повторить.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    totals = {"leads": 0, "messages": 0, "raw_bytes": 0, "compressed_bytes": 0}
+    last_lead_id = 0
+
+    while max_leads is None or totals["leads"] < max_leads:
+        limit = batch_size
+        if max_leads is not None:
+            limit = min(batch_size, max_leads - totals["leads"])
+
+        db = session_factory()
+        try:
+            has_hot_messages = db.query(Message.id).filter(
+                Message.lead_id == Lead.id).exists()
+            lead_ids = [row.id for row in db.query(Lead.id).filter(
+                Lead.status == "closed",
+                Lead.closed_at < cutoff,
+                Lead.id > last_lead_id,
+                has_hot_messages
+            ).order_by(Lead.id).limit(limit)]
+            if not lead_ids:
+                break
+
+            for lead_id in lead_ids:
+                moved = archive_lead(db, lead_id)
+                for key in ("messages", "raw_bytes", "compressed_bytes"):
+                    totals[key] += moved[key]
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        totals["leads"] += len(lead_ids)
+        last_lead_id = lead_ids[-1]
+        logger.info(f"Archived {totals['leads']} leads, {totals['messages']} messages")
+
+    return totals
+
+
+def _month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+
+def _next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def ensure_partitions(db: Session, months_ahead: int = PARTITIONS_AHEAD) -> List[str]:
+    """
+    Создает месячные секции messages на months_ahead месяцев вперед
+
+    Только для PostgreSQL и только если messages уже секционирована
+    (миграция d2f6b8a0c3e5). Возвращает имена созданных секций.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return []
+    partitioned = db.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid WHERE c.relname = 'messages'"
+    )).first()
+    if not partitioned:
+        return []
+
+    default = db.execute(text(
+        "SELECT p.partdefid::regclass::text FROM pg_partitioned_table p "
+        "JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = 'messages' AND p.partdefid <> 0"
+    )).scalar()
+
+    created = []
+    start = _month_start(datetime.utcnow())
+    for _ in range(months_ahead + 1):
+        end = _next_month(start)
+        name = f"messages_y{start.year}m{start.month:02d}"
+        exists = db.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar()
+        if not exists:
+            _create_partition(db, name, start, end, default)
+            created.append(name)
+        start = end
+    db.commit()
+    return created
+
+
+def _create_partition(db: Session, name: str, start: datetime, end: datetime,
+                      default: str | None):
+    """
+    Создает секцию messages за [start, end)
+
+    Если DEFAULT-секция уже хранит строки этого месяца, CREATE ... PARTITION OF
+    упадет на проверке ограничения DEFAULT: ее отключают, переносят строки
+    в новую секцию и подключают обратно (все в одной транзакции).
+    """
+    bounds = {"start": start, "end": end}
+    stray = default is not None and db.execute(text(
+        f"SELECT 1 FROM {default} WHERE created_at >= :start AND created_at < :end LIMIT 1"
+    ), bounds).first()
+    if not stray:
+        db.execute(text(
+            f"CREATE TABLE {name} PARTITION OF messages "
+            f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        ))
+        return
+
+    # Генерируемые колонки (search_vector) пересчитываются при вставке
+    columns = db.execute(text(
+        "SELECT string_agg(quote_ident(attname), ', ' ORDER BY attnum) "
+        "FROM pg_attribute WHERE attrelid = 'messages'::regclass "
+        "AND attnum > 0 AND NOT attisdropped AND attgenerated = ''"
+    )).scalar()
+    db.execute(text(f"ALTER TABLE messages DETACH PARTITION {default}"))
+    db.execute(text(
+        f"CREATE TABLE {name} PARTITION OF messages "
+        f"FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+    ))
+    db.execute(text(
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {default} "
+        f"WHERE created_at >= :start AND created_at < :end"
+    ), bounds)
+    db.execute(text(
+        f"DELETE FROM {default} WHERE created_at >= :start AND created_at < :end"
+    ), bounds)
+    db.execute(text(f"ALTER TABLE messages ATTACH PARTITION {default} DEFAULT"))
+
+
+def maintain_partitions(session_factory) -> List[str] | None:
+    """ensure_partitions в одном воркере; None - проверку уже делает другой"""
+    from .auto_close import single_worker
+
+    db = session_factory()
+    try:
+        bind = db.get_bind()
+        if bind.dialect.name != "postgresql":
+            return []
+        with single_worker(bind, PARTITIONS_LOCK_KEY) as acquired:
+            if not acquired:
+                return None
+            return ensure_partitions(db)
+    finally:
+        db.close()
+
+
+async def _partitions_loop(session_factory, interval: float):
+    loop = asyncio.get_running_loop()
+    while True:
+        try:
+            created = await loop.run_in_executor(None, maintain_partitions, session_factory)
+            if created:
+                logger.info(f"Created partitions: {', '.join(created)}")
+        except Exception as e:
+            logger.error(f"Partition maintenance failed: {e!r}")
+        await asyncio.sleep(interval)
+
+
+def start_partition_maintenance(session_factory, interval_hours: int):
+    """Проверить секции сейчас и затем раз в interval_hours часов"""
+    global _partitions_task
+    if interval_hours > 0 and (_partitions_task is None or _partitions_task.done()):
+        _partitions_task = asyncio.create_task(
+            _partitions_loop(session_factory, interval_hours * 3600))
+
+
+async def stop_partition_maintenance():
+    global _partitions_task
+    if _partitions_task:
+        _partitions_task.cancel()
+        try:
+            await _partitions_task
+        except asyncio.CancelledError:
+            pass
+        _partitions_task = None
+
+
+def main():
+    from .config import settings
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Archive conversations of closed leads")
+    parser.add_argument("--older-than-days", type=int, default=settings.ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-leads", type=int, default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    db = SessionLocal()
+    try:
+        created = ensure_partitions(db)
+    finally:
+        db.close()
+    if created:
+        logger.info(f"Created partitions: {', '.join(created)}")
+
+    totals = archive_closed_leads(SessionLocal, args.older_than_days,
+                                  args.batch_size, args.max_leads)
+    print(json.dumps(totals))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,16 @@
 # backend/app/auth.py
 
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
+from typing import Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
+from . import database
 from .database import get_db
 from .models import User
 from .config import settings
@@ -13,6 +18,17 @@ from .config import settings
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# token -> (expires_at, SocketUser) в порядке вставки, то есть почти по сроку
+_ws_auth_cache: "OrderedDict[str, Tuple[float, SocketUser]]" = OrderedDict()
+
+
+@dataclass(frozen=True)
+class SocketUser:
+    """Снимок пользователя для WebSocket: не держит ORM-сессию открытой"""
+    id: int
+    username: str
+    role: str
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -79,4 +95,66 @@ def require_manager(current_user: User = Depends(get_current_active_user)) -> Us
             status_code=403,
             detail="Manager or admin access required"
         )
-    return current_user
\ No newline at end of file
+    return current_user
+
+
+def clear_ws_auth_cache():
+    _ws_auth_cache.clear()
+
+
+def _cache_ws_user(token: str, socket_user: "SocketUser", now: float,
+                   expires_at: float):
+    """
+    Кладет пользователя в кэш, снимая с начала просроченные записи
+
+    Обычно срок - WS_AUTH_CACHE_SECONDS, и просроченные записи в начале;
+    запись, которую раньше ограничил exp токена, отбрасывается при чтении.
+    Сверх WS_AUTH_CACHE_SIZE вытесняются самые старые.
+    """
+    _ws_auth_cache.pop(token, None)
+    while _ws_auth_cache:
+        expires_at, _ = next(iter(_ws_auth_cache.values()))
+        if expires_at > now and len(_ws_auth_cache) < settings.WS_AUTH_CACHE_SIZE:
+            break
+        _ws_auth_cache.popitem(last=False)
+    _ws_auth_cache[token] = (expires_at, socket_user)
+
+
+def authenticate_websocket_token(token: str) -> SocketUser | None:
+    """
+    Проверка токена WebSocket-подключения
+
+    Пользователь читается в короткой сессии, которая сразу возвращается в пул,
+    и кэшируется на WS_AUTH_CACHE_SECONDS, чтобы переподключения не ходили в БД.
+    Запись в кэше не переживает exp токена.
+    """
+    now = time.monotonic()
+    cached = _ws_auth_cache.get(token)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    try:
+        payload = jwt.decode(
+            token,
+            settings.JWT_SECRET_KEY,
+            algorithms=[settings.JWT_ALGORITHM]
+        )
+    except JWTError:
+        return None
+
+    username = payload.get("sub")
+    if username is None:
+        return None
+
+    with database.session_scope() as db:
+        user = db.query(User).filter(User.username == username).first()
+        if not user or not user.is_active:
+            return None
+        socket_user = SocketUser(id=user.id, username=user.username, role=user.role)
+
+    # exp - по часам UTC, кэш - по monotonic: переводим через оставшееся время
+    expires_at = now + settings.WS_AUTH_CACHE_SECONDS
+    if payload.get("exp") is not None:
+        expires_at = min(expires_at, now + payload["exp"] - time.time())
+    _cache_ws_user(token, socket_user, now, expires_at)
+    return socket_user
@@ -0,0 +1,212 @@
+# backend/app/auto_close.py
+
+"""
+Автозакрытие лидов, затихших дольше порога проекта
+
+Лиды в статусах new/read/in_progress, у которых last_updated_at старше
+Project.auto_close_after_days, закрываются пачками: каждая пачка - один UPDATE ... WHERE id IN (SELECT ... LIMIT n
+FOR UPDATE SKIP LOCKED) в своей транзакции. Строки, которые прямо сейчас
+меняет оператор, пропускаются до следующего запуска, а блокировки короткие.
+Менеджеры получают одно событие batch на пачку. Автозакрытие включается
+для каждого проекта отдельно: без порога (NULL или 0) лиды не закрываются.
+
+Запросы идут в пуле потоков (run_in_executor), не блокируя event loop.
+Одновременно задачу выполняет один воркер: на PostgreSQL - advisory lock,
+на SQLite - блокировка внутри процесса.
+
+Задача запускается в приложении раз в AUTO_CLOSE_INTERVAL_MINUTES минут
+или вручную (из каталога backend), например из cron:
+    python -m app.auto_close
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import select, text, update
+from sqlalchemy.orm import Session
+from .models import Lead, Project
+from .websocket import manager as ws_manager
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ("new", "read", "in_progress")
+
+# Ключ pg_try_advisory_lock, общий для всех воркеров
+LOCK_KEY = 7_302_114_915
+
+_local_lock = threading.Lock()
+
+_task: asyncio.Task | None = None
+
+
+@contextmanager
+def single_worker(bind, key: int = LOCK_KEY) -> Iterator[bool]:
+    """True, если этот воркер взял блокировку задачи key; иначе ее держит другой"""
+    if bind.dialect.name != "postgresql":
+        acquired = _local_lock.acquire(blocking=False)
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                _local_lock.release()
+        return
+
+    # Сессионный advisory lock живет на соединении - держим отдельное,
+    # в autocommit, чтобы не оставлять открытую транзакцию
+    with bind.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"),
+                                {"key": key}).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+
+
+def project_thresholds(db: Session) -> List[Tuple[int, int]]:
+    """(project_id, дней) для проектов с включенным автозакрытием"""
+    return [tuple(row) for row in db.query(Project.id, Project.auto_close_after_days)
+            .filter(Project.auto_close_after_days > 0).order_by(Project.id)]
+
+
+def close_chunk(db: Session, project_id: int, cutoff: datetime, now: datetime,
+                batch_size: int) -> list:
+    """Закрывает до batch_size затихших лидов проекта; коммит - за вызывающим"""
+    stale = select(Lead.id).where(
+        Lead.project_id == project_id,
+        Lead.status.in_(ACTIVE_STATUSES),
+        Lead.last_updated_at < cutoff
+    ).limit(batch_size).with_for_update(skip_locked=True)
+
+    return db.execute(
+        update(Lead)
+        .where(Lead.id.in_(stale.scalar_subquery()))
+        .values(status="closed", closed_at=now, last_updated_at=now)
+        .returning(Lead.id, Lead.assigned_manager_id, Lead.project_id)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+
+def _read_thresholds(session_factory):
+    db = session_factory()
+    try:
+        return db.get_bind(), project_thresholds(db)
+    finally:
+        db.close()
+
+
+def _close_chunk_sync(session_factory, project_id: int, cutoff: datetime, now: datetime,
+                      batch_size: int) -> list:
+    """Одна пачка в своей транзакции"""
+    db = session_factory()
+    try:
+        rows = close_chunk(db, project_id, cutoff, now, batch_size)
+        db.commit()
+        return rows
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def close_stale_leads(session_factory, batch_size: int = 500,
+                            now: datetime | None = None) -> Dict[str, int] | None:
+    """
+    Закрывает затихшие лиды всех проектов
+
+    Возвращает {"leads": закрыто, "chunks": транзакций} или None, если задачу
+    уже выполняет другой воркер.
+    """
+    now = now or datetime.utcnow()
+    loop = asyncio.get_running_loop()
+    bind, thresholds = await loop.run_in_executor(None, _read_thresholds, session_factory)
+
+    with single_worker(bind) as acquired:
+        if not acquired:
+            logger.info("Auto-close is running in another worker, skipping")
+            return None
+
+        totals = {"leads": 0, "chunks": 0}
+        for project_id, days in thresholds:
+            cutoff = now - timedelta(days=days)
+            while True:
+                rows = await loop.run_in_executor(None, _close_chunk_sync, session_factory,
+                                                  project_id, cutoff, now, batch_size)
+                if not rows:
+                    break
+
+                totals["leads"] += len(rows)
+                totals["chunks"] += 1
+                await ws_manager.notify_bulk([
+                    (row.assigned_manager_id, row.project_id,
+                     {"type": "lead_status", "lead_id": row.id, "status": "closed"})
+                    for row in rows
+                ])
+                if len(rows) < batch_size:
+                    break
+
+        if totals["leads"]:
+            logger.info(f"Auto-closed {totals['leads']} leads in {totals['chunks']} chunks")
+        return totals
+
+
+async def _auto_close_loop(session_factory, interval: float, batch_size: int):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await close_stale_leads(session_factory, batch_size)
+        except Exception as e:
+            logger.error(f"Auto-close failed: {e!r}")
+
+
+def start_auto_close(session_factory, interval_minutes: int, batch_size: int):
+    global _task
+    if interval_minutes > 0 and (_task is None or _task.done()):
+        _task = asyncio.create_task(_auto_close_loop(
+            session_factory, interval_minutes * 60, batch_size))
+
+
+async def stop_auto_close():
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def main():
+    from .broadcast import create_backend
+    from .config import settings
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Close leads that went quiet")
+    parser.add_argument("--batch-size", type=int, default=settings.AUTO_CLOSE_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    async def run():
+        # Уведомления уходят воркерам приложения через общий бэкенд рассылки
+        ws_manager.set_backend(create_backend(settings))
+        await ws_manager.backend.start()
+        try:
+            return await close_stale_leads(SessionLocal, args.batch_size)
+        finally:
+            await ws_manager.backend.stop()
+
+    print(json.dumps(asyncio.run(run())))
+
+
+if __name__ == "__main__":
+    main()
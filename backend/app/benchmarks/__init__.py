@@ -0,0 +1 @@
+# backend/app/benchmarks/__init__.py
\ No newline at end of file
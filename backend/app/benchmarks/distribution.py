@@ -0,0 +1,341 @@
+# backend/app/benchmarks/distribution.py
+
+"""
+Симулятор распределения лидов
+
+Прогоняет стратегии распределения (по умолчанию distribution.get_next_manager)
+на синтетических потоках лидов и считает пропускную способность, задержки
+и справедливость распределения. Результат печатается в JSON, чтобы его
+можно было сравнивать между версиями.
+
+Запуск (из каталога backend):
+    python -m app.benchmarks.distribution --scenario burst --workers 4
+    python -m app.benchmarks.distribution --database-url postgresql://... \
+        --scenario churn --leads 5000 --output result.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from ..distribution import get_next_manager
+from ..models import Base, User, Project, DistributionCounter, project_managers
+
+logger = logging.getLogger(__name__)
+
+Strategy = Callable[[Session, int], User]
+
+STRATEGIES: Dict[str, Strategy] = {
+    "round_robin": get_next_manager,
+}
+
+SCENARIOS = ("steady", "burst", "churn")
+
+
+def gini(values: List[int]) -> float:
+    """Коэффициент Джини: 0 - идеально ровно, ближе к 1 - всё одному"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    total = sum(ordered)
+    if total == 0:
+        return 0.0
+    n = len(ordered)
+    weighted = sum((i + 1) * v for i, v in enumerate(ordered))
+    return (2 * weighted) / (n * total) - (n + 1) / n
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль методом ближайшего ранга"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def arrival_schedule(scenario: str, leads: int, rate: float,
+                     burst_size: int = 50, burst_gap: float = 0.5) -> List[float]:
+    """Смещения (в секундах от старта) моментов прихода лидов"""
+    if scenario == "burst":
+        return [(i // burst_size) * burst_gap for i in range(leads)]
+
+    if rate <= 0:
+        return [0.0] * leads
+
+    return [i / rate for i in range(leads)]
+
+
+def _create_engine(database_url: str):
+    if database_url.startswith("sqlite"):
+        return create_engine(
+            database_url,
+            connect_args={"check_same_thread": False, "timeout": 30}
+        )
+    return create_engine(database_url)
+
+
+def _setup_project(SessionFactory, managers_count: int) -> Dict:
+    """Создает изолированный проект с менеджерами для прогона"""
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    db = SessionFactory()
+    try:
+        project = Project(name=prefix)
+        managers = [
+            User(
+                username=f"{prefix}-m{i}",
+                password_hash="!",
+                role="manager",
+                full_name=f"Bench Manager {i}",
+                is_active=True
+            )
+            for i in range(managers_count)
+        ]
+        db.add(project)
+        db.add_all(managers)
+        db.flush()
+        project.managers.extend(managers)
+        db.commit()
+        return {"project_id": project.id, "manager_ids": [m.id for m in managers]}
+    finally:
+        db.close()
+
+
+def _cleanup_project(SessionFactory, project_id: int, manager_ids: List[int]):
+    db = SessionFactory()
+    try:
+        db.query(DistributionCounter).filter(
+            DistributionCounter.project_id == project_id
+        ).delete(synchronize_session=False)
+        db.execute(project_managers.delete().where(
+            project_managers.c.project_id == project_id
+        ))
+        db.query(User).filter(User.id.in_(manager_ids)).delete(
+            synchronize_session=False)
+        db.query(Project).filter(Project.id == project_id).delete(
+            synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _churn_loop(SessionFactory, manager_ids: List[int], interval: float,
+                stop: threading.Event, rng: random.Random) -> int:
+    """Периодически выключает/включает случайного менеджера"""
+    toggles = 0
+    while not stop.wait(interval):
+        db = SessionFactory()
+        try:
+            user = db.query(User).filter(
+                User.id == rng.choice(manager_ids)).first()
+            active_count = db.query(User).filter(
+                User.id.in_(manager_ids), User.is_active == True).count()
+            # Хотя бы один менеджер должен оставаться активным
+            if user.is_active and active_count <= 1:
+                continue
+            user.is_active = not user.is_active
+            db.commit()
+            toggles += 1
+        except Exception as e:
+            db.rollback()
+            logger.warning(f"Churn toggle failed: {e}")
+        finally:
+            db.close()
+    return toggles
+
+
+def run_simulation(
+        database_url: str,
+        strategy: str = "round_robin",
+        scenario: str = "steady",
+        leads: int = 1000,
+        managers: int = 5,
+        workers: int = 1,
+        rate: float = 0,
+        burst_size: int = 50,
+        burst_gap: float = 0.5,
+        churn_interval: float = 0.05,
+        seed: int = 42,
+        keep: bool = False
+) -> Dict:
+    """Один прогон симуляции, возвращает отчет в виде словаря"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy {strategy}")
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Unknown scenario {scenario}")
+
+    strategy_fn = STRATEGIES[strategy]
+    engine = _create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    SessionFactory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    setup = _setup_project(SessionFactory, managers)
+    project_id = setup["project_id"]
+    manager_ids = setup["manager_ids"]
+
+    schedule = arrival_schedule(scenario, leads, rate, burst_size, burst_gap)
+    rng = random.Random(seed)
+
+    lock = threading.Lock()
+    latencies: List[float] = []
+    assignments: Counter = Counter()
+    errors: Counter = Counter()
+    next_index = [0]
+
+    def worker():
+        db = SessionFactory()
+        try:
+            while True:
+                with lock:
+                    index = next_index[0]
+                    if index >= len(schedule):
+                        return
+                    next_index[0] += 1
+
+                delay = started + schedule[index] - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+
+                t0 = time.perf_counter()
+                try:
+                    selected = strategy_fn(db, project_id)
+                except Exception as e:
+                    db.rollback()
+                    with lock:
+                        errors[type(e).__name__] += 1
+                    continue
+                elapsed = time.perf_counter() - t0
+
+                with lock:
+                    latencies.append(elapsed)
+                    assignments[selected.id] += 1
+        finally:
+            db.close()
+
+    stop = threading.Event()
+    churn_thread = None
+    churn_result = {}
+    if scenario == "churn":
+        def churn():
+            churn_result["toggles"] = _churn_loop(
+                SessionFactory, manager_ids, churn_interval, stop, rng)
+
+        churn_thread = threading.Thread(target=churn, daemon=True)
+
+    started = time.perf_counter()
+    if churn_thread:
+        churn_thread.start()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(worker) for _ in range(workers)]
+        for future in futures:
+            future.result()
+
+    duration = time.perf_counter() - started
+    stop.set()
+    if churn_thread:
+        churn_thread.join()
+
+    if not keep:
+        _cleanup_project(SessionFactory, project_id, manager_ids)
+    engine.dispose()
+
+    counts = [assignments.get(manager_id, 0) for manager_id in manager_ids]
+    decisions = len(latencies)
+
+    return {
+        "benchmark": "distribution",
+        "timestamp": datetime.utcnow().isoformat(),
+        "environment": {
+            "dialect": engine.dialect.name,
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__
+        },
+        "params": {
+            "strategy": strategy,
+            "scenario": scenario,
+            "leads": leads,
+            "managers": managers,
+            "workers": workers,
+            "rate": rate,
+            "burst_size": burst_size,
+            "burst_gap": burst_gap,
+            "seed": seed
+        },
+        "decisions": decisions,
+        "errors": dict(errors),
+        "churn_toggles": churn_result.get("toggles", 0),
+        "duration_s": round(duration, 4),
+        "decisions_per_sec": round(decisions / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p95": round(percentile(latencies, 95) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies, default=0) * 1000, 3)
+        },
+        "fairness": {
+            "assignments": {str(k): v for k, v in zip(manager_ids, counts)},
+            "spread": (max(counts) - min(counts)) if counts else 0,
+            "gini": round(gini(counts), 4)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Distribution fairness/throughput benchmark")
+    parser.add_argument("--database-url", default="sqlite:///./distribution_bench.db")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="round_robin")
+    parser.add_argument("--scenario", choices=SCENARIOS, default="steady")
+    parser.add_argument("--leads", type=int, default=1000)
+    parser.add_argument("--managers", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=0,
+                        help="Лидов в секунду для steady/churn (0 - без пауз)")
+    parser.add_argument("--burst-size", type=int, default=50)
+    parser.add_argument("--burst-gap", type=float, default=0.5)
+    parser.add_argument("--churn-interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true",
+                        help="Не удалять созданные проект и менеджеров")
+    parser.add_argument("--output", help="Файл для JSON-отчета (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    report = run_simulation(
+        database_url=args.database_url,
+        strategy=args.strategy,
+        scenario=args.scenario,
+        leads=args.leads,
+        managers=args.managers,
+        workers=args.workers,
+        rate=args.rate,
+        burst_size=args.burst_size,
+        burst_gap=args.burst_gap,
+        churn_interval=args.churn_interval,
+        seed=args.seed,
+        keep=args.keep
+    )
+
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
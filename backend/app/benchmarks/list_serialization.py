@@ -0,0 +1,174 @@
+# backend/app/benchmarks/list_serialization.py
+
+"""
+Бенчмарк больших списков: обычный путь против fast_json
+
+Заполняет SQLite в памяти (rows лидов, rows сообщений одного лида и
+managers пользователей - обычный get_managers догружает проекты по одному
+запросу на пользователя, на 100k он идет десятки минут), затем через
+TestClient запрашивает GET /leads, /admin/managers и /messages/{lead_id} с
+выключенным и включенным FAST_JSON_RESPONSES и считает строки в секунду. Ответы обоих путей сравниваются - бенчмарк
+заодно проверяет, что JSON одинаковый.
+
+Запуск (из каталога backend):
+    python -m app.benchmarks.list_serialization --rows 100000 --managers 10000 \
+        --output lists.json
+"""
+
+import argparse
+import json
+import logging
+import platform
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from ..auth import require_admin, require_manager
+from ..config import settings
+from ..database import get_db
+from ..fast_json import orjson
+from ..main import app
+from ..models import Base, Bot, Lead, Message, Project, User, project_managers
+
+STARTED = datetime(2024, 1, 1, 9, 0, 0)
+
+
+def seed(session_factory, rows: int, managers: int) -> Dict[str, int]:
+    """rows лидов, rows сообщений у первого лида и managers пользователей"""
+    with session_factory() as db:
+        db.execute(insert(Project), [{"id": i, "name": f"Проект {i}", "created_at": STARTED}
+                                     for i in range(1, 11)])
+        db.execute(insert(Bot), [{"id": 1, "identifier": "bench", "name": "bench",
+                                  "project_id": 1, "token": "-", "auto_reply": "-"}])
+        db.execute(insert(User), [
+            {"id": i, "username": f"manager{i}", "password_hash": "-",
+             "role": "admin" if i == 1 else "manager", "full_name": f"Менеджер {i}",
+             "is_active": True, "created_at": STARTED + timedelta(seconds=i)}
+            for i in range(1, managers + 1)
+        ])
+        db.execute(insert(project_managers), [
+            {"user_id": i, "project_id": i % 10 + 1} for i in range(2, managers + 1)
+        ])
+        db.execute(insert(Lead), [
+            {"id": i, "telegram_chat_id": 10_000_000 + i, "telegram_username": f"user{i}",
+             "telegram_first_name": "Иван", "telegram_last_name": f"Петров {i}",
+             "bot_id": 1, "project_id": i % 10 + 1, "assigned_manager_id": i % (managers - 1) + 2,
+             "status": "new", "created_at": STARTED + timedelta(seconds=i),
+             "last_updated_at": STARTED + timedelta(seconds=i),
+             "last_message_at": STARTED + timedelta(seconds=i),
+             "last_message_preview": "Сколько стоит доставка в Казань?",
+             "last_message_sender": "lead", "message_count": 3, "unread_count": 1}
+            for i in range(1, rows + 1)
+        ])
+        db.execute(insert(Message), [
+            {"lead_id": 1, "sender": "lead" if i % 2 else "manager",
+             "text": "Добрый день, хочу уточнить наличие товара на складе",
+             "created_at": STARTED + timedelta(seconds=i)}
+            for i in range(rows)
+        ])
+        db.commit()
+        return {"admin_id": 1, "lead_id": 1}
+
+
+def measure(client: TestClient, url: str, repeat: int) -> Tuple[Dict, list]:
+    """Лучшее из repeat время ответа и разобранный ответ"""
+    best, payload = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - started
+        response.raise_for_status()
+        best = elapsed if best is None else min(best, elapsed)
+        payload = response.content
+    data = json.loads(payload)
+    return {"rows": len(data), "seconds": round(best, 4),
+            "rows_per_second": round(len(data) / best), "bytes": len(payload)}, data
+
+
+def run_benchmark(rows: int, managers: int, repeat: int) -> Dict:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False},
+                           poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    session_factory = sessionmaker(bind=engine)
+    ids = seed(session_factory, rows, managers)
+
+    with session_factory() as db:
+        admin = db.get(User, ids["admin_id"])
+        db.expunge(admin)
+
+    def override_get_db():
+        db = session_factory()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[require_manager] = lambda: admin
+    app.dependency_overrides[require_admin] = lambda: admin
+    client = TestClient(app)
+
+    endpoints = {"leads": "/leads", "managers": "/admin/managers",
+                 "messages": f"/messages/{ids['lead_id']}"}
+    original = settings.FAST_JSON_RESPONSES
+    results = {}
+    try:
+        for name, url in endpoints.items():
+            settings.FAST_JSON_RESPONSES = False
+            standard, standard_data = measure(client, url, repeat)
+            settings.FAST_JSON_RESPONSES = True
+            fast, fast_data = measure(client, url, repeat)
+            results[name] = {
+                "standard": standard,
+                "fast": fast,
+                "speedup": round(standard["seconds"] / fast["seconds"], 2),
+                "same_json": standard_data == fast_data
+            }
+    finally:
+        settings.FAST_JSON_RESPONSES = original
+        app.dependency_overrides.clear()
+        engine.dispose()
+
+    return {
+        "benchmark": "list_serialization",
+        "timestamp": datetime.utcnow().isoformat(),
+        "environment": {"python": platform.python_version(),
+                        "orjson": getattr(orjson, "__version__", None)},
+        "params": {"rows": rows, "managers": managers, "repeat": repeat},
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Large list serialization benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--managers", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="Файл для JSON-отчета (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    if orjson is None:
+        parser.error("orjson is not installed: the fast path is unavailable")
+    if args.managers < 2:
+        parser.error("--managers must be at least 2")
+
+    # Строка лога на каждый запрос TestClient не нужна
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    report = run_benchmark(args.rows, args.managers, args.repeat)
+
+    payload = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
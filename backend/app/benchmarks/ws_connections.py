@@ -0,0 +1,282 @@
+# backend/app/benchmarks/ws_connections.py
+
+"""
+Нагрузочный бенчмарк /ws: память на подключение и задержка доставки
+
+Поднимает uvicorn с приложением на временной SQLite-базе, открывает N
+WebSocket-клиентов (по --per-manager на менеджера), замеряет прирост RSS
+сервера и затем шлет вебхуки от лидов, измеряя время от POST до получения
+new_message в каждом сокете менеджера. Клиенты отвечают на heartbeat.
+
+Запуск (из каталога backend):
+    python -m app.benchmarks.ws_connections --connections 10000 --output ws.json
+
+Для 10k подключений нужен ulimit -n больше 2 * connections.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+import httpx
+import websockets
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..auth import create_access_token
+from ..models import Base, User, Project, Bot, Lead
+from .distribution import percentile
+
+BOT_IDENTIFIER = "ws-bench-bot"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_bytes(pid: int) -> int | None:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def _raise_nofile_limit(needed: int):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = min(hard, max(soft, needed))
+    if target > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    if target < needed:
+        print(f"warning: RLIMIT_NOFILE={target} < {needed}, "
+              f"some connections will fail", file=sys.stderr)
+
+
+def seed_database(database_url: str, managers: int) -> List[Dict]:
+    """Создает менеджеров, проект, бота и по одному лиду на менеджера"""
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        project = Project(name="ws-bench")
+        db.add(project)
+        db.flush()
+        bot = Bot(identifier=BOT_IDENTIFIER, name="Bench", project_id=project.id,
+                  token="bench", auto_reply="", is_active=True)
+        users = [
+            User(username=f"ws-bench-{i}", password_hash="!", role="manager",
+                 full_name=f"WS Bench {i}", is_active=True)
+            for i in range(managers)
+        ]
+        db.add(bot)
+        db.add_all(users)
+        db.flush()
+        leads = [
+            Lead(telegram_chat_id=10_000_000 + i, bot_id=bot.id,
+                 project_id=project.id, assigned_manager_id=user.id, status="new")
+            for i, user in enumerate(users)
+        ]
+        db.add_all(leads)
+        db.commit()
+        return [
+            {
+                "manager_id": user.id,
+                "token": create_access_token({"sub": user.username}),
+                "chat_id": lead.telegram_chat_id
+            }
+            for user, lead in zip(users, leads)
+        ]
+    finally:
+        db.close()
+        engine.dispose()
+
+
+class BenchClient:
+    def __init__(self, url: str, manager_id: int):
+        self.url = url
+        self.manager_id = manager_id
+        self.latencies: List[float] = []
+        self.connected = asyncio.Event()
+        self.failed = False
+
+    async def run(self, stop: asyncio.Event):
+        try:
+            async with websockets.connect(self.url, max_size=None,
+                                          ping_interval=None,
+                                          open_timeout=60) as ws:
+                self.connected.set()
+                reader = asyncio.create_task(self._read(ws))
+                await stop.wait()
+                reader.cancel()
+        except Exception:
+            self.failed = True
+            self.connected.set()
+
+    async def _read(self, ws):
+        async for raw in ws:
+            event = json.loads(raw)
+            if event.get("type") == "ping":
+                await ws.send('{"type": "pong"}')
+            elif event.get("type") == "new_message":
+                sent_at = float(event["message"]["text"])
+                self.latencies.append(time.time() - sent_at)
+
+
+async def run_benchmark(connections: int, per_manager: int, messages: int,
+                        connect_concurrency: int, settle: float) -> Dict:
+    managers = max(1, connections // per_manager)
+    _raise_nofile_limit(connections * 2 + 1024)
+
+    workdir = tempfile.mkdtemp(prefix="ws-bench-")
+    database_url = f"sqlite:///{workdir}/bench.db"
+    seeds = seed_database(database_url, managers)
+
+    port = _free_port()
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "BROADCAST_BACKEND": "inprocess",
+        "WS_MAX_CONNECTIONS_PER_MANAGER": str(per_manager),
+    }
+    backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+    server_log_path = os.path.join(workdir, "server.log")
+    server_log = open(server_log_path, "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning", "--backlog", "4096"],
+        cwd=backend_dir, env=env, stdout=server_log, stderr=subprocess.STDOUT
+    )
+
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=base_url) as http:
+            for _ in range(100):
+                try:
+                    if (await http.get("/health")).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.1)
+
+            rss_before = _rss_bytes(server.pid)
+
+            stop = asyncio.Event()
+            clients = [
+                BenchClient(f"ws://127.0.0.1:{port}/ws?token={seed['token']}",
+                            seed["manager_id"])
+                for seed in seeds
+                for _ in range(per_manager)
+            ][:connections]
+
+            semaphore = asyncio.Semaphore(connect_concurrency)
+
+            async def start(client: BenchClient):
+                async with semaphore:
+                    task = asyncio.create_task(client.run(stop))
+                    await client.connected.wait()
+                    return task
+
+            connect_started = time.perf_counter()
+            tasks = await asyncio.gather(*(start(c) for c in clients))
+            connect_duration = time.perf_counter() - connect_started
+
+            await asyncio.sleep(settle)
+            rss_after = _rss_bytes(server.pid)
+            connected = sum(1 for c in clients if not c.failed)
+
+            post_started = time.perf_counter()
+            for _ in range(messages):
+                seed = random.choice(seeds)
+                await http.post(f"/webhook/{BOT_IDENTIFIER}", json={
+                    "message": {
+                        "chat": {"id": seed["chat_id"]},
+                        "text": repr(time.time())
+                    }
+                })
+            post_duration = time.perf_counter() - post_started
+
+            await asyncio.sleep(settle)
+            stop.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        server_log.close()
+
+    latencies = [l for c in clients for l in c.latencies]
+    per_connection = None
+    if rss_before is not None and rss_after is not None and connected:
+        per_connection = round((rss_after - rss_before) / connected)
+
+    return {
+        "benchmark": "ws_connections",
+        "timestamp": datetime.utcnow().isoformat(),
+        "environment": {"python": platform.python_version()},
+        "server_log": server_log_path,
+        "params": {
+            "connections": connections,
+            "per_manager": per_manager,
+            "managers": managers,
+            "messages": messages
+        },
+        "connected": connected,
+        "failed": len(clients) - connected,
+        "connect_duration_s": round(connect_duration, 3),
+        "server_rss_bytes": {"before": rss_before, "after": rss_after},
+        "memory_per_connection_bytes": per_connection,
+        "webhooks_per_sec": round(messages / post_duration, 2) if post_duration else 0.0,
+        "deliveries": len(latencies),
+        "fanout_latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(max(latencies, default=0) * 1000, 3)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/ws connection scaling benchmark")
+    parser.add_argument("--connections", type=int, default=10000)
+    parser.add_argument("--per-manager", type=int, default=10)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--connect-concurrency", type=int, default=500)
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="Пауза (с) после подключения и после рассылки")
+    parser.add_argument("--output", help="Файл для JSON-отчета (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(
+        connections=args.connections,
+        per_manager=args.per_manager,
+        messages=args.messages,
+        connect_concurrency=args.connect_concurrency,
+        settle=args.settle
+    ))
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
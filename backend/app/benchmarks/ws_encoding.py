@@ -0,0 +1,165 @@
+# backend/app/benchmarks/ws_encoding.py
+
+"""
+Бенчмарк кодирования WebSocket-событий: JSON против MessagePack
+
+Генерирует реалистичный поток событий (new_message с текстами разной длины,
+lead_status, пачки batch) и для каждого кодека замеряет размер кадров -
+как есть и после permessage-deflate (zlib raw deflate с общим контекстом
+между сообщениями, как по умолчанию в RFC 7692) - и CPU на кодирование и
+декодирование.
+
+Запуск (из каталога backend):
+    python -m app.benchmarks.ws_encoding --events 20000 --output encoding.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from ..ws_protocol import JsonCodec, MsgpackCodec
+from ..websocket import coalesce_events
+
+PHRASES = [
+    "Здравствуйте!",
+    "Сколько стоит доставка в Казань?",
+    "Добрый день, хочу уточнить наличие товара на складе",
+    "Спасибо, жду счет на почту",
+    "Можно ли оплатить картой при получении? И есть ли самовывоз в выходные?",
+    "ok",
+    "Hello, is this still available?",
+]
+STATUSES = ["new", "in_progress", "closed"]
+
+
+def generate_events(count: int, leads: int, batch_size: int, seed: int) -> List[dict]:
+    """Поток кадров: 70% new_message, 20% lead_status, 10% batch"""
+    rng = random.Random(seed)
+    started = datetime(2024, 1, 1, 9, 0, 0)
+    event_id = 1_700_000_000_000_000
+    message_id = 0
+    frames = []
+
+    def single(kind: str) -> dict:
+        nonlocal event_id, message_id
+        event_id += rng.randint(1, 5000)
+        lead_id = rng.randint(1, leads)
+        if kind == "lead_status":
+            return {"type": "lead_status", "lead_id": lead_id,
+                    "status": rng.choice(STATUSES), "event_id": event_id}
+        message_id += 1
+        text = " ".join(rng.choice(PHRASES) for _ in range(rng.randint(1, 3)))
+        return {
+            "type": "new_message",
+            "lead_id": lead_id,
+            "message": {
+                "id": message_id,
+                "sender": rng.choice(["lead", "manager"]),
+                "text": text,
+                "created_at": (started + timedelta(seconds=message_id)).isoformat()
+            },
+            "event_id": event_id
+        }
+
+    for _ in range(count):
+        roll = rng.random()
+        if roll < 0.7:
+            frames.append(single("new_message"))
+        elif roll < 0.9:
+            frames.append(single("lead_status"))
+        else:
+            events = [single(rng.choice(["new_message", "lead_status"]))
+                      for _ in range(batch_size)]
+            frames.append({"type": "batch", "events": coalesce_events(events)})
+    return frames
+
+
+def _as_bytes(data) -> bytes:
+    return data.encode("utf-8") if isinstance(data, str) else data
+
+
+def measure(codec, frames: List[dict]) -> Dict:
+    started = time.perf_counter()
+    encoded = [codec.encode(frame) for frame in frames]
+    encode_time = time.perf_counter() - started
+
+    payloads = [_as_bytes(data) for data in encoded]
+
+    started = time.perf_counter()
+    for data in encoded:
+        codec.decode(data)
+    decode_time = time.perf_counter() - started
+
+    # permessage-deflate с context takeover: один компрессор на соединение
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -15)
+    started = time.perf_counter()
+    # Хвост 00 00 ff ff по RFC 7692 не передается
+    deflated = sum(
+        len(compressor.compress(p) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+        for p in payloads
+    )
+    deflate_time = time.perf_counter() - started
+
+    raw = sum(len(p) for p in payloads)
+    count = len(frames)
+    return {
+        "bytes_total": raw,
+        "bytes_per_frame": round(raw / count, 1),
+        "deflated_bytes_total": deflated,
+        "deflated_bytes_per_frame": round(deflated / count, 1),
+        "encode_us_per_frame": round(encode_time / count * 1e6, 3),
+        "decode_us_per_frame": round(decode_time / count * 1e6, 3),
+        "deflate_us_per_frame": round(deflate_time / count * 1e6, 3)
+    }
+
+
+def run_benchmark(events: int, leads: int, batch_size: int, seed: int) -> Dict:
+    frames = generate_events(events, leads, batch_size, seed)
+    results = {
+        "json": measure(JsonCodec(), frames),
+        "msgpack": measure(MsgpackCodec(), frames)
+    }
+    json_result, msgpack_result = results["json"], results["msgpack"]
+    return {
+        "benchmark": "ws_encoding",
+        "timestamp": datetime.utcnow().isoformat(),
+        "environment": {"python": platform.python_version()},
+        "params": {"events": events, "leads": leads,
+                   "batch_size": batch_size, "seed": seed},
+        "results": results,
+        "msgpack_vs_json": {
+            "raw_size_ratio": round(
+                msgpack_result["bytes_total"] / json_result["bytes_total"], 3),
+            "deflated_size_ratio": round(
+                msgpack_result["deflated_bytes_total"]
+                / json_result["deflated_bytes_total"], 3)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket encoding benchmark")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--leads", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Файл для JSON-отчета (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.events, args.leads, args.batch_size, args.seed)
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+# backend/app/broadcast.py
+
+"""
+Бэкенды рассылки real-time событий между воркерами
+
+ConnectionManager публикует событие (envelope) в бэкенд, а бэкенд доставляет
+его в каждый воркер, где ConnectionManager сам отправляет его в свои сокеты.
+
+- InProcessBackend - по умолчанию, доставка внутри одного процесса
+- InMemoryBackend - несколько "воркеров" в одном процессе, для тестов
+- PostgresNotifyBackend - LISTEN/NOTIFY, для uvicorn с несколькими воркерами
+"""
+
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, List, Optional, Set
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[None]]
+
+# Лимит payload у NOTIFY - 8000 байт, оставляем запас
+MAX_NOTIFY_PAYLOAD = 7900
+
+
+class BroadcastBackend:
+    def __init__(self):
+        self._handler: Optional[Handler] = None
+
+    def set_handler(self, handler: Handler):
+        self._handler = handler
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def publish(self, envelope: dict):
+        raise NotImplementedError
+
+    async def _deliver(self, envelope: dict):
+        if self._handler is None:
+            return
+        try:
+            await self._handler(envelope)
+        except Exception as e:
+            logger.error(f"Broadcast delivery failed: {e!r}")
+
+
+class InProcessBackend(BroadcastBackend):
+    """Доставка в текущий процесс без сериализации"""
+
+    async def publish(self, envelope: dict):
+        await self._deliver(envelope)
+
+
+class InMemoryHub:
+    """Общая "шина" для InMemoryBackend, имитирует несколько воркеров"""
+
+    def __init__(self):
+        self.backends: List["InMemoryBackend"] = []
+
+
+class InMemoryBackend(BroadcastBackend):
+    """Доставка во все бэкенды одного хаба через JSON, как по сети"""
+
+    def __init__(self, hub: InMemoryHub):
+        super().__init__()
+        self.hub = hub
+
+    async def start(self):
+        if self not in self.hub.backends:
+            self.hub.backends.append(self)
+
+    async def stop(self):
+        if self in self.hub.backends:
+            self.hub.backends.remove(self)
+
+    async def publish(self, envelope: dict):
+        payload = json.dumps(envelope)
+        await asyncio.gather(*(
+            backend._deliver(json.loads(payload))
+            for backend in list(self.hub.backends)
+        ))
+
+
+def pack_payloads(envelopes: List[str],
+                  limit: int = MAX_NOTIFY_PAYLOAD) -> List[str]:
+    """Склеивает сериализованные события в JSON-массивы не длиннее limit байт"""
+    payloads = []
+    batch: List[str] = []
+    size = 2
+
+    for envelope in envelopes:
+        length = len(envelope.encode("utf-8"))
+        if length + 2 > limit:
+            logger.warning(f"Broadcast event of {length} bytes exceeds NOTIFY limit")
+            continue
+        if batch and size + length + 1 > limit:
+            payloads.append("[" + ",".join(batch) + "]")
+            batch, size = [], 2
+        batch.append(envelope)
+        size += length + (1 if len(batch) > 1 else 0)
+
+    if batch:
+        payloads.append("[" + ",".join(batch) + "]")
+    return payloads
+
+
+class PostgresNotifyBackend(BroadcastBackend):
+    """
+    Рассылка через Postgres LISTEN/NOTIFY
+
+    События копятся batch_window секунд и уходят пачкой NOTIFY-ов (JSON-массивы).
+    Слушатель живет на отдельном соединении и переподключается с backoff.
+    Событие, которое само по себе не влезает в NOTIFY, доставляется только
+    локально.
+    """
+
+    def __init__(self, database_url: str, channel: str = "leads_events",
+                 batch_window: float = 0.01, reconnect_delay: float = 1.0,
+                 max_reconnect_delay: float = 30.0):
+        super().__init__()
+        self.dsn = make_url(database_url).set(
+            drivername="postgresql").render_as_string(hide_password=False)
+        self.channel = channel
+        self.batch_window = batch_window
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self._pending: List[str] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._listen_task: Optional[asyncio.Task] = None
+        # Ссылки на задачи доставки, иначе их может собрать GC на полпути
+        self._deliveries: Set[asyncio.Task] = set()
+        self._publish_conn = None
+        self._listen_conn = None
+        self._lost: Optional[asyncio.Event] = None
+        self._running = False
+
+    def _connect(self):
+        import psycopg2
+
+        conn = psycopg2.connect(
+            self.dsn,
+            keepalives=1,
+            keepalives_idle=30,
+            keepalives_interval=10,
+            keepalives_count=3
+        )
+        conn.autocommit = True
+        return conn
+
+    async def start(self):
+        self._running = True
+        self._listen_task = asyncio.create_task(self._listen_loop())
+
+    async def stop(self):
+        self._running = False
+        if self._flush_task:
+            await self._flush_task
+        if self._listen_task:
+            self._listen_task.cancel()
+            try:
+                await self._listen_task
+            except asyncio.CancelledError:
+                pass
+        for conn in (self._publish_conn, self._listen_conn):
+            if conn is not None:
+                conn.close()
+        self._publish_conn = self._listen_conn = None
+
+    async def publish(self, envelope: dict):
+        serialized = json.dumps(envelope)
+        if len(serialized.encode("utf-8")) + 2 > MAX_NOTIFY_PAYLOAD:
+            await self._deliver(envelope)
+            return
+
+        self._pending.append(serialized)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        """
+        Отправляет накопленное, пока очередь не опустеет
+
+        publish не запускает новую задачу, пока эта жива, поэтому события,
+        пришедшие во время NOTIFY, забирает следующий круг этого цикла.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.batch_window)
+            pending, self._pending = self._pending, []
+            payloads = pack_payloads(pending)
+            if payloads:
+                try:
+                    await loop.run_in_executor(None, self._notify_sync, payloads)
+                except Exception as e:
+                    logger.error(f"NOTIFY failed, {len(pending)} events dropped: {e!r}")
+            # Между проверкой и завершением задачи нет await - publish не проскочит
+            if not self._pending:
+                return
+
+    def _notify_sync(self, payloads: List[str]):
+        for attempt in range(2):
+            try:
+                if self._publish_conn is None or self._publish_conn.closed:
+                    self._publish_conn = self._connect()
+                with self._publish_conn.cursor() as cur:
+                    for payload in payloads:
+                        cur.execute("SELECT pg_notify(%s, %s)",
+                                    (self.channel, payload))
+                return
+            except Exception:
+                if self._publish_conn is not None:
+                    self._publish_conn.close()
+                self._publish_conn = None
+                if attempt:
+                    raise
+
+    async def _listen_loop(self):
+        loop = asyncio.get_running_loop()
+        delay = self.reconnect_delay
+
+        while self._running:
+            try:
+                conn = await loop.run_in_executor(None, self._connect)
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN "{self.channel}"')
+            except Exception as e:
+                logger.error(f"Broadcast listener connect failed: {e!r}, "
+                             f"retry in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+                continue
+
+            delay = self.reconnect_delay
+            self._listen_conn = conn
+            self._lost = asyncio.Event()
+            loop.add_reader(conn.fileno(), self._on_readable)
+            logger.info(f"Broadcast listener subscribed to {self.channel}")
+
+            try:
+                await self._lost.wait()
+            finally:
+                loop.remove_reader(conn.fileno())
+                conn.close()
+                self._listen_conn = None
+
+            logger.warning("Broadcast listener connection lost, reconnecting")
+
+    def _on_readable(self):
+        conn = self._listen_conn
+        try:
+            conn.poll()
+        except Exception as e:
+            logger.error(f"Broadcast listener poll failed: {e!r}")
+            self._lost.set()
+            return
+
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            try:
+                envelopes = json.loads(notify.payload)
+            except ValueError:
+                logger.error("Broadcast listener got malformed payload")
+                continue
+            for envelope in envelopes:
+                task = asyncio.create_task(self._deliver(envelope))
+                self._deliveries.add(task)
+                task.add_done_callback(self._deliveries.discard)
+
+
+def create_backend(settings) -> BroadcastBackend:
+    if settings.BROADCAST_BACKEND == "postgres":
+        return PostgresNotifyBackend(
+            settings.DATABASE_URL,
+            channel=settings.BROADCAST_CHANNEL,
+            batch_window=settings.BROADCAST_BATCH_WINDOW_MS / 1000
+        )
+    if settings.BROADCAST_BACKEND != "inprocess":
+        raise ValueError(f"Unknown broadcast backend {settings.BROADCAST_BACKEND}")
+    return InProcessBackend()
@@ -1,5 +1,6 @@
 # backend/app/database.py
 
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from .config import settings
@@ -14,4 +15,14 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+@contextmanager
+def session_scope():
+    """Короткая сессия вне FastAPI-зависимостей (WebSocket, фоновые задачи)"""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
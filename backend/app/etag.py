@@ -0,0 +1,73 @@
+# backend/app/etag.py
+
+"""
+Валидаторы для условных GET по лиду и его переписке
+
+Версия лида - last_updated_at, статус, назначенный менеджер и id последнего
+сообщения. Все это читается одним запросом по первичному ключу и индексу
+сообщений, до загрузки самих строк, поэтому ответ 304 почти ничего не стоит.
+"""
+
+from fastapi import HTTPException, Request, Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from .models import Lead, Message, User
+
+
+def lead_version(db: Session, lead_id: int):
+    """Строка (id, assigned_manager_id, status, last_updated_at, last_message_id)"""
+    last_message_id = select(func.max(Message.id)).where(
+        Message.lead_id == Lead.id
+    ).scalar_subquery()
+    return db.query(
+        Lead.id,
+        Lead.assigned_manager_id,
+        Lead.status,
+        Lead.last_updated_at,
+        last_message_id.label("last_message_id")
+    ).filter(Lead.id == lead_id).first()
+
+
+def make_etag(version) -> str:
+    updated = version.last_updated_at.timestamp() if version.last_updated_at else 0
+    return (f'W/"{version.id}.{int(updated * 1_000_000)}.'
+            f'{version.last_message_id or 0}.{version.status}.'
+            f'{version.assigned_manager_id}"')
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Слабое сравнение по RFC 9110: W/ не учитывается"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == opaque
+        for candidate in if_none_match.split(",")
+    )
+
+
+def check_lead_etag(db: Session, lead_id: int, current_user: User,
+                    request: Request, response: Response) -> Response | None:
+    """
+    Проверяет доступ к лиду и If-None-Match
+
+    Возвращает готовый ответ 304, если у клиента актуальная версия; иначе
+    выставляет ETag в response и возвращает None.
+    """
+    version = lead_version(db, lead_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Lead not found")
+
+    if current_user.role == "manager":
+        if version.assigned_manager_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Access denied")
+
+    etag = make_etag(version)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return None
@@ -0,0 +1,184 @@
+# backend/app/export.py
+
+"""
+Потоковая выгрузка лидов с перепиской
+
+Лиды читаются серверным курсором (yield_per) пачками по EXPORT_BATCH, для
+каждой пачки одним запросом подтягиваются сообщения (и архив, см.
+archive.py). В памяти одновременно только одна пачка, поэтому объем
+выгрузки не ограничен.
+
+Форматы: ndjson - строка на лид с массивом messages; csv - строка на
+сообщение с полями лида (лид без сообщений - одна строка с пустыми полями
+сообщения). Любой формат можно сжать gzip.
+
+Запуск (из каталога backend):
+    python -m app.export --project-id 1 --format csv --gzip -o leads.csv.gz
+"""
+
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from sqlalchemy.orm import Session
+from .archive import unpack_messages
+from .database import session_scope
+from .models import Lead, Message, MessageArchive
+
+EXPORT_BATCH = 500
+
+FORMATS = ("ndjson", "csv")
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+LEAD_FIELDS = ["id", "project_id", "bot_id", "assigned_manager_id", "status",
+               "telegram_chat_id", "telegram_username", "telegram_first_name",
+               "telegram_last_name", "created_at", "closed_at"]
+
+MESSAGE_FIELDS = ["id", "sender", "text", "created_at"]
+
+CSV_HEADER = [f"lead_{field}" for field in LEAD_FIELDS] + \
+             [f"message_{field}" for field in MESSAGE_FIELDS]
+
+
+def _lead_query(db: Session, project_id: int | None = None, bot_id: int | None = None,
+                status: str | None = None, date_from: date | None = None,
+                date_to: date | None = None):
+    query = db.query(Lead)
+    if project_id is not None:
+        query = query.filter(Lead.project_id == project_id)
+    if bot_id is not None:
+        query = query.filter(Lead.bot_id == bot_id)
+    if status is not None:
+        query = query.filter(Lead.status == status)
+    if date_from is not None:
+        query = query.filter(Lead.created_at >= datetime.combine(date_from, time.min))
+    if date_to is not None:
+        query = query.filter(
+            Lead.created_at < datetime.combine(date_to + timedelta(days=1), time.min))
+    return query.order_by(Lead.id)
+
+
+def _messages_for(db: Session, lead_ids: List[int]) -> Dict[int, List[Message]]:
+    by_lead = {lead_id: [] for lead_id in lead_ids}
+    for archive in db.query(MessageArchive).filter(MessageArchive.lead_id.in_(lead_ids)):
+        by_lead[archive.lead_id].extend(unpack_messages(archive.lead_id, archive.payload))
+    hot = db.query(Message).filter(Message.lead_id.in_(lead_ids)).order_by(
+        Message.lead_id, Message.created_at, Message.id)
+    for message in hot:
+        by_lead[message.lead_id].append(message)
+    for messages in by_lead.values():
+        messages.sort(key=lambda m: (m.created_at or datetime.min, m.id))
+    return by_lead
+
+
+def iter_conversations(db: Session, batch_size: int = EXPORT_BATCH,
+                       **filters) -> Iterator[Tuple[Lead, List[Message]]]:
+    """(лид, сообщения по порядку) для всех лидов под фильтры"""
+    batch = []
+    for lead in _lead_query(db, **filters).yield_per(batch_size):
+        batch.append(lead)
+        if len(batch) == batch_size:
+            yield from _emit(db, batch)
+            batch = []
+    if batch:
+        yield from _emit(db, batch)
+
+
+def _emit(db: Session, leads: List[Lead]) -> Iterator[Tuple[Lead, List[Message]]]:
+    messages = _messages_for(db, [lead.id for lead in leads])
+    for lead in leads:
+        yield lead, messages[lead.id]
+    # Отпускаем пачку: сессия живет всю выгрузку
+    for lead in leads:
+        db.expunge(lead)
+
+
+def _value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _row(obj, fields: List[str]) -> list:
+    return [_value(getattr(obj, field)) for field in fields]
+
+
+def ndjson_lines(conversations: Iterable[Tuple[Lead, List[Message]]]) -> Iterator[str]:
+    for lead, messages in conversations:
+        record = dict(zip(LEAD_FIELDS, _row(lead, LEAD_FIELDS)))
+        record["messages"] = [dict(zip(MESSAGE_FIELDS, _row(m, MESSAGE_FIELDS)))
+                              for m in messages]
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def csv_lines(conversations: Iterable[Tuple[Lead, List[Message]]]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_HEADER)
+    for lead, messages in conversations:
+        lead_row = _row(lead, LEAD_FIELDS)
+        for message in messages or [None]:
+            message_row = _row(message, MESSAGE_FIELDS) if message else \
+                [None] * len(MESSAGE_FIELDS)
+            writer.writerow(lead_row + message_row)
+        # Одна порция на лид, буфер не растет
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_stream(format: str = "ndjson", gzip: bool = False,
+                  **filters) -> Iterator[bytes]:
+    """Байты выгрузки; собственная сессия живет, пока читают поток"""
+    lines = ndjson_lines if format == "ndjson" else csv_lines
+    with session_scope() as db:
+        chunks = (line.encode("utf-8") for line in lines(iter_conversations(db, **filters)))
+        if gzip:
+            chunks = gzip_chunks(chunks)
+        yield from chunks
+
+
+def filename(format: str, gzip: bool) -> str:
+    name = f"leads-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return name + ".gz" if gzip else name
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export leads with their conversations")
+    parser.add_argument("--project-id", type=int)
+    parser.add_argument("--bot-id", type=int)
+    parser.add_argument("--status")
+    parser.add_argument("--date-from", type=date.fromisoformat)
+    parser.add_argument("--date-to", type=date.fromisoformat)
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("-o", "--output", help="файл (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    stream = export_stream(args.format, args.gzip, project_id=args.project_id,
+                           bot_id=args.bot_id, status=args.status,
+                           date_from=args.date_from, date_to=args.date_to)
+    output = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream:
+            output.write(chunk)
+    finally:
+        if args.output:
+            output.close()
+
+
+if __name__ == "__main__":
+    main()
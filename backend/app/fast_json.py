@@ -0,0 +1,45 @@
+# backend/app/fast_json.py
+
+"""
+Быстрая сериализация больших списков
+
+Обычный путь: ORM-объекты -> dict на строку -> проверка response_model ->
+jsonable_encoder -> json.dumps. Для списков в десятки тысяч строк это
+основная часть CPU. Быстрый путь (settings.FAST_JSON_RESPONSES) читает
+кортежи колонок через select(...) и отдает их ORJSONResponse напрямую;
+форма JSON та же, что у response_model.
+"""
+
+from typing import List
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from .config import settings
+
+try:
+    import orjson
+except ImportError:  # orjson - опциональная зависимость
+    orjson = None
+
+
+def enabled() -> bool:
+    return settings.FAST_JSON_RESPONSES and orjson is not None
+
+
+def rows_to_dicts(rows) -> List[dict]:
+    """Строки select(...) как dict по именам колонок"""
+    if not rows:
+        return []
+    keys = list(rows[0]._fields)
+    return [dict(zip(keys, row)) for row in rows]
+
+
+def json_response(content, response: Response | None = None) -> ORJSONResponse:
+    """
+    Готовый ответ в обход response_model
+
+    Заголовки, выставленные в инжектированный response (ETag, X-Next-Cursor),
+    переносятся: FastAPI не объединяет их с возвращенным Response.
+    """
+    headers = dict(response.headers) if response is not None else None
+    return ORJSONResponse(content, headers=headers)
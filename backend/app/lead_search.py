@@ -0,0 +1,153 @@
+# backend/app/lead_search.py
+
+"""
+Поиск лидов по telegram username и имени (typeahead)
+
+Запрос сравнивается без учета регистра с username и строкой "имя фамилия".
+Сначала идут совпадения с начала строки, затем вхождения подстроки.
+
+PostgreSQL: префиксы ищутся по btree-индексам text_pattern_ops, подстроки -
+по GIN-индексам pg_trgm (LIKE '%q%'), вхождения ранжируются similarity().
+SQLite: подстроки ищутся по FTS5-таблице leads_search с токенизатором
+trigram; префиксы поднимаются наверх в Python среди самых новых
+limit * SQLITE_CANDIDATES_PER_RESULT вхождений.
+
+Прочие СУБД: без индексов, LIKE по lower(...) с префиксами наверху.
+
+Триграммы требуют не меньше трех символов, поэтому более короткий запрос
+ищется только как префикс.
+"""
+
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from .models import LEAD_FULL_NAME_SQL, LEAD_USERNAME_SQL
+
+MIN_TRIGRAM_LENGTH = 3
+
+SQLITE_CANDIDATES_PER_RESULT = 10
+
+
+def normalize_query(query: str) -> str:
+    """Без пробелов по краям, @ в начале username и регистра"""
+    return " ".join(query.split()).lstrip("@").lower()
+
+
+def like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _scope(manager_id: int | None, column: str) -> Tuple[str, dict]:
+    if manager_id is None:
+        return "", {}
+    return f" AND {column} = :manager_id", {"manager_id": manager_id}
+
+
+def _matches(pattern: str) -> str:
+    return (f"({LEAD_USERNAME_SQL} LIKE {pattern} ESCAPE '\\' "
+            f"OR {LEAD_FULL_NAME_SQL} LIKE {pattern} ESCAPE '\\')")
+
+
+def _postgres_sql(scope: str, substring: bool) -> str:
+    prefix = f"""
+        SELECT id, 2.0 AS score FROM leads
+        WHERE {_matches(':prefix')}{scope}
+        ORDER BY id DESC
+        LIMIT :limit
+    """
+    if not substring:
+        return prefix
+    return f"""
+        WITH prefix AS ({prefix}),
+        contains AS (
+            SELECT id, greatest(similarity({LEAD_USERNAME_SQL}, :query),
+                                similarity({LEAD_FULL_NAME_SQL}, :query)) AS score
+            FROM leads
+            WHERE {_matches(':substring')}{scope}
+              AND id NOT IN (SELECT id FROM prefix)
+            ORDER BY score DESC, id DESC
+            LIMIT :limit
+        )
+        SELECT id, score FROM prefix
+        UNION ALL
+        SELECT id, score FROM contains
+        ORDER BY score DESC, id DESC
+        LIMIT :limit
+    """
+
+
+def _fallback_sql(scope: str, substring: bool) -> str:
+    pattern = ":substring" if substring else ":prefix"
+    return f"""
+        SELECT id FROM leads
+        WHERE {_matches(pattern)}{scope}
+        ORDER BY CASE WHEN {_matches(':prefix')} THEN 0 ELSE 1 END, id DESC
+        LIMIT :limit
+    """
+
+
+def _sqlite_prefix_sql(scope: str) -> str:
+    # LIKE в SQLite без учета регистра только для ASCII
+    return f"""
+        SELECT id FROM leads
+        WHERE {_matches(':prefix')}{scope}
+        ORDER BY id DESC
+        LIMIT :limit
+    """
+
+
+def _sqlite_substring_sql(scope: str) -> str:
+    return f"""
+        SELECT leads_search.rowid AS id, leads_search.username, leads_search.full_name
+        FROM leads_search
+        JOIN leads l ON l.id = leads_search.rowid
+        WHERE leads_search MATCH :query{scope}
+        ORDER BY leads_search.rowid DESC
+        LIMIT :candidates
+    """
+
+
+def search_leads(db: Session, query: str, limit: int,
+                 manager_id: int | None = None) -> List[int]:
+    """
+    id лидов, подходящих под запрос, в порядке выдачи
+
+    manager_id ограничивает выдачу лидами менеджера.
+    """
+    query = normalize_query(query)
+    if not query:
+        return []
+    dialect = db.get_bind().dialect.name
+    substring = len(query) >= MIN_TRIGRAM_LENGTH
+    params = {"limit": limit, "query": query,
+              "prefix": f"{like_escape(query)}%",
+              "substring": f"%{like_escape(query)}%"}
+
+    if dialect == "postgresql":
+        scope, scope_params = _scope(manager_id, "assigned_manager_id")
+        rows = db.execute(text(_postgres_sql(scope, substring)), {**params, **scope_params})
+        return [row.id for row in rows]
+
+    if dialect != "sqlite":
+        scope, scope_params = _scope(manager_id, "assigned_manager_id")
+        rows = db.execute(text(_fallback_sql(scope, substring)), {**params, **scope_params})
+        return [row.id for row in rows]
+
+    if not substring:
+        scope, scope_params = _scope(manager_id, "assigned_manager_id")
+        rows = db.execute(text(_sqlite_prefix_sql(scope)), {**params, **scope_params})
+        return [row.id for row in rows]
+
+    # Фраза в кавычках: trigram ищет ее как подстроку в любой колонке
+    scope, scope_params = _scope(manager_id, "l.assigned_manager_id")
+    phrase = '"' + query.replace('"', '""') + '"'
+    rows = db.execute(text(_sqlite_substring_sql(scope)),
+                      {"query": phrase, "candidates": limit * SQLITE_CANDIDATES_PER_RESULT,
+                       **scope_params}).all()
+    ranked = sorted(
+        rows,
+        key=lambda row: (not (row.username.lower().startswith(query)
+                              or row.full_name.lower().startswith(query)), -row.id)
+    )
+    return [row.id for row in ranked[:limit]]
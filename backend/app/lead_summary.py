@@ -0,0 +1,27 @@
+# backend/app/lead_summary.py
+
+"""
+Денормализованная сводка переписки на лиде
+
+Обновляется в той же транзакции, что и вставка сообщения. Счетчики
+увеличиваются SQL-выражением (message_count = message_count + 1), чтобы
+параллельные вебхуки по одному лиду не теряли инкременты.
+"""
+
+from .models import Lead, Message
+
+PREVIEW_LENGTH = 200
+
+
+def apply_message(lead: Lead, message: Message):
+    """Учесть новое сообщение в сводке лида"""
+    lead.last_message_at = message.created_at
+    lead.last_message_preview = (message.text or "")[:PREVIEW_LENGTH]
+    lead.last_message_sender = message.sender
+    lead.message_count = Lead.message_count + 1
+    if message.sender == "lead":
+        lead.unread_count = Lead.unread_count + 1
+
+
+def reset_unread(lead: Lead):
+    lead.unread_count = 0
@@ -2,13 +2,22 @@
 
 from fastapi import FastAPI, Request, Depends, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import logging
-from .database import get_db
-from .api import auth, admin, leads, messages, stats
+from datetime import timedelta
+from .database import get_db, SessionLocal
+from .api import auth, admin, leads, messages, stats, sync
 from .telegram_handler import handle_start_command, handle_incoming_message
 from .websocket import manager as ws_manager
-from .models import User
+from .broadcast import create_backend
+from .replay import DatabaseSpill
+from .config import settings
+from .auth import authenticate_websocket_token
+from .ws_protocol import decode_client_frame
+from .sse import event_stream
+from .auto_close import start_auto_close, stop_auto_close
+from .archive import start_partition_maintenance, stop_partition_maintenance
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -25,6 +34,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 app.include_router(auth.router)
@@ -32,6 +42,37 @@ app.include_router(admin.router)
 app.include_router(leads.router)
 app.include_router(messages.router)
 app.include_router(stats.router)
+app.include_router(sync.router)
+
+
+@app.on_event("startup")
+async def start_broadcast():
+    ws_manager.set_backend(create_backend(settings))
+    if settings.WS_REPLAY_SPILL:
+        ws_manager.replay.spill = DatabaseSpill(
+            SessionLocal,
+            retention=timedelta(minutes=settings.WS_REPLAY_SPILL_RETENTION_MINUTES))
+        ws_manager.replay.spill.start_purge(settings.WS_REPLAY_SPILL_PURGE_INTERVAL)
+    await ws_manager.backend.start()
+    ws_manager.start_heartbeat(settings.WS_HEARTBEAT_INTERVAL,
+                               settings.WS_HEARTBEAT_MAX_MISSED)
+    start_auto_close(SessionLocal, settings.AUTO_CLOSE_INTERVAL_MINUTES,
+                     settings.AUTO_CLOSE_BATCH_SIZE)
+    start_partition_maintenance(SessionLocal, settings.PARTITIONS_CHECK_INTERVAL_HOURS)
+
+
+@app.on_event("shutdown")
+async def stop_broadcast():
+    # Уже принятые из чат-сокетов сообщения должны уйти в Telegram
+    await messages.send_pipeline.drain()
+    await stop_auto_close()
+    await stop_partition_maintenance()
+    await ws_manager.backend.stop()
+    await ws_manager.stop_heartbeat()
+    await ws_manager.close_all()
+    if ws_manager.replay.spill:
+        await ws_manager.replay.spill.stop_purge()
+        ws_manager.replay.spill.flush()
 
 
 @app.get("/")
@@ -43,51 +84,112 @@ async def root():
     }
 
 
+def handle_subscription(user, connection_id: str, frame: dict | None):
+    """
+    Подписка на ленту проекта: {"type": "subscribe", "project_id": 1}
+
+    Лента содержит new_lead, new_message, lead_status и lead_reassigned по всем
+    лидам проекта. Подписываться могут только администраторы.
+    """
+    if not frame or frame.get("type") not in ("subscribe", "unsubscribe"):
+        return
+
+    project_id = frame.get("project_id")
+    if user.role != "admin":
+        reply = {"type": "error", "message": "Access denied"}
+    elif not isinstance(project_id, int):
+        reply = {"type": "error", "message": "project_id is required"}
+    elif frame["type"] == "subscribe":
+        ws_manager.subscribe(user.id, connection_id, project_id)
+        reply = {"type": "subscribed", "project_id": project_id}
+    else:
+        ws_manager.unsubscribe(user.id, connection_id, project_id)
+        reply = {"type": "unsubscribed", "project_id": project_id}
+
+    ws_manager.send_to_connection(user.id, connection_id, reply)
+
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, db: Session = Depends(get_db)):
+async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint для real-time уведомлений"""
     manager_id = None
+    connection_id = None
     try:
         token = websocket.query_params.get("token")
         if not token:
             await websocket.close(code=4001)
             return
 
-        from jose import jwt, JWTError
-        from .config import settings
+        user = authenticate_websocket_token(token)
+        if not user or user.role not in ["admin", "manager"]:
+            await websocket.close(code=4003)
+            return
 
-        try:
-            payload = jwt.decode(
-                token,
-                settings.JWT_SECRET_KEY,
-                algorithms=[settings.JWT_ALGORITHM]
-            )
-            username = payload.get("sub")
-            user = db.query(User).filter(User.username == username).first()
+        manager_id = user.id
 
-            if not user or user.role not in ["admin", "manager"]:
-                await websocket.close(code=4003)
-                return
+        since = websocket.query_params.get("since")
+        if since is not None:
+            # Некорректный since трактуем как слишком старый - клиент получит resync
+            since = int(since) if since.isdigit() else 0
 
-            manager_id = user.id
-        except JWTError:
-            await websocket.close(code=4003)
-            return
+        # Клиент может попросить батчинг: /ws?batch_ms=50
+        batch_ms = websocket.query_params.get("batch_ms", "0")
+        batch_ms = int(batch_ms) if batch_ms.isdigit() else 0
 
-        await ws_manager.connect(manager_id, websocket)
+        # Sec-WebSocket-Protocol: leads.msgpack.v1 - бинарные кадры MessagePack
+        connection_id = await ws_manager.connect(
+            manager_id, websocket, since=since, batch_ms=batch_ms,
+            subprotocols=websocket.scope.get("subprotocols", []))
 
         while True:
-            data = await websocket.receive_text()
-            logger.info(f"Received from manager {manager_id}: {data}")
+            # receive() вместо receive_text(): в msgpack-режиме pong бинарный
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            # Любой кадр от клиента (в том числе {"type": "pong"}) - признак жизни
+            ws_manager.touch(manager_id, connection_id)
+            frame = decode_client_frame(message)
+            logger.debug(f"Received from manager {manager_id}: {frame}")
+            handle_subscription(user, connection_id, frame)
 
     except WebSocketDisconnect:
-        if manager_id:
-            ws_manager.disconnect(manager_id)
         logger.info(f"Manager {manager_id} disconnected")
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
-        if manager_id:
-            ws_manager.disconnect(manager_id)
+    finally:
+        if connection_id:
+            ws_manager.disconnect(manager_id, connection_id)
+
+
+@app.get("/events")
+async def sse_endpoint(request: Request):
+    """
+    Server-Sent Events - тот же поток событий, что и /ws
+
+    Токен передается в ?token= (EventSource не умеет заголовки) или в
+    Authorization. Пропущенные события повторяются по Last-Event-ID.
+    """
+    token = request.query_params.get("token")
+    authorization = request.headers.get("authorization", "")
+    if not token and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    # Без Depends(get_db): сессия прожила бы столько же, сколько поток
+    user = authenticate_websocket_token(token)
+    if not user or user.role not in ["admin", "manager"]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    since = request.headers.get("last-event-id") or request.query_params.get("since")
+    if since is not None:
+        since = int(since) if since.isdigit() else 0
+
+    return StreamingResponse(
+        event_stream(ws_manager, user.id, since, settings.SSE_KEEPALIVE_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.post("/webhook/{bot_identifier}")
@@ -128,11 +230,11 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    from .config import settings
 
     uvicorn.run(
         "app.main:app",
         host=settings.HOST,
         port=settings.PORT,
-        reload=True
+        reload=True,
+        ws_per_message_deflate=settings.WS_PER_MESSAGE_DEFLATE
     )
\ No newline at end of file
@@ -1,6 +1,6 @@
 # backend/app/models.py
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Table, BigInteger
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Table, BigInteger, Index, DDL, event, LargeBinary, FetchedValue
 from sqlalchemy.orm import declarative_base, relationship
 from datetime import datetime
 
@@ -20,6 +20,8 @@ class Project(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Дней без изменений до автозакрытия (см. auto_close.py); NULL или 0 - не закрывать
+    auto_close_after_days = Column(Integer, nullable=True)
 
     managers = relationship("User", secondary=project_managers, back_populates="projects")
     bots = relationship("Bot", back_populates="project")
@@ -38,7 +40,8 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
-    projects = relationship("Project", secondary=project_managers, back_populates="managers")
+    projects = relationship("Project", secondary=project_managers, back_populates="managers",
+                            order_by="Project.id")
     leads = relationship("Lead", back_populates="manager")
 
 
@@ -74,10 +77,37 @@ class Lead(Base):
     last_updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     closed_at = Column(DateTime, nullable=True)
 
+    # Сводка по переписке для списка лидов (см. lead_summary.py)
+    last_message_at = Column(DateTime, nullable=True)
+    last_message_preview = Column(String(200), nullable=True)
+    last_message_sender = Column(String, nullable=True)
+    message_count = Column(Integer, nullable=False, default=0, server_default="0")
+    unread_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Глобальная версия изменения строки и транзакция, которая ее записала
+    # (см. ROW_VERSION_DDL, sync.py)
+    row_version = Column(BigInteger, nullable=False, server_default="0",
+                         server_onupdate=FetchedValue())
+    row_txid = Column(BigInteger, nullable=False, server_default="0",
+                      server_onupdate=FetchedValue())
+
     bot = relationship("Bot", back_populates="leads")
     project = relationship("Project", back_populates="leads")
     manager = relationship("User", back_populates="leads")
     messages = relationship("Message", back_populates="lead", cascade="all, delete-orphan")
+    archive = relationship("MessageArchive", uselist=False, cascade="all, delete-orphan")
+
+    # Список лидов: фильтр по менеджеру/статусу, курсор по (дата, id) от новых
+    __table_args__ = (
+        Index("ix_leads_manager_status_updated",
+              "assigned_manager_id", "status", "last_updated_at", "id"),
+        Index("ix_leads_manager_updated", "assigned_manager_id", "last_updated_at", "id"),
+        Index("ix_leads_manager_created", "assigned_manager_id", "created_at", "id"),
+        Index("ix_leads_status_updated", "status", "last_updated_at", "id"),
+        Index("ix_leads_created_id", "created_at", "id"),
+        Index("ix_leads_manager_row_txid_version",
+              "assigned_manager_id", "row_txid", "row_version"),
+        Index("ix_leads_row_txid_version", "row_txid", "row_version"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -87,9 +117,196 @@ class Message(Base):
     sender = Column(String, nullable=False)
     text = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    row_version = Column(BigInteger, nullable=False, server_default="0",
+                         server_onupdate=FetchedValue())
+    row_txid = Column(BigInteger, nullable=False, server_default="0",
+                      server_onupdate=FetchedValue())
 
     lead = relationship("Lead", back_populates="messages")
 
+    # Курсорная пагинация истории чата: WHERE lead_id = ? AND (created_at, id) > (?, ?)
+    __table_args__ = (
+        Index("ix_messages_lead_id_created_at_id", "lead_id", "created_at", "id"),
+        Index("ix_messages_row_txid_version", "row_txid", "row_version"),
+    )
+
+
+# Полнотекстовый поиск по сообщениям (см. search.py). Колонки/таблицы индекса
+# зависят от СУБД, поэтому в модели их нет: их создает DDL ниже при create_all
+# и миграция c7d9e2f4a8b1 на существующих базах.
+SEARCH_TS_CONFIG = "russian"
+
+POSTGRES_SEARCH_DDL = [
+    f"ALTER TABLE messages ADD COLUMN search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_TS_CONFIG}', text)) STORED",
+    "CREATE INDEX ix_messages_search_vector ON messages USING gin (search_vector)",
+]
+
+SQLITE_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE messages_fts USING fts5("
+    "text, content='messages', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER messages_fts_ai AFTER INSERT ON messages BEGIN "
+    "INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text); END",
+    "CREATE TRIGGER messages_fts_ad AFTER DELETE ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); END",
+    "CREATE TRIGGER messages_fts_au AFTER UPDATE OF text ON messages BEGIN "
+    "INSERT INTO messages_fts(messages_fts, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "INSERT INTO messages_fts(rowid, text) VALUES (new.id, new.text); END",
+]
+
+for statement in POSTGRES_SEARCH_DDL:
+    event.listen(Message.__table__, "after_create",
+                 DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_SEARCH_DDL:
+    event.listen(Message.__table__, "after_create",
+                 DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Message.__table__, "before_drop",
+             DDL("DROP TABLE IF EXISTS messages_fts").execute_if(dialect="sqlite"))
+
+
+# Поиск лидов по username и имени (см. lead_search.py). PostgreSQL: pg_trgm
+# GIN-индексы по выражениям для LIKE '%q%' и btree text_pattern_ops для
+# префиксов. SQLite: FTS5-таблица leads_search с токенизатором trigram.
+# На существующих базах их создает миграция 3c5e7a9b1d4f.
+LEAD_USERNAME_SQL = "lower(coalesce(telegram_username, ''))"
+LEAD_FULL_NAME_SQL = (
+    "lower(coalesce(telegram_first_name, '') || ' ' || coalesce(telegram_last_name, ''))"
+)
+
+POSTGRES_LEAD_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX ix_leads_username_trgm ON leads USING gin ({LEAD_USERNAME_SQL} gin_trgm_ops)",
+    f"CREATE INDEX ix_leads_full_name_trgm ON leads USING gin ({LEAD_FULL_NAME_SQL} gin_trgm_ops)",
+    f"CREATE INDEX ix_leads_username_prefix ON leads ({LEAD_USERNAME_SQL} text_pattern_ops)",
+    f"CREATE INDEX ix_leads_full_name_prefix ON leads ({LEAD_FULL_NAME_SQL} text_pattern_ops)",
+]
+
+SQLITE_LEAD_SEARCH_DDL = [
+    "CREATE VIRTUAL TABLE leads_search USING fts5(username, full_name, tokenize='trigram')",
+    "CREATE TRIGGER leads_search_ai AFTER INSERT ON leads BEGIN "
+    "INSERT INTO leads_search(rowid, username, full_name) VALUES (new.id, "
+    "coalesce(new.telegram_username, ''), "
+    "coalesce(new.telegram_first_name, '') || ' ' || coalesce(new.telegram_last_name, '')); END",
+    "CREATE TRIGGER leads_search_ad AFTER DELETE ON leads BEGIN "
+    "DELETE FROM leads_search WHERE rowid = old.id; END",
+    "CREATE TRIGGER leads_search_au AFTER UPDATE OF "
+    "telegram_username, telegram_first_name, telegram_last_name ON leads BEGIN "
+    "UPDATE leads_search SET username = coalesce(new.telegram_username, ''), "
+    "full_name = coalesce(new.telegram_first_name, '') || ' ' || "
+    "coalesce(new.telegram_last_name, '') WHERE rowid = new.id; END",
+]
+
+for statement in POSTGRES_LEAD_SEARCH_DDL:
+    event.listen(Lead.__table__, "after_create",
+                 DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_LEAD_SEARCH_DDL:
+    event.listen(Lead.__table__, "after_create",
+                 DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Lead.__table__, "before_drop",
+             DDL("DROP TABLE IF EXISTS leads_search").execute_if(dialect="sqlite"))
+
+
+class LeadRevocation(Base):
+    """Лид ушел от менеджера (переназначение): для /sync это удаление у его клиента"""
+    __tablename__ = "lead_revocations"
+
+    id = Column(Integer, primary_key=True)
+    lead_id = Column(Integer, nullable=False)
+    manager_id = Column(Integer, nullable=False)
+    row_version = Column(BigInteger, nullable=False, server_default="0",
+                         server_onupdate=FetchedValue())
+    row_txid = Column(BigInteger, nullable=False, server_default="0",
+                      server_onupdate=FetchedValue())
+
+    __table_args__ = (
+        Index("ix_lead_revocations_manager_row_txid_version",
+              "manager_id", "row_txid", "row_version"),
+    )
+
+
+# row_version выдает СУБД при каждой вставке и изменении строки, в том числе
+# массовыми UPDATE: PostgreSQL - общая последовательность и BEFORE-триггер,
+# SQLite - счетчик в row_version_counter и AFTER-триггеры (запись в SQLite
+# однопоточная, так что версии идут в порядке коммитов). На PostgreSQL версия
+# берется при записи, а не при коммите, поэтому рядом пишется row_txid -
+# транзакция записи: sync.py отдает только строки уже завершенных транзакций.
+# Записи в lead_revocations делает триггер на смену assigned_manager_id.
+ROW_VERSION_TABLES = ("leads", "messages", "lead_revocations")
+
+POSTGRES_ROW_VERSION_DDL = [
+    "CREATE SEQUENCE IF NOT EXISTS row_version_seq",
+    "CREATE OR REPLACE FUNCTION set_row_version() RETURNS trigger AS $$ "
+    "BEGIN NEW.row_version := nextval('row_version_seq'); "
+    "NEW.row_txid := txid_current(); RETURN NEW; END "
+    "$$ LANGUAGE plpgsql",
+] + [
+    f"CREATE TRIGGER {table}_row_version BEFORE INSERT OR UPDATE ON {table} "
+    f"FOR EACH ROW EXECUTE FUNCTION set_row_version()"
+    for table in ROW_VERSION_TABLES
+] + [
+    "CREATE OR REPLACE FUNCTION log_lead_revocation() RETURNS trigger AS $$ "
+    "BEGIN INSERT INTO lead_revocations (lead_id, manager_id) "
+    "VALUES (OLD.id, OLD.assigned_manager_id); RETURN NULL; END "
+    "$$ LANGUAGE plpgsql",
+    "CREATE TRIGGER leads_revocation AFTER UPDATE OF assigned_manager_id ON leads "
+    "FOR EACH ROW WHEN (OLD.assigned_manager_id IS NOT NULL AND "
+    "OLD.assigned_manager_id IS DISTINCT FROM NEW.assigned_manager_id) "
+    "EXECUTE FUNCTION log_lead_revocation()",
+]
+
+SQLITE_ROW_VERSION_DDL = [
+    "CREATE TABLE IF NOT EXISTS row_version_counter "
+    "(id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO row_version_counter (id, value) VALUES (1, 0)",
+]
+for table in ROW_VERSION_TABLES:
+    bump = (
+        "BEGIN UPDATE row_version_counter SET value = value + 1; "
+        f"UPDATE {table} SET row_version = (SELECT value FROM row_version_counter) "
+        "WHERE id = new.id; END"
+    )
+    SQLITE_ROW_VERSION_DDL += [
+        f"CREATE TRIGGER {table}_row_version_ai AFTER INSERT ON {table} {bump}",
+        # Собственный UPDATE триггера меняет row_version и его не перезапускает
+        f"CREATE TRIGGER {table}_row_version_au AFTER UPDATE ON {table} "
+        f"WHEN new.row_version = old.row_version {bump}",
+    ]
+SQLITE_ROW_VERSION_DDL.append(
+    "CREATE TRIGGER leads_revocation AFTER UPDATE OF assigned_manager_id ON leads "
+    "WHEN old.assigned_manager_id IS NOT NULL "
+    "AND old.assigned_manager_id IS NOT new.assigned_manager_id "
+    "BEGIN INSERT INTO lead_revocations (lead_id, manager_id) "
+    "VALUES (old.id, old.assigned_manager_id); END"
+)
+
+for statement in POSTGRES_ROW_VERSION_DDL:
+    event.listen(Base.metadata, "after_create",
+                 DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_ROW_VERSION_DDL:
+    event.listen(Base.metadata, "after_create",
+                 DDL(statement).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "after_drop",
+             DDL("DROP TABLE IF EXISTS row_version_counter").execute_if(dialect="sqlite"))
+
+
+class MessageArchive(Base):
+    """Переписка давно закрытого лида, вынесенная из messages (см. archive.py)"""
+    __tablename__ = "message_archives"
+
+    lead_id = Column(Integer, ForeignKey("leads.id"), primary_key=True)
+    message_count = Column(Integer, nullable=False)
+    first_message_at = Column(DateTime, nullable=True)
+    last_message_at = Column(DateTime, nullable=True)
+    # zlib(JSON [[id, sender, text, created_at], ...])
+    payload = Column(LargeBinary, nullable=False)
+    # JSON {"YYYY-MM-DD": сообщений за день} для дневной статистики;
+    # NULL у архивов до этой колонки - считается из payload
+    daily_counts = Column(Text, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
 
 class DistributionCounter(Base):
     __tablename__ = "distribution_counters"
@@ -98,4 +315,21 @@ class DistributionCounter(Base):
     project_id = Column(Integer, ForeignKey("projects.id"), unique=True, nullable=False)
     counter = Column(Integer, default=0)
 
-    project = relationship("Project", back_populates="counters")
\ No newline at end of file
+    project = relationship("Project", back_populates="counters")
+
+
+class RealtimeEvent(Base):
+    """События WebSocket, вытесненные из буфера повтора в памяти"""
+    __tablename__ = "realtime_events"
+
+    # event_id выдают часы каждого воркера и у разных воркеров он может
+    # совпасть, поэтому ключ - суррогатный
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    event_id = Column(BigInteger, nullable=False)
+    manager_id = Column(Integer, nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        Index("ix_realtime_events_manager_id_event_id", "manager_id", "event_id"),
+    )
@@ -0,0 +1,202 @@
+# backend/app/replay.py
+
+"""
+Повтор пропущенных событий при переподключении WebSocket
+
+Каждое событие получает event_id - монотонно растущее число (микросекунды
+с эпохи, но не меньше предыдущего id + 1). Id выдает воркер, получивший
+событие из бэкенда рассылки, поэтому в его буфере id идут строго в порядке
+доставки и повтор на том же воркере точен. since от другого воркера - лишь
+граница по его часам. Последние события каждого
+менеджера хранятся в кольцевом буфере; вытесненные из буфера события можно
+сбрасывать в таблицу realtime_events (WS_REPLAY_SPILL), чтобы окно повтора
+было длиннее, чем позволяет память. Записи старше retention периодически
+удаляются; повтор из-за этой границы - разрыв, а не молча пропущенные события.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Deque, Dict, List, Optional, Tuple
+from .models import RealtimeEvent
+
+logger = logging.getLogger(__name__)
+
+
+class EventIdGenerator:
+    def __init__(self):
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def next(self) -> int:
+        with self._lock:
+            self._last = max(self._last + 1, time.time_ns() // 1000)
+            return self._last
+
+
+class DatabaseSpill:
+    """Хранилище вытесненных из памяти событий в таблице realtime_events"""
+
+    def __init__(self, session_factory, batch_size: int = 100,
+                 retention: Optional[timedelta] = None):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.retention = retention
+        self._pending: List[Tuple[int, int, dict]] = []
+        self._lock = threading.Lock()
+        self._purge_task: asyncio.Task | None = None
+
+    def add(self, manager_id: int, event: dict) -> bool:
+        """Откладывает событие, возвращает True, если пора сбросить пачку"""
+        with self._lock:
+            self._pending.append((event["event_id"], manager_id, event))
+            return len(self._pending) >= self.batch_size
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        db = self.session_factory()
+        try:
+            db.add_all([
+                RealtimeEvent(
+                    event_id=event_id,
+                    manager_id=manager_id,
+                    payload=json.dumps(event),
+                    created_at=datetime.utcnow()
+                )
+                for event_id, manager_id, event in pending
+            ])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to spill {len(pending)} realtime events: {e!r}")
+        finally:
+            db.close()
+
+    def since(self, manager_id: int, after_id: int, upto_id: int) -> Optional[List[dict]]:
+        """События (after_id, upto_id] или None, если часть уже удалена purge"""
+        if self.retention is not None:
+            # event_id - микросекунды, а удаляется только то, что записано
+            # раньше now - retention, то есть с еще меньшим event_id
+            horizon = time.time_ns() // 1000 - self.retention // timedelta(microseconds=1)
+            if after_id < horizon:
+                return None
+
+        db = self.session_factory()
+        try:
+            rows = db.query(RealtimeEvent.payload).filter(
+                RealtimeEvent.manager_id == manager_id,
+                RealtimeEvent.event_id > after_id,
+                RealtimeEvent.event_id <= upto_id
+            ).order_by(RealtimeEvent.event_id, RealtimeEvent.id).all()
+        finally:
+            db.close()
+
+        events = [json.loads(row.payload) for row in rows]
+        with self._lock:
+            events.extend(
+                event for event_id, owner, event in self._pending
+                if owner == manager_id and after_id < event_id <= upto_id
+            )
+        return sorted(events, key=lambda e: e["event_id"])
+
+    def purge(self, older_than: timedelta) -> int:
+        db = self.session_factory()
+        try:
+            deleted = db.query(RealtimeEvent).filter(
+                RealtimeEvent.created_at < datetime.utcnow() - older_than
+            ).delete(synchronize_session=False)
+            db.commit()
+            return deleted
+        finally:
+            db.close()
+
+    async def _purge_loop(self, interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                deleted = await asyncio.get_running_loop().run_in_executor(
+                    None, self.purge, self.retention)
+                if deleted:
+                    logger.info(f"Purged {deleted} realtime events")
+            except Exception as e:
+                logger.error(f"Realtime events purge failed: {e!r}")
+
+    def start_purge(self, interval: float):
+        """Раз в interval секунд удалять записи старше retention"""
+        if self.retention is None:
+            return
+        if self._purge_task is None or self._purge_task.done():
+            self._purge_task = asyncio.create_task(self._purge_loop(interval))
+
+    async def stop_purge(self):
+        if self._purge_task:
+            self._purge_task.cancel()
+            try:
+                await self._purge_task
+            except asyncio.CancelledError:
+                pass
+            self._purge_task = None
+
+
+class ReplayBuffer:
+    """Последние события каждого менеджера для повтора по ?since=<event_id>"""
+
+    def __init__(self, size: int, floor: int = 0,
+                 spill: Optional[DatabaseSpill] = None):
+        self.size = size
+        # Все события с id > floor прошли через этот буфер
+        self.floor = floor
+        self.spill = spill
+        self._events: Dict[int, Deque[dict]] = {}
+        self._evicted_upto: Dict[int, int] = {}
+
+    def append(self, manager_id: int, event: dict,
+               spill_evicted: bool = True) -> bool:
+        """Запоминает событие; True, если у spill накопилась пачка для записи"""
+        events = self._events.setdefault(manager_id, deque())
+        events.append(event)
+        if len(events) <= self.size:
+            return False
+
+        evicted = events.popleft()
+        self._evicted_upto[manager_id] = max(
+            self._evicted_upto.get(manager_id, self.floor),
+            evicted["event_id"])
+        if self.spill is not None and spill_evicted:
+            return self.spill.add(manager_id, evicted)
+        return False
+
+    def last_event_id(self, manager_id: int) -> int:
+        events = self._events.get(manager_id)
+        if events:
+            return events[-1]["event_id"]
+        return self._evicted_upto.get(manager_id, self.floor)
+
+    def since(self, manager_id: int, event_id: int) -> Optional[List[dict]]:
+        """События после event_id или None, если разрыв восстановить нельзя"""
+        if event_id < self.floor:
+            return None
+
+        in_memory = [
+            event for event in self._events.get(manager_id, ())
+            if event["event_id"] > event_id
+        ]
+        evicted_upto = self._evicted_upto.get(manager_id, self.floor)
+        if event_id >= evicted_upto:
+            return in_memory
+
+        if self.spill is None:
+            return None
+
+        spilled = self.spill.since(manager_id, event_id, evicted_upto)
+        if spilled is None:
+            return None
+        return spilled + in_memory
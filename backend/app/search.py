@@ -0,0 +1,142 @@
+# backend/app/search.py
+
+"""
+Полнотекстовый поиск по сообщениям
+
+PostgreSQL: генерируемая колонка messages.search_vector (tsvector) с GIN-
+индексом, ранжирование ts_rank_cd, сниппеты ts_headline. SQLite: внешняя
+FTS5-таблица messages_fts, ранжирование bm25, сниппеты snippet(). На других
+СУБД поиска нет: NotImplementedError, в API - 501.
+
+Выдача отсортирована по (score DESC, id DESC) и листается курсором по этой
+паре. Сниппеты считаются только для строк страницы.
+"""
+
+import base64
+from typing import List, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from .models import SEARCH_TS_CONFIG
+
+SNIPPET_START = "<mark>"
+SNIPPET_END = "</mark>"
+SNIPPET_WORDS = 12
+
+
+def encode_cursor(score: float, message_id: int) -> str:
+    raw = f"{score!r}:{message_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    """ValueError, если курсор поврежден"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        score, message_id = base64.urlsafe_b64decode(padded).decode().split(":")
+        return float(score), int(message_id)
+    except (UnicodeDecodeError, ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def fts5_query(query: str) -> str:
+    """Каждое слово - отдельная фраза в кавычках: спецсимволы FTS5 не работают"""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+def _scope(manager_id: int | None, lead_id: int | None) -> Tuple[str, dict]:
+    clauses, params = [], {}
+    if manager_id is not None:
+        clauses.append("l.assigned_manager_id = :manager_id")
+        params["manager_id"] = manager_id
+    if lead_id is not None:
+        clauses.append("m.lead_id = :lead_id")
+        params["lead_id"] = lead_id
+    return "".join(f" AND {clause}" for clause in clauses), params
+
+
+def _postgres_sql(scope: str, after: bool) -> str:
+    keyset = " AND (score < :after_score OR (score = :after_score AND id < :after_id))" \
+        if after else ""
+    return f"""
+        WITH q AS (SELECT websearch_to_tsquery('{SEARCH_TS_CONFIG}', :query) AS query),
+        hits AS (
+            SELECT m.id, m.lead_id, m.sender, m.text, m.created_at,
+                   ts_rank_cd(m.search_vector, q.query) AS score
+            FROM messages m
+            JOIN leads l ON l.id = m.lead_id
+            CROSS JOIN q
+            WHERE m.search_vector @@ q.query{scope}
+        ),
+        page AS (
+            SELECT * FROM hits WHERE true{keyset}
+            ORDER BY score DESC, id DESC
+            LIMIT :limit
+        )
+        SELECT page.id, page.lead_id, page.sender, page.created_at, page.score,
+               ts_headline('{SEARCH_TS_CONFIG}', page.text, q.query,
+                           :headline_options) AS snippet
+        FROM page CROSS JOIN q
+        ORDER BY page.score DESC, page.id DESC
+    """
+
+
+def _sqlite_sql(scope: str, after: bool) -> str:
+    keyset = " AND (score < :after_score OR (score = :after_score AND id < :after_id))" \
+        if after else ""
+    # bm25 тем меньше, чем лучше совпадение, - меняем знак
+    return f"""
+        SELECT * FROM (
+            SELECT m.id, m.lead_id, m.sender, m.created_at,
+                   -bm25(messages_fts) AS score,
+                   snippet(messages_fts, 0, '{SNIPPET_START}', '{SNIPPET_END}',
+                           '…', {SNIPPET_WORDS}) AS snippet
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            JOIN leads l ON l.id = m.lead_id
+            WHERE messages_fts MATCH :query{scope}
+        )
+        WHERE 1 = 1{keyset}
+        ORDER BY score DESC, id DESC
+        LIMIT :limit
+    """
+
+
+def search_messages(db: Session, query: str, limit: int,
+                    manager_id: int | None = None, lead_id: int | None = None,
+                    cursor: str | None = None) -> Tuple[List[dict], str | None]:
+    """
+    Найти сообщения по запросу
+
+    manager_id ограничивает выдачу лидами менеджера. Возвращает (строки,
+    курсор следующей страницы или None).
+    """
+    dialect = db.get_bind().dialect.name
+    scope, params = _scope(manager_id, lead_id)
+    params["limit"] = limit
+
+    if dialect == "postgresql":
+        params["query"] = query
+        params["headline_options"] = (
+            f"StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, "
+            f"MaxWords={SNIPPET_WORDS * 2}, MinWords={SNIPPET_WORDS // 2}, "
+            f"MaxFragments=1")
+        sql = _postgres_sql(scope, after=cursor is not None)
+    elif dialect == "sqlite":
+        params["query"] = fts5_query(query)
+        if not params["query"]:
+            return [], None
+        sql = _sqlite_sql(scope, after=cursor is not None)
+    else:
+        raise NotImplementedError(f"Full-text search is not supported on {dialect}")
+
+    if cursor is not None:
+        params["after_score"], params["after_id"] = decode_cursor(cursor)
+
+    rows = [dict(row._mapping) for row in db.execute(text(sql), params)]
+
+    next_cursor = None
+    if len(rows) == limit:
+        next_cursor = encode_cursor(rows[-1]["score"], rows[-1]["id"])
+    return rows, next_cursor
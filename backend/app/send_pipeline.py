@@ -0,0 +1,62 @@
+# backend/app/send_pipeline.py
+
+"""
+Упорядоченная по ключу очередь асинхронных задач
+
+Задачи с одним ключом (лид) выполняются строго по очереди, с разными
+ключами - параллельно. Worker по ключу создается при первой задаче и
+завершается, когда его очередь опустела, поэтому простаивающие лиды ничего
+не стоят.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable[None]]
+
+
+class KeyedPipeline:
+    def __init__(self, max_pending: int = 100):
+        self.max_pending = max_pending
+        self._queues: Dict[Hashable, Deque[Job]] = {}
+        self._workers: Dict[Hashable, asyncio.Task] = {}
+
+    def submit(self, key: Hashable, job: Job) -> bool:
+        """Ставит задачу в очередь ключа; False, если очередь переполнена"""
+        queue = self._queues.setdefault(key, deque())
+        if len(queue) >= self.max_pending:
+            return False
+
+        queue.append(job)
+        if key not in self._workers:
+            self._workers[key] = asyncio.create_task(self._run(key))
+        return True
+
+    def pending(self, key: Hashable) -> int:
+        return len(self._queues.get(key, ()))
+
+    async def _run(self, key: Hashable):
+        queue = self._queues[key]
+        try:
+            while queue:
+                job = queue.popleft()
+                try:
+                    await job()
+                except Exception as e:
+                    logger.error(f"Pipeline job for {key!r} failed: {e!r}")
+        finally:
+            # Между проверкой очереди и этим блоком нет await - новая задача
+            # не может проскочить мимо завершающегося worker
+            del self._workers[key]
+            if not queue:
+                self._queues.pop(key, None)
+
+    async def drain(self):
+        """Дождаться выполнения всех поставленных задач"""
+        while self._workers:
+            await asyncio.gather(*list(self._workers.values()),
+                                 return_exceptions=True)
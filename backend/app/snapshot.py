@@ -0,0 +1,280 @@
+# backend/app/snapshot.py
+
+"""
+Снимки leads / messages / users в Parquet для офлайн-аналитики
+
+Таблицы читаются курсорной пагинацией пачками по SNAPSHOT_BATCH строк,
+каждая пачка превращается в Arrow RecordBatch и дописывается в Parquet-файлы,
+разложенные по месяцу created_at:
+
+    <out>/leads/month=2024-05/part-<run>.parquet
+    <out>/messages/month=2024-05/part-<run>.parquet
+    <out>/users/snapshot.parquet
+
+Запуски инкрементальные, отметки (watermark) лежат в <out>/_watermarks.json:
+messages - по id (сообщения не меняются), leads - по (last_updated_at, id),
+так что измененный лид попадает в следующий part еще раз; актуальная версия -
+строка с максимальным last_updated_at. users маленькая и пишется целиком.
+Строки моложе SNAPSHOT_LAG не берутся: их транзакции могли еще не
+закоммититься, и курсор бы их перепрыгнул.
+
+Текст сообщений по умолчанию не выгружается (только длина), --with-text
+добавляет колонку text. Первый запуск в пустом каталоге - полный, в него
+попадает и архив (archive.py). Отметки сохраняются в конце запуска: part-файлы
+оборванного запуска нужно удалить перед повтором.
+
+pyarrow - опциональная зависимость: pip install -r requirements-analytics.txt
+
+Запуск (из каталога backend):
+    python -m app.snapshot -o /data/snapshots
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from sqlalchemy import func, or_, and_
+from sqlalchemy.orm import Session
+from .archive import unpack_messages
+from .models import Lead, Message, MessageArchive, User
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow - опциональная зависимость
+    pa = None
+    pq = None
+
+SNAPSHOT_BATCH = 10000
+
+SNAPSHOT_LAG = timedelta(minutes=1)
+
+WATERMARKS_FILE = "_watermarks.json"
+
+COMPRESSION = "zstd"
+
+# Колонки снимков: (имя, тип Arrow)
+LEAD_COLUMNS = [
+    ("id", "int64"), ("project_id", "int64"), ("bot_id", "int64"),
+    ("assigned_manager_id", "int64"), ("status", "string"),
+    ("created_at", "timestamp"), ("last_updated_at", "timestamp"),
+    ("closed_at", "timestamp"), ("last_message_at", "timestamp"),
+    ("message_count", "int64"), ("unread_count", "int64"),
+]
+
+MESSAGE_COLUMNS = [
+    ("id", "int64"), ("lead_id", "int64"), ("sender", "string"),
+    ("created_at", "timestamp"), ("text_length", "int64"),
+]
+
+USER_COLUMNS = [
+    ("id", "int64"), ("username", "string"), ("role", "string"),
+    ("full_name", "string"), ("is_active", "bool"), ("created_at", "timestamp"),
+]
+
+
+def _lead_updated():
+    return func.coalesce(Lead.last_updated_at, Lead.created_at)
+
+
+def lead_batches(db: Session, watermark: dict | None, until: datetime,
+                 batch_size: int = SNAPSHOT_BATCH) -> Iterator[Tuple[List[dict], dict]]:
+    """Пачки лидов, измененных после watermark, и новая отметка после каждой"""
+    updated = _lead_updated()
+    columns = [getattr(Lead, name) for name, _ in LEAD_COLUMNS]
+    position = None
+    if watermark:
+        position = (datetime.fromisoformat(watermark["updated_at"]), watermark["id"])
+
+    while True:
+        query = db.query(updated.label("updated"), *columns).filter(updated < until)
+        if position:
+            query = query.filter(or_(updated > position[0],
+                                     and_(updated == position[0], Lead.id > position[1])))
+        rows = query.order_by(updated, Lead.id).limit(batch_size).all()
+        if not rows:
+            return
+        position = (rows[-1].updated, rows[-1].id)
+        yield ([{name: getattr(row, name) for name, _ in LEAD_COLUMNS} for row in rows],
+               {"updated_at": position[0].isoformat(), "id": position[1]})
+
+
+def message_batches(db: Session, watermark: dict | None, until: datetime,
+                    batch_size: int = SNAPSHOT_BATCH,
+                    with_text: bool = False) -> Iterator[Tuple[List[dict], dict]]:
+    """Пачки сообщений с id больше watermark; в полном запуске сначала архив"""
+    last_id = watermark["id"] if watermark else 0
+
+    def row(message) -> dict:
+        record = {"id": message.id, "lead_id": message.lead_id,
+                  "sender": message.sender, "created_at": message.created_at,
+                  "text_length": len(message.text)}
+        if with_text:
+            record["text"] = message.text
+        return record
+
+    if watermark is None:
+        archives = db.query(MessageArchive.lead_id).order_by(MessageArchive.lead_id)
+        lead_ids = [archive.lead_id for archive in archives]
+        for start in range(0, len(lead_ids), batch_size):
+            batch = []
+            for archive in db.query(MessageArchive).filter(
+                    MessageArchive.lead_id.in_(lead_ids[start:start + batch_size])):
+                batch.extend(row(m) for m in unpack_messages(archive.lead_id,
+                                                             archive.payload))
+                db.expunge(archive)
+            if batch:
+                last_id = max(last_id, max(r["id"] for r in batch))
+                yield batch, {"id": last_id}
+
+    hot_last_id = watermark["id"] if watermark else 0
+    while True:
+        rows = db.query(Message.id, Message.lead_id, Message.sender, Message.created_at,
+                        Message.text).filter(
+            Message.id > hot_last_id,
+            Message.created_at < until
+        ).order_by(Message.id).limit(batch_size).all()
+        if not rows:
+            return
+        hot_last_id = rows[-1].id
+        last_id = max(last_id, hot_last_id)
+        yield [row(r) for r in rows], {"id": last_id}
+
+
+def user_rows(db: Session) -> List[dict]:
+    columns = [getattr(User, name) for name, _ in USER_COLUMNS]
+    return [dict(row._mapping) for row in db.query(*columns).order_by(User.id)]
+
+
+def month_partition(value: datetime | None) -> str:
+    return f"month={value:%Y-%m}" if value else "month=unknown"
+
+
+def load_watermarks(out_dir: str) -> Dict[str, dict]:
+    path = os.path.join(out_dir, WATERMARKS_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermarks(out_dir: str, watermarks: Dict[str, dict]) -> None:
+    """Атомарно: оборванный запуск оставляет прежние отметки"""
+    path = os.path.join(out_dir, WATERMARKS_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise RuntimeError(
+            "pyarrow is required for snapshots: pip install -r requirements-analytics.txt")
+
+
+def _schema(columns: List[Tuple[str, str]]):
+    types = {"int64": pa.int64(), "string": pa.string(), "bool": pa.bool_(),
+             "timestamp": pa.timestamp("us")}
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class PartitionedWriter:
+    """ParquetWriter на каждую месячную секцию, открытую в этом запуске"""
+
+    def __init__(self, root: str, schema, run_id: str):
+        self.root = root
+        self.schema = schema
+        self.run_id = run_id
+        self.writers = {}
+        self.rows = 0
+
+    def write(self, rows: List[dict]) -> None:
+        by_partition: Dict[str, List[dict]] = {}
+        for row in rows:
+            by_partition.setdefault(month_partition(row["created_at"]), []).append(row)
+
+        for partition, part_rows in by_partition.items():
+            writer = self.writers.get(partition)
+            if writer is None:
+                directory = os.path.join(self.root, partition)
+                os.makedirs(directory, exist_ok=True)
+                writer = pq.ParquetWriter(
+                    os.path.join(directory, f"part-{self.run_id}.parquet"),
+                    self.schema, compression=COMPRESSION)
+                self.writers[partition] = writer
+            writer.write_batch(pa.RecordBatch.from_pylist(part_rows, schema=self.schema))
+        self.rows += len(rows)
+
+    def close(self) -> None:
+        for writer in self.writers.values():
+            writer.close()
+
+
+def write_snapshot(db: Session, out_dir: str, with_text: bool = False,
+                   batch_size: int = SNAPSHOT_BATCH) -> Dict[str, int]:
+    """Пишет очередной инкремент снимка; возвращает число строк по таблицам"""
+    _require_pyarrow()
+    os.makedirs(out_dir, exist_ok=True)
+    watermarks = load_watermarks(out_dir)
+    # Иначе у part-файлов одной таблицы разойдутся схемы
+    if watermarks.get("messages", {}).get("with_text", with_text) != with_text:
+        raise RuntimeError("with_text differs from the previous run, "
+                           "use a new output directory")
+
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    until = datetime.utcnow() - SNAPSHOT_LAG
+    counts = {}
+
+    message_columns = MESSAGE_COLUMNS + ([("text", "string")] if with_text else [])
+    sources = [
+        ("leads", LEAD_COLUMNS, lead_batches(db, watermarks.get("leads"), until,
+                                             batch_size)),
+        ("messages", message_columns, message_batches(db, watermarks.get("messages"),
+                                                      until, batch_size, with_text)),
+    ]
+    new_watermarks = dict(watermarks)
+    for table, columns, batches in sources:
+        writer = PartitionedWriter(os.path.join(out_dir, table), _schema(columns), run_id)
+        try:
+            for rows, mark in batches:
+                writer.write(rows)
+                new_watermarks[table] = mark
+        finally:
+            writer.close()
+        counts[table] = writer.rows
+    new_watermarks.setdefault("messages", {"id": 0})["with_text"] = with_text
+
+    users = user_rows(db)
+    os.makedirs(os.path.join(out_dir, "users"), exist_ok=True)
+    users_path = os.path.join(out_dir, "users", "snapshot.parquet")
+    pq.write_table(pa.Table.from_pylist(users, schema=_schema(USER_COLUMNS)),
+                   users_path + ".tmp", compression=COMPRESSION)
+    os.replace(users_path + ".tmp", users_path)
+    counts["users"] = len(users)
+
+    save_watermarks(out_dir, new_watermarks)
+    return counts
+
+
+def main():
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Write Parquet snapshots for analytics")
+    parser.add_argument("-o", "--output", required=True, help="каталог снимков")
+    parser.add_argument("--with-text", action="store_true",
+                        help="выгружать текст сообщений")
+    parser.add_argument("--batch-size", type=int, default=SNAPSHOT_BATCH)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        counts = write_snapshot(db, args.output, args.with_text, args.batch_size)
+    finally:
+        db.close()
+    print(json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+# backend/app/sse.py
+
+"""
+Server-Sent Events: тот же поток событий, что и /ws, для клиентов за
+прокси, которые рвут WebSocket
+
+Подключение SSE регистрируется в общем ConnectionManager и получает
+события через ту же очередь; ответ /events просто читает ее. Возобновление -
+по стандартному заголовку Last-Event-ID (его шлет EventSource).
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator
+
+from .websocket import ConnectionManager
+
+# Через сколько мс EventSource переподключается после обрыва
+RETRY_MS = 3000
+
+
+def format_event(event: dict) -> str:
+    """Кадр text/event-stream; id есть только у событий из буфера повтора"""
+    lines = []
+    if "event_id" in event:
+        lines.append(f"id: {event['event_id']}")
+    lines.append(f"event: {event.get('type', 'message')}")
+    lines.append(f"data: {json.dumps(event, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def event_stream(registry: ConnectionManager, manager_id: int,
+                       since: int | None, keepalive: float) -> AsyncIterator[str]:
+    """
+    Регистрирует SSE-подключение и отдает его события, пока его не отключат
+
+    Регистрация внутри генератора: подключение живет ровно столько, сколько
+    отправляется ответ. Без событий раз в keepalive секунд уходит комментарий -
+    он не дает прокси закрыть простаивающий ответ и выявляет отвалившихся.
+    """
+    connection = registry.connect_stream(manager_id, since=since)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(connection.queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+
+            connection.queue.task_done()
+            if event is None:
+                return
+            yield format_event(event)
+    finally:
+        registry.disconnect(connection.manager_id, connection.id)
@@ -0,0 +1,119 @@
+# backend/app/sync.py
+
+"""
+Дельта-синхронизация лидов и сообщений по row_version
+
+Каждая вставка и изменение строки leads/messages получает новое значение
+общей row_version (см. models.ROW_VERSION_DDL). Клиент хранит курсор -
+последнюю увиденную позицию - и получает только строки новее нее, поэтому
+после первой загрузки платит за число изменений, а не за объем данных.
+
+Позиция - пара (row_txid, row_version). На PostgreSQL версия выдается при
+записи, а коммиты идут в другом порядке: строка долгой транзакции может
+появиться ниже уже пройденной версии. Поэтому отдаются только строки
+транзакций младше xmin текущего снимка - все они уже завершены, а любая
+будущая запись получит row_txid не меньше него. На SQLite row_txid всегда 0,
+и позиция сводится к версии.
+
+Лиды, ушедшие от менеджера, приходят в revoked (см. LeadRevocation): клиент
+применяет revoked до leads - более новая версия лида в той же странице
+значит, что лид вернулся.
+
+Лиды, сообщения и отзывы делят одну последовательность, поэтому страница -
+это первые limit изменений всех трех таблиц по возрастанию позиции.
+"""
+
+import base64
+from typing import List, Tuple
+
+from sqlalchemy import text, tuple_
+from sqlalchemy.orm import Session
+from .models import Lead, LeadRevocation, Message, Project, User
+
+CURSOR_PREFIX = "v2:"
+
+# Курсоры до row_txid: только версия, транзакция 0
+LEGACY_CURSOR_PREFIX = "v1:"
+
+Position = Tuple[int, int]
+
+
+def encode_cursor(position: Position) -> str:
+    txid, version = position
+    raw = f"{CURSOR_PREFIX}{txid}:{version}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None) -> Position:
+    """(0, 0) для первой загрузки; ValueError, если курсор поврежден"""
+    if not cursor:
+        return 0, 0
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(padded).decode()
+    except (UnicodeDecodeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+    if raw.startswith(LEGACY_CURSOR_PREFIX):
+        parts = ["0", raw[len(LEGACY_CURSOR_PREFIX):]]
+    elif raw.startswith(CURSOR_PREFIX):
+        parts = raw[len(CURSOR_PREFIX):].split(":")
+    else:
+        raise ValueError("Invalid cursor")
+    if len(parts) != 2 or not all(part.isdigit() for part in parts):
+        raise ValueError("Invalid cursor")
+    return int(parts[0]), int(parts[1])
+
+
+def settled_txid(db: Session) -> int | None:
+    """Граница row_txid, ниже которой все транзакции завершены; None - без границы"""
+    if db.get_bind().dialect.name != "postgresql":
+        return None
+    return db.execute(text("SELECT txid_snapshot_xmin(txid_current_snapshot())")).scalar()
+
+
+def changes_since(db: Session, user: User, position: Position, limit: int,
+                  include_messages: bool = True
+                  ) -> Tuple[List[Tuple[Lead, str]], List[Message], List[int], Position, bool]:
+    """
+    Изменения, видимые пользователю, после позиции position
+
+    Возвращает (лиды с названием проекта, сообщения, id отозванных лидов,
+    позиция для следующего курсора, есть ли еще изменения). Без сообщений
+    курсор все равно корректен: новое сообщение меняет и сводку лида.
+    """
+    horizon = settled_txid(db)
+
+    def after(model, query):
+        query = query.filter(tuple_(model.row_txid, model.row_version) > position)
+        if horizon is not None:
+            query = query.filter(model.row_txid < horizon)
+        # limit + 1: по лишней строке видно, есть ли продолжение
+        return query.order_by(model.row_txid, model.row_version).limit(limit + 1).all()
+
+    leads = db.query(Lead, Project.name).join(Project, Project.id == Lead.project_id)
+    messages = db.query(Message)
+    if user.role == "manager":
+        leads = leads.filter(Lead.assigned_manager_id == user.id)
+        messages = messages.join(Lead, Lead.id == Message.lead_id).filter(
+            Lead.assigned_manager_id == user.id)
+
+    changes = [((lead.row_txid, lead.row_version), "lead", (lead, project_name))
+               for lead, project_name in after(Lead, leads)]
+    if include_messages:
+        changes += [((message.row_txid, message.row_version), "message", message)
+                    for message in after(Message, messages)]
+    if user.role == "manager":
+        revocations = db.query(LeadRevocation).filter(LeadRevocation.manager_id == user.id)
+        changes += [((revocation.row_txid, revocation.row_version), "revoked",
+                     revocation.lead_id)
+                    for revocation in after(LeadRevocation, revocations)]
+
+    merged = sorted(changes, key=lambda change: change[0])
+    page, has_more = merged[:limit], len(merged) > limit
+
+    next_position = page[-1][0] if page else tuple(position)
+    return ([item for _, kind, item in page if kind == "lead"],
+            [item for _, kind, item in page if kind == "message"],
+            [item for _, kind, item in page if kind == "revoked"],
+            next_position, has_more)
@@ -6,6 +6,7 @@ from datetime import datetime
 from sqlalchemy.orm import Session
 from .models import Lead, Message, Bot
 from .distribution import get_next_manager
+from .lead_summary import apply_message
 from .config import settings
 
 logger = logging.getLogger(__name__)
@@ -88,7 +89,9 @@ async def handle_start_command(db: Session, bot_identifier: str,
             created_at=datetime.utcnow()
         )
         db.add(start_message)
+        apply_message(existing_lead, start_message)
 
+        status_changed = existing_lead.status not in ("closed", "new")
         if existing_lead.status != "closed":
             existing_lead.status = "new"
             existing_lead.last_updated_at = datetime.utcnow()
@@ -100,6 +103,7 @@ async def handle_start_command(db: Session, bot_identifier: str,
         await ws_manager.notify_new_message(
             lead_id=existing_lead.id,
             manager_id=existing_lead.assigned_manager_id,
+            project_id=existing_lead.project_id,
             message_data={
                 "id": start_message.id,
                 "text": "/start",
@@ -107,6 +111,13 @@ async def handle_start_command(db: Session, bot_identifier: str,
                 "created_at": start_message.created_at.isoformat()
             }
         )
+        if status_changed:
+            await ws_manager.notify_lead_status(
+                lead_id=existing_lead.id,
+                manager_id=existing_lead.assigned_manager_id,
+                status="new",
+                project_id=existing_lead.project_id
+            )
 
         return {"status": "exists", "lead_id": existing_lead.id}
 
@@ -134,13 +145,20 @@ async def handle_start_command(db: Session, bot_identifier: str,
         created_at=datetime.utcnow()
     )
     db.add(first_message)
+    apply_message(new_lead, first_message)
     db.commit()
     db.refresh(first_message)
 
     from .websocket import manager as ws_manager
+    await ws_manager.notify_new_lead(
+        lead_id=new_lead.id,
+        project_id=new_lead.project_id,
+        manager_id=manager.id
+    )
     await ws_manager.notify_new_message(
         lead_id=new_lead.id,
         manager_id=manager.id,
+        project_id=new_lead.project_id,
         message_data={
             "id": first_message.id,
             "text": "/start",
@@ -160,12 +178,14 @@ async def handle_start_command(db: Session, bot_identifier: str,
             created_at=datetime.utcnow()
         )
         db.add(auto_reply_message)
+        apply_message(new_lead, auto_reply_message)
         db.commit()
         db.refresh(auto_reply_message)
 
         await ws_manager.notify_new_message(
             lead_id=new_lead.id,
             manager_id=manager.id,
+            project_id=new_lead.project_id,
             message_data={
                 "id": auto_reply_message.id,
                 "text": bot.auto_reply,
@@ -206,7 +226,9 @@ async def handle_incoming_message(db: Session, bot_identifier: str,
         created_at=datetime.utcnow()
     )
     db.add(new_message)
+    apply_message(lead, new_message)
 
+    status_changed = lead.status not in ("closed", "new")
     if lead.status != "closed":
         lead.status = "new"
         lead.last_updated_at = datetime.utcnow()
@@ -220,6 +242,7 @@ async def handle_incoming_message(db: Session, bot_identifier: str,
     await ws_manager.notify_new_message(
         lead_id=lead.id,
         manager_id=lead.assigned_manager_id,
+        project_id=lead.project_id,
         message_data={
             "id": new_message.id,
             "text": text,
@@ -227,6 +250,13 @@ async def handle_incoming_message(db: Session, bot_identifier: str,
             "created_at": new_message.created_at.isoformat()
         }
     )
+    if status_changed:
+        await ws_manager.notify_lead_status(
+            lead_id=lead.id,
+            manager_id=lead.assigned_manager_id,
+            status="new",
+            project_id=lead.project_id
+        )
 
     return {
         "status": "saved",
@@ -1,44 +1,514 @@
 # backend/app/websocket.py
 
+import asyncio
 import logging
-from typing import Dict
+import uuid
+from typing import Dict, List, Tuple
 from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+from .broadcast import BroadcastBackend, InProcessBackend
+from .config import settings
+from .replay import EventIdGenerator, ReplayBuffer
+from .ws_protocol import JSON_CODEC, negotiate
 
 logger = logging.getLogger(__name__)
 
+# Таймаут на отправку в один сокет, чтобы медленный клиент не тормозил остальных
+SEND_TIMEOUT = 5.0
+
+# Коды закрытия: клиент не успевает читать события / не отвечает на ping /
+# вытеснен более новым подключением сверх лимита
+OVERFLOW_CLOSE_CODE = 4008
+HEARTBEAT_CLOSE_CODE = 4009
+TOO_MANY_CONNECTIONS_CLOSE_CODE = 4029
+
+RESYNC_REQUIRED = {"type": "resync_required"}
+
+GAP_TOO_LARGE = {"type": "resync_required", "reason": "gap_too_large"}
+
+# Верхняя граница окна батчинга, которое может запросить клиент
+MAX_BATCH_WINDOW_MS = 1000
+MAX_BATCH_EVENTS = 500
+
+
+def coalesce_events(events: List[dict]) -> List[dict]:
+    """Из нескольких смен статуса одного лида оставляет только последнюю"""
+    last_status = {}
+    for index, event in enumerate(events):
+        if event.get("type") == "lead_status":
+            last_status[event["lead_id"]] = index
+
+    return [
+        event for index, event in enumerate(events)
+        if event.get("type") != "lead_status"
+        or last_status[event["lead_id"]] == index
+    ]
+
+
+class Connection:
+    """Одно подключение менеджера со своей очередью отправки"""
+
+    def __init__(self, manager_id: int, websocket: WebSocket | None, queue_size: int,
+                 batch_window: float = 0, codec=JSON_CODEC):
+        self.id = uuid.uuid4().hex
+        self.manager_id = manager_id
+        # None - подключение SSE: очередь разбирает сам HTTP-ответ
+        self.websocket = websocket
+        self.transport = "websocket" if websocket is not None else "sse"
+        # Кодек кадров, выбранный по подпротоколу (JSON или MessagePack)
+        self.codec = codec
+        # Проекты, на ленты событий которых подписано подключение
+        self.projects: set = set()
+        # > 0 - события копятся столько секунд и уходят одним кадром "batch"
+        self.batch_window = batch_window
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.high_water = 0
+        self.overflows = 0
+        self.missed_pongs = 0
+        self.writer: asyncio.Task | None = None
+
+    def enqueue(self, message: dict) -> bool:
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            return False
+        self.high_water = max(self.high_water, self.queue.qsize())
+        return True
+
+    def discard_pending(self) -> int:
+        """Выбрасывает неотправленные события, возвращает их количество"""
+        discarded = 0
+        while True:
+            try:
+                self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return discarded
+            self.queue.task_done()
+            discarded += 1
+
+    def stats(self) -> dict:
+        return {
+            "connection_id": self.id,
+            "manager_id": self.manager_id,
+            "transport": self.transport,
+            "queue_size": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "high_water": self.high_water,
+            "overflows": self.overflows,
+            "missed_pongs": self.missed_pongs,
+            "subprotocol": self.codec.subprotocol,
+            "projects": sorted(self.projects)
+        }
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: Dict[int, WebSocket] = {}
+    def __init__(self, send_timeout: float = SEND_TIMEOUT,
+                 backend: BroadcastBackend | None = None,
+                 queue_size: int = settings.WS_SEND_QUEUE_SIZE,
+                 overflow_policy: str = settings.WS_OVERFLOW_POLICY,
+                 replay_size: int = settings.WS_REPLAY_BUFFER_SIZE,
+                 max_connections_per_manager: int = settings.WS_MAX_CONNECTIONS_PER_MANAGER):
+        # manager_id -> {connection_id: Connection}
+        self.active_connections: Dict[int, Dict[str, Connection]] = {}
+        # project_id -> {connection_id: Connection}: подписчики ленты проекта
+        self.project_subscribers: Dict[int, Dict[str, Connection]] = {}
+        self.send_timeout = send_timeout
+        self.queue_size = queue_size
+        self.overflow_policy = overflow_policy
+        self.max_connections_per_manager = max_connections_per_manager
+        self._heartbeat_task: asyncio.Task | None = None
+        self.worker_id = uuid.uuid4().hex
+        self.event_ids = EventIdGenerator()
+        self.replay = ReplayBuffer(replay_size, floor=self.event_ids.next())
+        self.set_backend(backend or InProcessBackend())
+
+    def set_backend(self, backend: BroadcastBackend):
+        """События публикуются в бэкенд и приходят обратно через _deliver"""
+        self.backend = backend
+        backend.set_handler(self._deliver)
+
+    async def connect(self, manager_id: int, websocket: WebSocket,
+                      since: int | None = None, batch_ms: int = 0,
+                      subprotocols: List[str] | None = None) -> str:
+        """
+        Регистрирует сокет менеджера и возвращает id подключения
 
-    async def connect(self, manager_id: int, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections[manager_id] = websocket
-        logger.info(f"Manager {manager_id} connected via WebSocket")
+        Если передан since, сначала в сокет уйдут события после этого event_id
+        (или resync_required, если их уже не восстановить). batch_ms включает
+        режим батчинга с указанным окном. subprotocols - предложенные клиентом
+        подпротоколы, из них выбирается кодек кадров.
+        """
+        subprotocol, codec = negotiate(subprotocols or [])
+        if websocket.client_state == WebSocketState.CONNECTING:
+            await websocket.accept(subprotocol=subprotocol)
+        batch_window = min(max(batch_ms, 0), MAX_BATCH_WINDOW_MS) / 1000
+        connection = Connection(manager_id, websocket, self.queue_size,
+                                batch_window=batch_window, codec=codec)
+        connection.writer = asyncio.create_task(self._writer(connection))
+        self._register(connection, since)
+        logger.info(f"Manager {manager_id} connected via WebSocket ({connection.id})")
+        return connection.id
 
-    def disconnect(self, manager_id: int):
-        if manager_id in self.active_connections:
+    def connect_stream(self, manager_id: int, since: int | None = None) -> Connection:
+        """
+        Регистрирует подключение SSE
+
+        Writer-задачи у него нет: очередь читает HTTP-ответ (см. sse.py).
+        Рассылка, лимит подключений и повтор - те же, что у WebSocket.
+        """
+        connection = Connection(manager_id, None, self.queue_size)
+        self._register(connection, since)
+        logger.info(f"Manager {manager_id} connected via SSE ({connection.id})")
+        return connection
+
+    def _register(self, connection: Connection, since: int | None):
+        connections = self.active_connections.setdefault(connection.manager_id, {})
+        connections[connection.id] = connection
+
+        # Сверх лимита вытесняем самые старые подключения - обычно это
+        # "забытые" вкладки и полуоткрытые соединения
+        while len(connections) > self.max_connections_per_manager:
+            oldest = next(iter(connections.values()))
+            self._evict(oldest, TOO_MANY_CONNECTIONS_CLOSE_CODE)
+
+        if since is not None:
+            self._replay(connection, since)
+
+    def _replay(self, connection: Connection, since: int):
+        events = self.replay.since(connection.manager_id, since)
+        # +1 под replay_complete
+        if events is None or len(events) + 1 > connection.queue.maxsize:
+            connection.enqueue(GAP_TOO_LARGE)
+            return
+
+        for event in events:
+            connection.enqueue(event)
+        connection.enqueue({
+            "type": "replay_complete",
+            "last_event_id": self.replay.last_event_id(connection.manager_id)
+        })
+
+    def disconnect(self, manager_id: int, connection_id: str):
+        connections = self.active_connections.get(manager_id)
+        if not connections or connection_id not in connections:
+            return
+
+        connection = connections.pop(connection_id)
+        if not connections:
             del self.active_connections[manager_id]
-            logger.info(f"Manager {manager_id} disconnected")
 
-    async def send_personal_message(self, manager_id: int, message: dict):
-        if manager_id in self.active_connections:
-            websocket = self.active_connections[manager_id]
+        for project_id in list(connection.projects):
+            self._remove_subscriber(connection, project_id)
+
+        if connection.writer and connection.writer is not asyncio.current_task():
+            connection.writer.cancel()
+        connection.discard_pending()
+        if connection.websocket is None:
+            # Будим SSE-ответ, ждущий очередь: None - конец потока
+            connection.queue.put_nowait(None)
+        logger.info(f"Manager {manager_id} disconnected ({connection_id})")
+
+    def subscribe(self, manager_id: int, connection_id: str, project_id: int) -> bool:
+        """Подписывает подключение на события проекта"""
+        connection = self.active_connections.get(manager_id, {}).get(connection_id)
+        if not connection:
+            return False
+        connection.projects.add(project_id)
+        self.project_subscribers.setdefault(project_id, {})[connection.id] = connection
+        return True
+
+    def unsubscribe(self, manager_id: int, connection_id: str, project_id: int):
+        connection = self.active_connections.get(manager_id, {}).get(connection_id)
+        if connection:
+            self._remove_subscriber(connection, project_id)
+
+    def _remove_subscriber(self, connection: Connection, project_id: int):
+        connection.projects.discard(project_id)
+        subscribers = self.project_subscribers.get(project_id)
+        if subscribers is None:
+            return
+        subscribers.pop(connection.id, None)
+        if not subscribers:
+            del self.project_subscribers[project_id]
+
+    def subscriber_count(self, project_id: int) -> int:
+        return len(self.project_subscribers.get(project_id, {}))
+
+    def _evict(self, connection: Connection, code: int):
+        self.disconnect(connection.manager_id, connection.id)
+        if connection.websocket is not None:
+            asyncio.create_task(self._close(connection.websocket, code))
+
+    def touch(self, manager_id: int, connection_id: str):
+        """Клиент подал признаки жизни (pong или любое другое сообщение)"""
+        connection = self.active_connections.get(manager_id, {}).get(connection_id)
+        if connection:
+            connection.missed_pongs = 0
+
+    def heartbeat(self, max_missed: int) -> int:
+        """
+        Один такт heartbeat: отключает тех, кто пропустил max_missed ping подряд,
+        остальным отправляет ping. Возвращает число отключенных.
+        """
+        reaped = 0
+        for connections in list(self.active_connections.values()):
+            for connection in list(connections.values()):
+                # SSE не умеет отвечать pong; обрыв видно по keep-alive записи
+                if connection.websocket is None:
+                    continue
+                if connection.missed_pongs >= max_missed:
+                    logger.info(
+                        f"Reaping idle connection of manager "
+                        f"{connection.manager_id} ({connection.id})")
+                    self._evict(connection, HEARTBEAT_CLOSE_CODE)
+                    reaped += 1
+                    continue
+                connection.missed_pongs += 1
+                if not connection.enqueue({"type": "ping"}):
+                    self._handle_overflow(connection)
+        return reaped
+
+    async def _heartbeat_loop(self, interval: float, max_missed: int):
+        while True:
+            await asyncio.sleep(interval)
             try:
-                await websocket.send_json(message)
-                logger.info(f"Sent message to manager {manager_id}")
+                self.heartbeat(max_missed)
             except Exception as e:
-                logger.error(f"Error sending message to manager {manager_id}: {e}")
-                self.disconnect(manager_id)
+                logger.error(f"Heartbeat failed: {e!r}")
 
-    async def notify_new_message(self, lead_id: int, manager_id: int, message_data: dict):
+    def start_heartbeat(self, interval: float, max_missed: int):
+        if self._heartbeat_task is None or self._heartbeat_task.done():
+            self._heartbeat_task = asyncio.create_task(
+                self._heartbeat_loop(interval, max_missed))
+
+    async def stop_heartbeat(self):
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+
+    def connection_count(self, manager_id: int) -> int:
+        return len(self.active_connections.get(manager_id, {}))
+
+    def stats(self) -> List[dict]:
+        return [
+            connection.stats()
+            for connections in self.active_connections.values()
+            for connection in connections.values()
+        ]
+
+    async def _writer(self, connection: Connection):
+        """Единственный, кто пишет в сокет: разбирает очередь подключения"""
+        try:
+            while True:
+                batch = [await connection.queue.get()]
+                try:
+                    if connection.batch_window:
+                        await asyncio.sleep(connection.batch_window)
+                        while len(batch) < MAX_BATCH_EVENTS:
+                            try:
+                                batch.append(connection.queue.get_nowait())
+                            except asyncio.QueueEmpty:
+                                break
+                        frame = {"type": "batch", "events": coalesce_events(batch)}
+                    else:
+                        frame = batch[0]
+
+                    await asyncio.wait_for(
+                        connection.codec.send(connection.websocket, frame),
+                        timeout=self.send_timeout)
+                finally:
+                    for _ in batch:
+                        connection.queue.task_done()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                f"Error sending message to manager {connection.manager_id} "
+                f"({connection.id}): {e!r}")
+            self.disconnect(connection.manager_id, connection.id)
+            await self._close(connection.websocket)
+
+    async def _close(self, websocket: WebSocket, code: int = 1011):
+        try:
+            await asyncio.wait_for(websocket.close(code=code),
+                                   timeout=self.send_timeout)
+        except Exception:
+            pass
+
+    def _handle_overflow(self, connection: Connection):
+        connection.overflows += 1
+        logger.warning(
+            f"Send queue overflow for manager {connection.manager_id} "
+            f"({connection.id}), policy={self.overflow_policy}")
+
+        if self.overflow_policy == "disconnect":
+            self._evict(connection, OVERFLOW_CLOSE_CODE)
+            return
+
+        # Клиент все равно отстал: вместо хвоста событий просим перечитать данные
+        connection.discard_pending()
+        connection.enqueue(RESYNC_REQUIRED)
+
+    async def send_personal_message(self, manager_id: int, message: dict):
+        """Кладет событие в очереди всех сокетов менеджера, не дожидаясь сети"""
+        connections = self.active_connections.get(manager_id)
+        if not connections:
+            return
+
+        self._enqueue_all(connections.values(), message)
+
+    def send_to_connection(self, manager_id: int, connection_id: str, message: dict):
+        """Ответ в одно конкретное подключение"""
+        connection = self.active_connections.get(manager_id, {}).get(connection_id)
+        if connection:
+            self._enqueue_all([connection], message)
+
+    def _enqueue_all(self, connections, message: dict):
+        for connection in list(connections):
+            if not connection.enqueue(message):
+                self._handle_overflow(connection)
+
+    async def drain(self):
+        """Дождаться, пока все очереди будут отправлены"""
+        await asyncio.gather(*(
+            connection.queue.join()
+            for connections in list(self.active_connections.values())
+            for connection in list(connections.values())
+        ))
+
+    async def close_all(self):
+        """Останавливает writer-задачи всех подключений (остановка приложения)"""
+        connections = [
+            connection
+            for manager_connections in list(self.active_connections.values())
+            for connection in list(manager_connections.values())
+        ]
+        for connection in connections:
+            self.disconnect(connection.manager_id, connection.id)
+        await asyncio.gather(
+            *(c.writer for c in connections if c.writer),
+            return_exceptions=True
+        )
+
+    async def _deliver(self, envelope: dict):
+        manager_id = envelope.get("manager_id")
+        project_id = envelope.get("project_id")
+        message = envelope["message"]
+        if manager_id is not None:
+            # event_id выдается здесь, при получении: часы воркеров расходятся,
+            # и id отправителя мог бы оказаться меньше уже отданных клиенту
+            message = {**message, "event_id": self.event_ids.next()}
+
+        if project_id is not None:
+            # Сокеты самого менеджера получат событие ниже, не дублируем
+            subscribers = [
+                connection
+                for connection in self.project_subscribers.get(project_id, {}).values()
+                if connection.manager_id != manager_id
+            ]
+            self._enqueue_all(subscribers, message)
+
+        if manager_id is None:
+            return
+
+        if manager_id is not None:
+            # Вытесненное событие сохраняет только воркер, который его создал
+            spill_ready = self.replay.append(
+                manager_id, message,
+                spill_evicted=envelope.get("origin") == self.worker_id)
+            if spill_ready:
+                asyncio.get_running_loop().run_in_executor(
+                    None, self.replay.spill.flush)
+
+        await self.send_personal_message(manager_id, message)
+
+    async def publish(self, manager_id: int | None, message: dict,
+                      project_id: int | None = None):
+        """
+        Отправить событие менеджеру, в каком бы воркере ни был его сокет
+
+        С project_id событие получат и подписчики ленты проекта; manager_id=None -
+        только подписчики. В повтор по since попадают только события менеджера.
+        """
+        if project_id is not None:
+            message = {**message, "project_id": project_id}
+        envelope = {
+            "manager_id": manager_id,
+            "origin": self.worker_id,
+            "message": message
+        }
+        if project_id is not None:
+            envelope["project_id"] = project_id
+        await self.backend.publish(envelope)
+
+    async def notify_new_message(self, lead_id: int, manager_id: int, message_data: dict,
+                                 project_id: int | None = None):
         """Уведомить менеджера о новом сообщении от лида"""
         notification = {
             "type": "new_message",
             "lead_id": lead_id,
             "message": message_data
         }
-        await self.send_personal_message(manager_id, notification)
+        await self.publish(manager_id, notification, project_id=project_id)
+
+    async def notify_lead_status(self, lead_id: int, manager_id: int, status: str,
+                                 project_id: int | None = None):
+        """Уведомить менеджера о смене статуса лида"""
+        await self.publish(manager_id, {
+            "type": "lead_status",
+            "lead_id": lead_id,
+            "status": status
+        }, project_id=project_id)
+
+    async def notify_new_lead(self, lead_id: int, project_id: int, manager_id: int):
+        """Сообщить подписчикам проекта о новом лиде"""
+        await self.publish(None, {
+            "type": "new_lead",
+            "lead_id": lead_id,
+            "manager_id": manager_id
+        }, project_id=project_id)
+
+    async def notify_lead_reassigned(self, lead_id: int, project_id: int,
+                                     from_manager_id: int, to_manager_id: int):
+        """Уведомить обоих менеджеров и подписчиков проекта о переназначении лида"""
+        event = {
+            "type": "lead_reassigned",
+            "lead_id": lead_id,
+            "project_id": project_id,
+            "from_manager_id": from_manager_id,
+            "to_manager_id": to_manager_id
+        }
+        await self.publish(to_manager_id, event, project_id=project_id)
+        if from_manager_id != to_manager_id:
+            await self.publish(from_manager_id, event)
+
+    async def notify_batch(self, manager_id: int | None, events: List[dict],
+                           project_id: int | None = None):
+        """Несколько событий одним кадром batch (массовые операции с лидами)"""
+        if events:
+            await self.publish(manager_id, {"type": "batch", "events": events},
+                               project_id=project_id)
+
+    async def notify_bulk(self, events: List[Tuple[int, int, dict]]):
+        """
+        События (manager_id, project_id, event) массовой операции: один кадр
+        batch на каждого затронутого менеджера и на ленту каждого проекта
+        """
+        by_manager: Dict[int, List[dict]] = {}
+        by_project: Dict[int, List[dict]] = {}
+        for manager_id, project_id, event in events:
+            by_manager.setdefault(manager_id, []).append({**event, "project_id": project_id})
+            if event["type"] != "lead_reassigned" or manager_id == event["to_manager_id"]:
+                by_project.setdefault(project_id, []).append({**event, "project_id": project_id})
+
+        for manager_id, manager_events in by_manager.items():
+            await self.notify_batch(manager_id, manager_events)
+        for project_id, project_events in by_project.items():
+            await self.notify_batch(None, project_events, project_id=project_id)
 
 
-manager = ConnectionManager()
\ No newline at end of file
+manager = ConnectionManager()
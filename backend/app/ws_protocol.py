@@ -0,0 +1,155 @@
+# backend/app/ws_protocol.py
+
+"""
+Кодеки кадров WebSocket
+
+По умолчанию события уходят JSON-текстом. Клиент может запросить
+подпротокол leads.msgpack.v1 (Sec-WebSocket-Protocol): тогда кадры
+бинарные, MessagePack с короткими ключами и числовыми тегами типов.
+Сжатие permessage-deflate согласует сам uvicorn (WS_PER_MESSAGE_DEFLATE).
+"""
+
+import json
+from typing import Any, List, Tuple
+
+try:
+    import msgpack
+except ImportError:  # msgpack - опциональная зависимость
+    msgpack = None
+
+SUBPROTOCOL_JSON = "leads.json.v1"
+SUBPROTOCOL_MSGPACK = "leads.msgpack.v1"
+
+TYPE_TAGS = {
+    "new_message": 1,
+    "lead_status": 2,
+    "batch": 3,
+    "ping": 4,
+    "pong": 5,
+    "resync_required": 6,
+    "replay_complete": 7,
+    "error": 8,
+    "message_sent": 9,
+    "new_lead": 10,
+    "lead_reassigned": 11,
+    "subscribe": 12,
+    "unsubscribe": 13,
+    "subscribed": 14,
+    "unsubscribed": 15,
+    "message_accepted": 16,
+    "message_failed": 17,
+}
+TAG_TYPES = {tag: name for name, tag in TYPE_TAGS.items()}
+
+KEY_ALIASES = {
+    "type": "t",
+    "lead_id": "l",
+    "message": "m",
+    "sender": "s",
+    "created_at": "c",
+    "id": "i",
+    "text": "x",
+    "status": "st",
+    "event_id": "e",
+    "events": "ev",
+    "reason": "r",
+    "last_event_id": "le",
+    "project_id": "p",
+}
+ALIAS_KEYS = {alias: key for key, alias in KEY_ALIASES.items()}
+
+
+def compact(value: Any) -> Any:
+    """Заменяет известные ключи короткими, а type - числовым тегом"""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key == "type" and item in TYPE_TAGS:
+                item = TYPE_TAGS[item]
+            else:
+                item = compact(item)
+            result[KEY_ALIASES.get(key, key)] = item
+        return result
+    if isinstance(value, list):
+        return [compact(item) for item in value]
+    return value
+
+
+def expand(value: Any) -> Any:
+    """Обратное преобразование compact"""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            key = ALIAS_KEYS.get(key, key)
+            if key == "type" and item in TAG_TYPES:
+                item = TAG_TYPES[item]
+            else:
+                item = expand(item)
+            result[key] = item
+        return result
+    if isinstance(value, list):
+        return [expand(item) for item in value]
+    return value
+
+
+class JsonCodec:
+    subprotocol = None
+
+    def encode(self, frame: dict) -> str:
+        # Так же, как WebSocket.send_json в starlette
+        return json.dumps(frame, separators=(",", ":"))
+
+    def decode(self, data: str | bytes) -> dict:
+        return json.loads(data)
+
+    async def send(self, websocket, frame: dict):
+        await websocket.send_json(frame)
+
+
+class MsgpackCodec:
+    subprotocol = SUBPROTOCOL_MSGPACK
+
+    def encode(self, frame: dict) -> bytes:
+        return msgpack.packb(compact(frame), use_bin_type=True)
+
+    def decode(self, data: bytes) -> dict:
+        return expand(msgpack.unpackb(data, raw=False))
+
+    async def send(self, websocket, frame: dict):
+        await websocket.send_bytes(self.encode(frame))
+
+
+JSON_CODEC = JsonCodec()
+
+
+def supported_subprotocols() -> List[str]:
+    protocols = [SUBPROTOCOL_JSON]
+    if msgpack is not None:
+        protocols.insert(0, SUBPROTOCOL_MSGPACK)
+    return protocols
+
+
+def negotiate(offered: List[str]) -> Tuple[str | None, Any]:
+    """
+    Выбирает подпротокол из предложенных клиентом
+
+    Возвращает (подпротокол для accept, кодек). Без подходящего
+    предложения - обычный JSON без подпротокола.
+    """
+    if SUBPROTOCOL_MSGPACK in offered and msgpack is not None:
+        return SUBPROTOCOL_MSGPACK, MsgpackCodec()
+    if SUBPROTOCOL_JSON in offered:
+        return SUBPROTOCOL_JSON, JSON_CODEC
+    return None, JSON_CODEC
+
+
+def decode_client_frame(message: dict) -> dict | None:
+    """Разбирает ASGI-сообщение websocket.receive от клиента (текст или msgpack)"""
+    try:
+        if message.get("text") is not None:
+            return json.loads(message["text"])
+        if message.get("bytes") is not None and msgpack is not None:
+            return expand(msgpack.unpackb(message["bytes"], raw=False))
+    except ValueError:
+        return None
+    return None
@@ -13,4 +13,6 @@ echo "Running migrations..."
 alembic upgrade head
 
 echo "Starting application..."
-exec uvicorn app.main:app --host 0.0.0.0 --port 8000
\ No newline at end of file
+# permessage-deflate берем из настроек (env или .env), как и в python -m app.main
+WS_DEFLATE=$(python -c "from app.config import settings; print(settings.WS_PER_MESSAGE_DEFLATE)")
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --ws-per-message-deflate "$WS_DEFLATE"
\ No newline at end of file
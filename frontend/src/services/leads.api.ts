@@ -1,5 +1,5 @@
 import api from './api';
-import type { LeadResponse, MessageResponse, SendMessageRequest } from '@/types/api.types';
+import type { LeadResponse, MessageResponse, SendMessageRequest, SyncResponse } from '@/types/api.types';
 
 export type LeadStatus = 'new' | 'read' | 'in_progress' | 'closed';
 export async function getLeads(status?: LeadStatus | ''): Promise<LeadResponse[]> {
@@ -11,6 +11,16 @@ export async function getLeads(status?: LeadStatus | ''): Promise<LeadResponse[]
     return response.data;
 }
 
+export async function getChanges(cursor: string | null, includeMessages = true): Promise<SyncResponse> {
+    const response = await api.get<SyncResponse>('/sync', {
+        params: {
+            cursor: cursor || undefined,
+            include_messages: includeMessages
+        }
+    });
+    return response.data;
+}
+
 export async function getLeadDetails(leadId: number): Promise<LeadResponse> {
     const response = await api.get<LeadResponse>(`/leads/${leadId}`);
     return response.data;
@@ -20,8 +30,14 @@ export async function closeLead(leadId: number): Promise<void> {
     await api.put(`/leads/${leadId}/close`);
 }
 
-export async function getMessages(leadId: number): Promise<MessageResponse[]> {
-    const response = await api.get<MessageResponse[]>(`/messages/${leadId}`);
+export interface MessagesPageParams {
+    after_id?: number;
+    before_id?: number;
+    limit?: number;
+}
+
+export async function getMessages(leadId: number, params?: MessagesPageParams): Promise<MessageResponse[]> {
+    const response = await api.get<MessageResponse[]>(`/messages/${leadId}`, { params });
     return response.data;
 }
 
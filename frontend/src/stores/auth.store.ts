@@ -2,6 +2,7 @@ import { defineStore } from 'pinia';
 import { ref, computed } from 'vue';
 import { useRouter } from 'vue-router';
 import api from '@/services/api';
+import { useLeadsStore } from '@/stores/leads.store';
 
 import type {
     ManagerResponse,
@@ -61,6 +62,7 @@ export const useAuthStore = defineStore('auth', () => {
 
         localStorage.removeItem('token');
         localStorage.removeItem('user');
+        useLeadsStore().reset();
 
         router.push({ name: 'login' });
     }
@@ -0,0 +1,40 @@
+import { defineStore } from 'pinia';
+import { ref, computed } from 'vue';
+import { getChanges } from '@/services/leads.api';
+
+import type { LeadResponse } from '@/types/api.types';
+
+// Список лидов живет между заходами на страницу: после первой загрузки
+// с сервера приходят только изменения с момента курсора (/sync)
+export const useLeadsStore = defineStore('leads', () => {
+    const leadsById = ref<Record<number, LeadResponse>>({});
+    const cursor = ref<string | null>(null);
+    const isLoaded = ref(false);
+
+    const leads = computed(() => Object.values(leadsById.value));
+
+    async function sync() {
+        let hasMore = true;
+        while (hasMore) {
+            const changes = await getChanges(cursor.value, false);
+            // Отозванные - до лидов: лид, вернувшийся в той же странице, придет в leads
+            for (const leadId of changes.revoked) {
+                delete leadsById.value[leadId];
+            }
+            for (const lead of changes.leads) {
+                leadsById.value[lead.id] = lead;
+            }
+            cursor.value = changes.cursor;
+            hasMore = changes.has_more;
+        }
+        isLoaded.value = true;
+    }
+
+    function reset() {
+        leadsById.value = {};
+        cursor.value = null;
+        isLoaded.value = false;
+    }
+
+    return { leads, isLoaded, sync, reset };
+});
@@ -52,18 +52,21 @@ export interface ProjectInfo {
 
 export interface ProjectCreate {
     name: string;
+    auto_close_after_days?: number | null;
 }
 
 export interface ProjectResponse {
     id: number;
     name: string;
     created_at: string;
+    auto_close_after_days: number | null;
 }
 
 export interface ProjectWithManagersResponse {
     id: number;
     name: string;
     created_at: string;
+    auto_close_after_days: number | null;
     managers: ManagerInfo[];
 }
 
@@ -108,6 +111,11 @@ export interface LeadResponse {
     status: 'new' | 'in_progress' | 'closed';
     created_at: string;
     last_updated_at: string;
+    last_message_at: string | null;
+    last_message_preview: string | null;
+    last_message_sender: 'manager' | 'lead' | null;
+    message_count: number;
+    unread_count: number;
 }
 
 export interface MessageResponse {
@@ -117,6 +125,18 @@ export interface MessageResponse {
     created_at: string;
 }
 
+export interface SyncMessage extends MessageResponse {
+    lead_id: number;
+}
+
+export interface SyncResponse {
+    leads: LeadResponse[];
+    messages: SyncMessage[];
+    revoked: number[];
+    cursor: string;
+    has_more: boolean;
+}
+
 export interface SendMessageRequest {
     text: string;
 }
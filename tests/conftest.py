@@ -34,7 +34,9 @@ def db_session(engine):
 
 
 @pytest.fixture(scope="function")
-def client(db_session):
+def client(db_session, monkeypatch):
+    from backend.app import database
+    from backend.app.auth import clear_ws_auth_cache
     from backend.app.database import get_db
 
     def override_get_db():
@@ -43,6 +45,11 @@ def client(db_session):
         finally:
             pass
 
+    # WebSocket-эндпоинты открывают короткие сессии сами, минуя get_db
+    monkeypatch.setattr(database, "SessionLocal",
+                        sessionmaker(bind=db_session.get_bind()))
+    clear_ws_auth_cache()
+
     app.dependency_overrides[get_db] = override_get_db
     yield TestClient(app)
     app.dependency_overrides.clear()
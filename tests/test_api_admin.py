@@ -167,4 +167,17 @@ def test_delete_bot(client, admin_token, project1, bot1):
     response = client.delete(f"/admin/projects/{project1.id}/bots/{bot1.id}",
                              headers={"Authorization": f"Bearer {admin_token}"}
                              )
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_realtime_connections_admin_only(client, admin_token, manager1_token):
+    """Статистика очередей WebSocket доступна только админу"""
+    response = client.get("/admin/realtime/connections", headers={
+        "Authorization": f"Bearer {admin_token}"
+    })
+    assert response.status_code == 200
+    assert isinstance(response.json(), list)
+
+    response = client.get("/admin/realtime/connections", headers={
+        "Authorization": f"Bearer {manager1_token}"
+    })
+    assert response.status_code == 403
@@ -57,4 +57,49 @@ def test_get_current_user_invalid_token(client):
     response = client.get("/auth/me", headers={
         "Authorization": "Bearer invalidtoken"
     })
-    assert response.status_code == 401
\ No newline at end of file
+    assert response.status_code == 401
+
+def test_ws_auth_cache_is_bounded(client, admin_user, monkeypatch):
+    """Кэш WebSocket-токенов не растет от смены токенов"""
+    from backend.app import auth
+    from backend.app.auth import authenticate_websocket_token, create_access_token
+    from backend.app.config import settings
+
+    clock = [1000.0]
+    monkeypatch.setattr(auth.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(settings, "WS_AUTH_CACHE_SIZE", 3)
+    tokens = [create_access_token({"sub": "admin", "n": i}) for i in range(5)]
+
+    for token in tokens:
+        assert authenticate_websocket_token(token).username == "admin"
+    assert list(auth._ws_auth_cache) == tokens[2:]
+
+    # Просроченные записи снимаются при следующей вставке
+    clock[0] += settings.WS_AUTH_CACHE_SECONDS + 1
+    authenticate_websocket_token(tokens[0])
+    assert list(auth._ws_auth_cache) == tokens[:1]
+
+
+def test_ws_auth_cache_respects_token_exp(client, admin_user, monkeypatch):
+    """Кэш не продлевает токен, истекающий раньше WS_AUTH_CACHE_SECONDS"""
+    from datetime import datetime, timedelta
+    from jose import jwt
+    from backend.app import auth
+    from backend.app.auth import authenticate_websocket_token
+    from backend.app.config import settings
+
+    clock = [1000.0]
+    monkeypatch.setattr(auth.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(settings, "WS_AUTH_CACHE_SECONDS", 60)
+    token = jwt.encode({"sub": "admin", "exp": datetime.utcnow() + timedelta(seconds=5)},
+                       settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
+
+    assert authenticate_websocket_token(token).username == "admin"
+    expires_at, _ = auth._ws_auth_cache[token]
+    assert expires_at <= clock[0] + 5
+
+    # Истекший токен снова проверяется и отклоняется, а не берется из кэша
+    clock[0] += 10
+    monkeypatch.setattr(jwt, "decode", lambda *a, **kw: (_ for _ in ()).throw(
+        jwt.ExpiredSignatureError("expired")))
+    assert authenticate_websocket_token(token) is None
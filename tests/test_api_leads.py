@@ -159,4 +159,243 @@ def test_lead_not_found(client, admin_token):
     response = client.get("/leads/99999", headers={
         "Authorization": f"Bearer {admin_token}"
     })
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_lead_conditional_get(client, manager1_token, manager2_token,
+                              db_session, project1, bot1, manager1):
+    """If-None-Match с актуальным ETag дает 304, смена статуса - новый ETag"""
+    lead = Lead(telegram_chat_id=555, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new")
+    db_session.add(lead)
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {manager1_token}"}
+
+    first = client.get(f"/leads/{lead.id}", headers=headers)
+    etag = first.headers["etag"]
+    assert first.status_code == 200
+
+    cached = client.get(f"/leads/{lead.id}",
+                        headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert cached.headers["etag"] == etag
+
+    # Проверка доступа идет раньше сравнения ETag
+    foreign = client.get(f"/leads/{lead.id}", headers={
+        "Authorization": f"Bearer {manager2_token}", "If-None-Match": etag})
+    assert foreign.status_code == 403
+
+    client.put(f"/leads/{lead.id}/mark-read", headers=headers)
+    changed = client.get(f"/leads/{lead.id}",
+                         headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["status"] == "read"
+
+
+def test_mark_read_resets_unread_count(client, manager1_token, db_session,
+                                       project1, bot1, manager1):
+    lead = Lead(telegram_chat_id=666, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new",
+                message_count=3, unread_count=3,
+                last_message_preview="Есть кто?", last_message_sender="lead")
+    db_session.add(lead)
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {manager1_token}"}
+
+    listed = client.get("/leads", headers=headers).json()
+    assert listed[0]["unread_count"] == 3
+    assert listed[0]["last_message_preview"] == "Есть кто?"
+
+    client.put(f"/leads/{lead.id}/mark-read", headers=headers)
+    data = client.get(f"/leads/{lead.id}", headers=headers).json()
+
+    assert data["unread_count"] == 0
+    assert data["message_count"] == 3
+
+
+def test_leads_keyset_pagination_and_filters(client, manager1_token, db_session,
+                                             project1, bot1, manager1, manager2):
+    """limit/cursor листают лиды по last_updated_at без пропусков и повторов"""
+    from datetime import datetime, timedelta
+
+    started = datetime(2024, 1, 1)
+    for i in range(7):
+        db_session.add(Lead(telegram_chat_id=500 + i, bot_id=bot1.id,
+                            project_id=project1.id, assigned_manager_id=manager1.id,
+                            status="closed" if i % 3 == 0 else "new",
+                            created_at=started,
+                            # Одинаковые last_updated_at - порядок решает id
+                            last_updated_at=started + timedelta(hours=i // 2)))
+    db_session.add(Lead(telegram_chat_id=599, bot_id=bot1.id, project_id=project1.id,
+                        assigned_manager_id=manager2.id, status="new"))
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {manager1_token}"}
+
+    seen, cursor = [], None
+    while True:
+        params = {"sort": "last_updated_at", "limit": 3}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/leads", params=params, headers=headers)
+        assert response.status_code == 200
+        page = response.json()
+        seen.extend(lead["telegram_chat_id"] for lead in page)
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+
+    assert seen == [506, 505, 504, 503, 502, 501, 500]
+    assert {lead["project_name"] for lead in page} == {project1.name}
+
+    response = client.get("/leads", headers=headers, params={
+        "status": ["new", "read"], "updated_from": "2024-01-01T01:00:00"})
+    assert [lead["telegram_chat_id"] for lead in response.json()] == [505, 504, 502]
+
+    response = client.get("/leads", params={"cursor": "garbage"}, headers=headers)
+    assert response.status_code == 400
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Кадры batch, отправленные массовыми операциями: (manager_id, project_id, events)"""
+    from backend.app.websocket import manager as ws_manager
+
+    sent = []
+
+    async def record(manager_id, events, project_id=None):
+        sent.append((manager_id, project_id, events))
+
+    monkeypatch.setattr(ws_manager, "notify_batch", record)
+    return sent
+
+
+def test_bulk_close_reports_per_id(client, manager1_token, db_session, project1,
+                                   bot1, manager1, manager2, batches):
+    """Один UPDATE, отчет по каждому id и один кадр на менеджера"""
+    own = [Lead(telegram_chat_id=700 + i, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new") for i in range(3)]
+    closed = Lead(telegram_chat_id=710, bot_id=bot1.id, project_id=project1.id,
+                  assigned_manager_id=manager1.id, status="closed")
+    foreign = Lead(telegram_chat_id=711, bot_id=bot1.id, project_id=project1.id,
+                   assigned_manager_id=manager2.id, status="new")
+    db_session.add_all(own + [closed, foreign])
+    db_session.commit()
+
+    ids = [lead.id for lead in own] + [closed.id, foreign.id, 99999]
+    response = client.post("/leads/bulk/close", json={"lead_ids": ids},
+                           headers={"Authorization": f"Bearer {manager1_token}"})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["updated"] == 3
+    results = {r["lead_id"]: r["result"] for r in data["results"]}
+    assert results == {**{lead.id: "closed" for lead in own},
+                       closed.id: "already_closed", foreign.id: "forbidden",
+                       99999: "not_found"}
+
+    db_session.expire_all()
+    assert all(lead.status == "closed" and lead.closed_at for lead in own)
+    assert foreign.status == "new"
+
+    personal = [b for b in batches if b[0] is not None]
+    assert [(m, len(events)) for m, _, events in personal] == [(manager1.id, 3)]
+    assert [(p, len(events)) for m, p, events in batches if m is None] == [(project1.id, 3)]
+
+
+def test_bulk_mark_read_by_filter(client, admin_token, db_session, project1, bot1,
+                                  manager1, manager2, batches):
+    leads = [Lead(telegram_chat_id=720 + i, bot_id=bot1.id, project_id=project1.id,
+                  assigned_manager_id=manager.id, status="new", unread_count=2)
+             for i, manager in enumerate([manager1, manager2, manager2])]
+    leads.append(Lead(telegram_chat_id=729, bot_id=bot1.id, project_id=project1.id,
+                      assigned_manager_id=manager1.id, status="closed"))
+    db_session.add_all(leads)
+    db_session.commit()
+
+    response = client.post("/leads/bulk/mark-read",
+                           json={"filter": {"project_id": project1.id}},
+                           headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    assert response.json()["updated"] == 3
+
+    db_session.expire_all()
+    assert [(lead.status, lead.unread_count) for lead in leads] == [
+        ("read", 0), ("read", 0), ("read", 0), ("closed", 0)]
+    assert sorted((m, len(events)) for m, _, events in batches if m is not None) == \
+        sorted([(manager1.id, 1), (manager2.id, 2)])
+
+
+def test_bulk_reassign(client, admin_token, manager1_token, db_session, project1,
+                       project2, bot1, manager1, manager2, batches):
+    project1.managers.append(manager2)
+    from backend.app.models import Bot
+    bot2 = Bot(identifier="bot2", name="Bot 2", project_id=project2.id,
+               token="token2", auto_reply="Hi", is_active=True)
+    db_session.add(bot2)
+    db_session.flush()
+    movable = Lead(telegram_chat_id=730, bot_id=bot1.id, project_id=project1.id,
+                   assigned_manager_id=manager1.id, status="new")
+    other_project = Lead(telegram_chat_id=731, bot_id=bot2.id, project_id=project2.id,
+                         assigned_manager_id=manager1.id, status="new")
+    already = Lead(telegram_chat_id=732, bot_id=bot1.id, project_id=project1.id,
+                   assigned_manager_id=manager2.id, status="new")
+    db_session.add_all([movable, other_project, already])
+    db_session.commit()
+
+    body = {"lead_ids": [movable.id, other_project.id, already.id],
+            "manager_id": manager2.id}
+    response = client.post("/leads/bulk/reassign", json=body,
+                           headers={"Authorization": f"Bearer {manager1_token}"})
+    assert response.status_code == 403
+
+    response = client.post("/leads/bulk/reassign", json=body,
+                           headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 200
+    results = {r["lead_id"]: r["result"] for r in response.json()["results"]}
+    assert results == {movable.id: "reassigned",
+                       other_project.id: "manager_not_in_project",
+                       already.id: "unchanged"}
+
+    db_session.expire_all()
+    assert movable.assigned_manager_id == manager2.id
+    # Старый и новый менеджер получают по кадру, лента проекта - одно событие
+    assert sorted(m for m, _, _ in batches if m is not None) == \
+        sorted([manager1.id, manager2.id])
+    assert [len(events) for m, _, events in batches if m is None] == [1]
+
+
+def test_bulk_requires_ids_or_filter(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    assert client.post("/leads/bulk/close", json={},
+                       headers=headers).status_code == 400
+    assert client.post("/leads/bulk/close", json={"lead_ids": [1], "filter": {}},
+                       headers=headers).status_code == 400
+
+
+def test_bulk_rejects_empty_filter(client, admin_token):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    for body in ({"filter": {}}, {"filter": {"status": [], "project_id": None}}):
+        response = client.post("/leads/bulk/close", json=body, headers=headers)
+        assert response.status_code == 400
+
+
+def test_bulk_filter_is_capped(client, admin_token, db_session, monkeypatch,
+                               project1, bot1, manager1, batches):
+    from backend.app.api import leads as leads_api
+    monkeypatch.setattr(leads_api, "MAX_BULK_IDS", 2)
+    leads = [Lead(telegram_chat_id=740 + i, bot_id=bot1.id, project_id=project1.id,
+                  assigned_manager_id=manager1.id, status="new") for i in range(3)]
+    db_session.add_all(leads)
+    db_session.commit()
+
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    body = {"filter": {"project_id": project1.id}}
+    response = client.post("/leads/bulk/close", json=body, headers=headers)
+    assert (response.json()["updated"], response.json()["has_more"]) == (2, True)
+
+    # Повтор того же запроса берет следующую порцию
+    response = client.post("/leads/bulk/close", json=body, headers=headers)
+    assert (response.json()["updated"], response.json()["has_more"]) == (1, False)
+
+    db_session.expire_all()
+    assert {lead.status for lead in leads} == {"closed"}
@@ -58,4 +58,189 @@ def test_messages_lead_not_found(client, admin_token):
     response = client.get("/messages/99999", headers={
         "Authorization": f"Bearer {admin_token}"
     })
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+def test_chat_socket_acknowledges_before_delivery(client, manager1_token,
+                                                  db_session, project1, bot1,
+                                                  manager1, monkeypatch):
+    """Чат-сокет сразу подтверждает temp_id, результат приходит следом"""
+    from backend.app.api import messages
+
+    lead = Lead(telegram_chat_id=333, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new")
+    db_session.add(lead)
+    db_session.commit()
+
+    async def fake_send(lead_id, text):
+        if text == "fail":
+            return {"type": "error", "message": "Failed to send message"}
+        if text == "boom":
+            raise RuntimeError("database is down")
+        return {"type": "message_sent", "message": {"text": text}}
+
+    monkeypatch.setattr(messages, "_send_chat_message", fake_send)
+
+    with client.websocket_connect(
+            f"/messages/ws/{lead.id}?token={manager1_token}") as ws:
+        ws.send_json({"action": "send_message", "text": "one", "temp_id": "t1"})
+        ws.send_json({"action": "send_message", "text": "fail", "temp_id": "t2"})
+        ws.send_json({"action": "send_message", "text": "", "temp_id": "t3"})
+        ws.send_json({"action": "send_message", "text": "boom", "temp_id": "t4"})
+        frames = [ws.receive_json() for _ in range(7)]
+
+    by_type = {}
+    for frame in frames:
+        by_type.setdefault(frame["type"], []).append(frame["temp_id"])
+    assert by_type["message_accepted"] == ["t1", "t2", "t4"]
+    assert by_type["message_sent"] == ["t1"]
+    assert sorted(by_type["message_failed"]) == ["t2", "t3", "t4"]
+    assert frames[0] == {"type": "message_accepted", "temp_id": "t1"}
+
+
+@pytest.mark.asyncio
+async def test_chat_message_to_deleted_lead(client, db_session, project1, bot1,
+                                            manager1, monkeypatch):
+    """Лид удален, пока шел запрос к Telegram: ошибка, а не AttributeError"""
+    from backend.app.api import messages
+
+    lead = Lead(telegram_chat_id=335, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new")
+    db_session.add(lead)
+    db_session.commit()
+    lead_id = lead.id
+
+    async def send_and_delete(token, chat_id, text):
+        db_session.delete(lead)
+        db_session.commit()
+        return True
+
+    monkeypatch.setattr(messages, "send_telegram_message", send_and_delete)
+    assert await messages._send_chat_message(lead_id, "hi") == {
+        "type": "error", "message": "Lead not found"}
+
+
+@pytest.mark.asyncio
+async def test_chat_message_notifies_after_session_closed(client, db_session, project1,
+                                                          bot1, manager1, monkeypatch):
+    """Рассылка статуса идет, когда сессия уже закрыта и соединение в пуле"""
+    from sqlalchemy.orm import Session, sessionmaker
+    from backend.app import database
+    from backend.app.api import messages
+    from backend.app.websocket import manager as ws_manager
+
+    lead = Lead(telegram_chat_id=336, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new")
+    db_session.add(lead)
+    db_session.commit()
+
+    open_sessions = []
+
+    class TrackedSession(Session):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            open_sessions.append(self)
+
+        def close(self):
+            open_sessions.remove(self)
+            super().close()
+
+    monkeypatch.setattr(database, "SessionLocal",
+                        sessionmaker(bind=db_session.get_bind(), class_=TrackedSession))
+
+    async def send(token, chat_id, text):
+        return True
+
+    notified = []
+
+    async def notify_lead_status(**kwargs):
+        notified.append(len(open_sessions))
+
+    monkeypatch.setattr(messages, "send_telegram_message", send)
+    monkeypatch.setattr(ws_manager, "notify_lead_status", notify_lead_status)
+    reply = await messages._send_chat_message(lead.id, "hi")
+    assert reply["type"] == "message_sent" and reply["message"]["id"]
+    assert notified == [0]
+
+
+def _lead_with_history(db_session, project1, bot1, manager1, count=10):
+    from datetime import datetime, timedelta
+
+    lead = Lead(telegram_chat_id=444, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new")
+    db_session.add(lead)
+    db_session.flush()
+    started = datetime(2024, 1, 1, 12, 0, 0)
+    # Пары сообщений с одинаковым created_at - порядок решает id
+    history = [
+        Message(lead_id=lead.id, sender="lead", text=f"m{i}",
+                created_at=started + timedelta(seconds=i // 2))
+        for i in range(count)
+    ]
+    db_session.add_all(history)
+    db_session.commit()
+    return lead, [m.id for m in history]
+
+
+def test_messages_keyset_pagination(client, manager1_token, db_session,
+                                    project1, bot1, manager1):
+    """after_id / before_id / limit отдают срезы истории по (created_at, id)"""
+    lead, ids = _lead_with_history(db_session, project1, bot1, manager1)
+    headers = {"Authorization": f"Bearer {manager1_token}"}
+
+    def texts(params):
+        response = client.get(f"/messages/{lead.id}", params=params,
+                              headers=headers)
+        assert response.status_code == 200
+        return [m["text"] for m in response.json()]
+
+    assert texts({}) == [f"m{i}" for i in range(10)]
+    assert texts({"after_id": ids[6]}) == ["m7", "m8", "m9"]
+    assert texts({"after_id": ids[2], "limit": 2}) == ["m3", "m4"]
+    assert texts({"after_id": ids[9]}) == []
+    assert texts({"limit": 3}) == ["m7", "m8", "m9"]
+    assert texts({"before_id": ids[7], "limit": 3}) == ["m4", "m5", "m6"]
+    assert texts({"before_id": ids[2]}) == ["m0", "m1"]
+
+
+def test_messages_pagination_rejects_bad_cursor(client, manager1_token,
+                                                db_session, project1, bot1,
+                                                manager1):
+    lead, ids = _lead_with_history(db_session, project1, bot1, manager1, count=2)
+    headers = {"Authorization": f"Bearer {manager1_token}"}
+
+    assert client.get(f"/messages/{lead.id}?after_id=99999",
+                      headers=headers).status_code == 400
+    assert client.get(f"/messages/{lead.id}?after_id={ids[0]}&before_id={ids[1]}",
+                      headers=headers).status_code == 400
+    assert client.get(f"/messages/{lead.id}?limit=0",
+                      headers=headers).status_code == 422
+
+
+def test_messages_conditional_get(client, manager1_token, db_session,
+                                  project1, bot1, manager1):
+    """Новое сообщение меняет ETag переписки"""
+    lead, ids = _lead_with_history(db_session, project1, bot1, manager1, count=3)
+    headers = {"Authorization": f"Bearer {manager1_token}"}
+
+    etag = client.get(f"/messages/{lead.id}", headers=headers).headers["etag"]
+    assert client.get(f"/messages/{lead.id}?after_id={ids[-1]}", headers={
+        **headers, "If-None-Match": f'"other", {etag}'}).status_code == 304
+
+    db_session.add(Message(lead_id=lead.id, sender="lead", text="new"))
+    db_session.commit()
+
+    response = client.get(f"/messages/{lead.id}?after_id={ids[-1]}",
+                          headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert [m["text"] for m in response.json()] == ["new"]
+    assert response.headers["etag"] != etag
+
+
+def test_etag_matching():
+    from backend.app.etag import etag_matches
+
+    assert etag_matches('W/"1.2"', '"1.2"')
+    assert etag_matches('"0", W/"1.2"', 'W/"1.2"')
+    assert etag_matches("*", 'W/"1.2"')
+    assert not etag_matches(None, 'W/"1.2"')
+    assert not etag_matches('"1.3"', 'W/"1.2"')
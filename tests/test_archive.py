@@ -0,0 +1,173 @@
+# tests/test_archive.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from backend.app.archive import (pack_messages, unpack_messages, archive_lead,
+                                 archive_closed_leads)
+from backend.app.models import Lead, Message, MessageArchive
+
+
+def test_pack_round_trip():
+    created = datetime(2024, 3, 1, 10, 0, 0, 123456)
+    messages = [Message(id=7, sender="lead", text="Привет", created_at=created),
+                Message(id=9, sender="manager", text="Здравствуйте", created_at=None)]
+    restored = unpack_messages(5, pack_messages(messages))
+    assert [(m.id, m.lead_id, m.sender, m.text, m.created_at) for m in restored] == [
+        (7, 5, "lead", "Привет", created),
+        (9, 5, "manager", "Здравствуйте", None),
+    ]
+
+
+def _lead(db_session, chat_id, project1, bot1, manager1, status, closed_days_ago=None,
+          count=4):
+    lead = Lead(telegram_chat_id=chat_id, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status=status)
+    if closed_days_ago is not None:
+        lead.closed_at = datetime.utcnow() - timedelta(days=closed_days_ago)
+    db_session.add(lead)
+    db_session.flush()
+    started = datetime(2024, 1, 1, 12, 0, 0)
+    db_session.add_all([
+        Message(lead_id=lead.id, sender="lead", text=f"m{i}",
+                created_at=started + timedelta(seconds=i // 2))
+        for i in range(count)
+    ])
+    db_session.commit()
+    return lead
+
+
+@pytest.fixture
+def session_factory(db_session):
+    return sessionmaker(bind=db_session.get_bind())
+
+
+def test_archives_only_old_closed_leads(db_session, session_factory, project1, bot1,
+                                        manager1):
+    old = _lead(db_session, 701, project1, bot1, manager1, "closed", closed_days_ago=200)
+    recent = _lead(db_session, 702, project1, bot1, manager1, "closed", closed_days_ago=5)
+    active = _lead(db_session, 703, project1, bot1, manager1, "in_progress")
+
+    totals = archive_closed_leads(session_factory, older_than_days=90, batch_size=1)
+    assert totals["leads"] == 1
+    assert totals["messages"] == 4
+
+    db_session.expire_all()
+    assert db_session.query(Message).filter(Message.lead_id == old.id).count() == 0
+    assert db_session.query(Message).filter(Message.lead_id == recent.id).count() == 4
+    assert db_session.query(Message).filter(Message.lead_id == active.id).count() == 4
+    assert db_session.get(MessageArchive, old.id).message_count == 4
+
+    # Повторный запуск ничего не делает
+    assert archive_closed_leads(session_factory, older_than_days=90)["leads"] == 0
+
+
+def test_archive_appends_late_messages(db_session, project1, bot1, manager1):
+    lead = _lead(db_session, 704, project1, bot1, manager1, "closed", closed_days_ago=200)
+    archive_lead(db_session, lead.id)
+    db_session.add(Message(lead_id=lead.id, sender="lead", text="еще",
+                           created_at=datetime(2024, 2, 1)))
+    db_session.commit()
+
+    archive_lead(db_session, lead.id)
+    db_session.commit()
+
+    archive = db_session.get(MessageArchive, lead.id)
+    assert archive.message_count == 5
+    assert archive.last_message_at == datetime(2024, 2, 1)
+
+
+def test_archived_history_is_transparent(client, manager1_token, db_session,
+                                         project1, bot1, manager1):
+    """После архивации история и пагинация те же, что и до нее"""
+    lead = _lead(db_session, 705, project1, bot1, manager1, "closed",
+                 closed_days_ago=200, count=10)
+    headers = {"Authorization": f"Bearer {manager1_token}"}
+
+    def fetch(params=None):
+        response = client.get(f"/messages/{lead.id}", params=params, headers=headers)
+        assert response.status_code == 200
+        return [m["text"] for m in response.json()]
+
+    ids = [m.id for m in db_session.query(Message).filter(
+        Message.lead_id == lead.id).order_by(Message.id)]
+    before = [fetch(), fetch({"limit": 3}), fetch({"after_id": ids[2], "limit": 4}),
+              fetch({"before_id": ids[5], "limit": 2})]
+
+    archive_lead(db_session, lead.id)
+    db_session.commit()
+    # Часть истории снова горячая
+    db_session.add(Message(lead_id=lead.id, sender="lead", text="m10",
+                           created_at=datetime(2024, 1, 1, 12, 0, 5)))
+    db_session.commit()
+
+    assert fetch() == before[0] + ["m10"]
+    assert fetch({"limit": 3}) == ["m8", "m9", "m10"]
+    assert fetch({"after_id": ids[2], "limit": 4}) == before[2]
+    assert fetch({"before_id": ids[5], "limit": 2}) == before[3]
+    assert fetch({"after_id": ids[9]}) == ["m10"]
+
+
+def test_stats_count_archived_messages(client, admin_token, db_session,
+                                       project1, bot1, manager1):
+    lead = _lead(db_session, 706, project1, bot1, manager1, "closed", closed_days_ago=200)
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    before = client.get("/stats/overview", headers=headers).json()["total_messages"]
+
+    archive_lead(db_session, lead.id)
+    db_session.commit()
+
+    after = client.get("/stats/overview", headers=headers).json()["total_messages"]
+    assert after == before == 4
+
+
+def test_daily_stats_count_archived_messages(client, admin_token, db_session,
+                                             project1, bot1, manager1):
+    """Дневная разбивка не теряет сообщения после архивации и сходится с итогом"""
+    lead = _lead(db_session, 707, project1, bot1, manager1, "closed", closed_days_ago=200)
+    db_session.add(Message(lead_id=lead.id, sender="lead", text="m4",
+                           created_at=datetime(2024, 1, 2, 9, 0, 0)))
+    db_session.commit()
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    params = {"start_date": "2024-01-01", "end_date": "2024-01-02"}
+
+    def daily():
+        return {row["date"]: row["messages_count"] for row in
+                client.get("/stats/daily", params=params, headers=headers).json()}
+
+    def per_manager():
+        return {row["date"]: row["messages_count"] for row in
+                client.get("/stats/daily/managers", params=params, headers=headers).json()}
+
+    before = daily()
+    assert before == {"2024-01-02": 1, "2024-01-01": 4}
+    archive_lead(db_session, lead.id)
+    db_session.commit()
+    assert daily() == per_manager() == before
+
+    # Архив без счетчиков (до миграции) считается из payload
+    db_session.get(MessageArchive, lead.id).daily_counts = None
+    db_session.commit()
+    assert daily() == before
+
+
+@pytest.mark.asyncio
+async def test_partition_maintenance_runs_on_start(session_factory, monkeypatch):
+    """Секции проверяются сразу при старте, без ручного запуска CLI"""
+    import asyncio
+    from backend.app import archive
+
+    assert archive.maintain_partitions(session_factory) == []
+
+    calls = []
+    monkeypatch.setattr(archive, "maintain_partitions",
+                        lambda factory: calls.append(factory) or ["messages_y2030m01"])
+    archive.start_partition_maintenance(session_factory, interval_hours=24)
+    for _ in range(50):
+        if calls:
+            break
+        await asyncio.sleep(0.01)
+    await archive.stop_partition_maintenance()
+    assert calls == [session_factory]
+    assert archive._partitions_task is None
@@ -0,0 +1,137 @@
+# tests/test_auto_close.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+from backend.app import auto_close
+from backend.app.auto_close import close_stale_leads, project_thresholds, single_worker
+from backend.app.models import Lead
+
+
+@pytest.fixture
+def session_factory(db_session):
+    return sessionmaker(bind=db_session.get_bind())
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    from backend.app.websocket import manager as ws_manager
+
+    sent = []
+
+    async def record(manager_id, events, project_id=None):
+        sent.append((manager_id, project_id, events))
+
+    monkeypatch.setattr(ws_manager, "notify_batch", record)
+    return sent
+
+
+def _lead(db_session, chat_id, project, bot, manager, status, quiet_days):
+    updated = datetime.utcnow() - timedelta(days=quiet_days)
+    lead = Lead(telegram_chat_id=chat_id, bot_id=bot.id, project_id=project.id,
+                assigned_manager_id=manager.id, status=status,
+                created_at=updated, last_updated_at=updated)
+    db_session.add(lead)
+    db_session.commit()
+    return lead
+
+
+def test_project_thresholds(db_session, project1, project2):
+    """Автозакрытие выключено, пока проект не задал порог"""
+    assert project_thresholds(db_session) == []
+
+    project1.auto_close_after_days = 7
+    project2.auto_close_after_days = 0
+    db_session.commit()
+    assert project_thresholds(db_session) == [(project1.id, 7)]
+
+
+@pytest.mark.asyncio
+async def test_closes_only_stale_active_leads(db_session, session_factory, batches,
+                                              project1, project2, bot1, manager1, manager2):
+    project1.auto_close_after_days = 30
+    project2.auto_close_after_days = 90
+    db_session.commit()
+    stale = [_lead(db_session, 1201 + i, project1, bot1, manager, "in_progress", 40)
+             for i, manager in enumerate([manager1, manager1, manager2])]
+    fresh = _lead(db_session, 1210, project1, bot1, manager1, "new", 5)
+    closed = _lead(db_session, 1211, project1, bot1, manager1, "closed", 100)
+    # У второго проекта порог 90 дней - 40 дней тишины еще не повод
+    other = _lead(db_session, 1212, project2, bot1, manager1, "read", 40)
+
+    totals = await close_stale_leads(session_factory, batch_size=2)
+    assert totals == {"leads": 3, "chunks": 2}
+
+    db_session.expire_all()
+    assert all(lead.status == "closed" and lead.closed_at for lead in stale)
+    assert (fresh.status, other.status) == ("new", "read")
+    assert closed.closed_at is None
+
+    # Кадры по пачкам: менеджеру - только его лиды, ленте проекта - все
+    personal = [(manager_id, [e["lead_id"] for e in events])
+                for manager_id, _, events in batches if manager_id is not None]
+    assert sorted(lead_id for _, ids in personal for lead_id in ids) == sorted(
+        lead.id for lead in stale)
+    assert {manager_id for manager_id, _ in personal} == {manager1.id, manager2.id}
+    feed = [event for manager_id, project_id, events in batches
+            if manager_id is None for event in events]
+    assert {event["status"] for event in feed} == {"closed"}
+    assert len(feed) == 3
+
+    assert await close_stale_leads(session_factory) == {"leads": 0, "chunks": 0}
+
+
+@pytest.mark.asyncio
+async def test_skips_when_another_worker_runs(db_session, session_factory, batches,
+                                              project1, bot1, manager1):
+    project1.auto_close_after_days = 30
+    lead = _lead(db_session, 1220, project1, bot1, manager1, "new", 40)
+
+    with single_worker(db_session.get_bind()) as acquired:
+        assert acquired
+        assert await close_stale_leads(session_factory) is None
+
+    db_session.expire_all()
+    assert lead.status == "new"
+    assert not auto_close._local_lock.locked()
+
+
+def test_project_threshold_in_admin_api(client, admin_token, project1):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    response = client.put(f"/admin/projects/{project1.id}",
+                          json={"name": project1.name, "auto_close_after_days": 14},
+                          headers=headers)
+    assert response.json()["auto_close_after_days"] == 14
+
+    # Без поля порог не сбрасывается
+    response = client.put(f"/admin/projects/{project1.id}", json={"name": "Renamed"},
+                          headers=headers)
+    assert response.json()["auto_close_after_days"] == 14
+
+    response = client.put(f"/admin/projects/{project1.id}",
+                          json={"name": "Renamed", "auto_close_after_days": -1},
+                          headers=headers)
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_chunks_run_off_the_event_loop(db_session, session_factory, batches,
+                                             project1, bot1, manager1, monkeypatch):
+    """UPDATE ... RETURNING идет в пуле потоков, а не в потоке event loop"""
+    import threading
+
+    project1.auto_close_after_days = 30
+    db_session.commit()
+    _lead(db_session, 1250, project1, bot1, manager1, "new", 40)
+
+    threads = []
+    original = auto_close.close_chunk
+
+    def record(*args, **kwargs):
+        threads.append(threading.get_ident())
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(auto_close, "close_chunk", record)
+    assert (await close_stale_leads(session_factory, batch_size=10))["leads"] == 1
+    assert threads and threading.get_ident() not in threads
@@ -0,0 +1,128 @@
+# tests/test_broadcast.py
+
+import json
+import pytest
+from backend.app.broadcast import (InMemoryHub, InMemoryBackend,
+                                   InProcessBackend, PostgresNotifyBackend,
+                                   pack_payloads, create_backend)
+from backend.app.websocket import ConnectionManager
+from tests.test_websocket import FakeWebSocket
+
+
+@pytest.mark.asyncio
+async def test_event_reaches_socket_in_other_worker():
+    """Событие из воркера A доходит до сокета в воркере B"""
+    hub = InMemoryHub()
+    worker_a = ConnectionManager(backend=InMemoryBackend(hub))
+    worker_b = ConnectionManager(backend=InMemoryBackend(hub))
+    await worker_a.backend.start()
+    await worker_b.backend.start()
+
+    ws = FakeWebSocket()
+    await worker_b.connect(7, ws)
+
+    await worker_a.notify_new_message(3, 7, {"id": 1, "text": "Hi"})
+    await worker_b.drain()
+
+    assert len(ws.sent) == 1
+    assert ws.sent[0]["type"] == "new_message"
+    assert ws.sent[0]["lead_id"] == 3
+    assert ws.sent[0]["message"] == {"id": 1, "text": "Hi"}
+
+    await worker_b.backend.stop()
+    await worker_a.notify_new_message(3, 7, {"id": 2, "text": "Again"})
+    await worker_b.drain()
+    assert len(ws.sent) == 1
+    await worker_b.close_all()
+
+
+@pytest.mark.asyncio
+async def test_in_process_backend_is_default():
+    registry = ConnectionManager()
+    ws = FakeWebSocket()
+    await registry.connect(1, ws)
+
+    await registry.publish(1, {"type": "ping"})
+    await registry.drain()
+
+    assert isinstance(registry.backend, InProcessBackend)
+    assert [m["type"] for m in ws.sent] == ["ping"]
+    await registry.close_all()
+
+
+def test_pack_payloads_respects_notify_limit():
+    """События склеиваются в массивы, каждый не длиннее лимита"""
+    events = [json.dumps({"manager_id": i, "message": {"text": "x" * 40}})
+              for i in range(50)]
+
+    payloads = pack_payloads(events, limit=500)
+
+    assert len(payloads) > 1
+    assert all(len(p.encode("utf-8")) <= 500 for p in payloads)
+    unpacked = [e for p in payloads for e in json.loads(p)]
+    assert [e["manager_id"] for e in unpacked] == list(range(50))
+
+
+def test_pack_payloads_drops_oversized_event():
+    payloads = pack_payloads(["x" * 600, json.dumps({"a": 1})], limit=500)
+
+    assert payloads == ['[{"a": 1}]']
+
+
+def test_create_backend_rejects_unknown():
+    class FakeSettings:
+        BROADCAST_BACKEND = "carrier-pigeon"
+
+    with pytest.raises(ValueError):
+        create_backend(FakeSettings())
+
+
+@pytest.mark.asyncio
+async def test_postgres_publish_during_notify_is_flushed():
+    """Событие, опубликованное во время NOTIFY, уходит следующей пачкой"""
+    import asyncio
+    import threading
+
+    backend = PostgresNotifyBackend("postgresql://localhost/leads", batch_window=0)
+    started, release = threading.Event(), threading.Event()
+    sent = []
+
+    def slow_notify(payloads):
+        started.set()
+        release.wait(5)
+        sent.extend(payloads)
+
+    backend._notify_sync = slow_notify
+    await backend.publish({"a": 1})
+    await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+    await backend.publish({"a": 2})
+    release.set()
+    await backend._flush_task
+
+    assert sent == ['[{"a": 1}]', '[{"a": 2}]']
+    assert backend._pending == []
+
+
+@pytest.mark.asyncio
+async def test_postgres_listener_keeps_delivery_tasks():
+    """Задачи доставки живут в наборе, пока не завершатся"""
+    import asyncio
+    from types import SimpleNamespace
+
+    backend = PostgresNotifyBackend("postgresql://localhost/leads")
+    received = []
+
+    async def handler(envelope):
+        received.append(envelope)
+
+    backend.set_handler(handler)
+    backend._listen_conn = SimpleNamespace(
+        poll=lambda: None,
+        notifies=[SimpleNamespace(payload='[{"a": 1}, {"a": 2}]')])
+    backend._on_readable()
+
+    assert len(backend._deliveries) == 2
+    await asyncio.gather(*backend._deliveries)
+    await asyncio.sleep(0)
+    assert received == [{"a": 1}, {"a": 2}]
+    assert backend._deliveries == set()
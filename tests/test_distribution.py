@@ -54,4 +54,30 @@ def test_only_active(db_session):
 
     for i in range(3):
         manager = get_next_manager(db_session, project.id)
-        assert manager.username == "active"
\ No newline at end of file
+        assert manager.username == "active"
+
+def test_gini_and_percentile():
+    from backend.app.benchmarks.distribution import gini, percentile
+
+    assert gini([10, 10, 10]) == 0
+    assert gini([0, 0, 30]) == pytest.approx(2 / 3)
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([], 99) == 0
+
+
+def test_simulation_round_robin_is_fair(tmp_path):
+    from backend.app.benchmarks.distribution import run_simulation
+
+    report = run_simulation(
+        database_url=f"sqlite:///{tmp_path / 'bench.db'}",
+        scenario="burst",
+        leads=30,
+        managers=3,
+        burst_size=10,
+        burst_gap=0
+    )
+
+    assert report["decisions"] == 30
+    assert report["fairness"]["spread"] == 0
+    assert report["fairness"]["gini"] == 0
+    assert report["latency_ms"]["p99"] >= 0
@@ -0,0 +1,77 @@
+# tests/test_fast_json.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from backend.app.archive import archive_lead
+from backend.app.config import settings
+from backend.app.models import Lead, Message
+
+pytest.importorskip("orjson")
+
+
+@pytest.fixture
+def conversations(db_session, project1, project2, bot1, manager1, manager2):
+    started = datetime(2024, 5, 1, 10, 0, 0, 123456)
+    leads = [
+        Lead(telegram_chat_id=1301 + i, bot_id=bot1.id, project_id=project1.id,
+             assigned_manager_id=manager, status="new", telegram_username=f"user{i}",
+             created_at=started + timedelta(minutes=i),
+             last_updated_at=started + timedelta(minutes=i))
+        for i, manager in enumerate([manager1.id, manager1.id, manager2.id])
+    ]
+    db_session.add_all(leads)
+    db_session.flush()
+    db_session.add_all([
+        Message(lead_id=leads[0].id, sender="lead" if i % 2 else "manager",
+                text=f"сообщение {i}", created_at=started + timedelta(seconds=i))
+        for i in range(6)
+    ])
+    manager1.projects.extend([project1, project2])
+    db_session.commit()
+    return leads
+
+
+def _both_paths(client, monkeypatch, url, token, params=None):
+    """Ответы обычного и быстрого пути на один и тот же запрос"""
+    headers = {"Authorization": f"Bearer {token}"}
+    responses = []
+    for fast in (False, True):
+        monkeypatch.setattr(settings, "FAST_JSON_RESPONSES", fast)
+        response = client.get(url, params=params, headers=headers)
+        assert response.status_code == 200
+        responses.append(response)
+    return responses
+
+
+def test_leads_same_json(client, monkeypatch, manager1_token, admin_token, conversations):
+    slow, fast = _both_paths(client, monkeypatch, "/leads", admin_token)
+    assert fast.json() == slow.json()
+    assert len(fast.json()) == 3
+
+    slow, fast = _both_paths(client, monkeypatch, "/leads", manager1_token, {"limit": 1})
+    assert fast.json() == slow.json()
+    assert fast.headers["X-Next-Cursor"] == slow.headers["X-Next-Cursor"]
+
+
+def test_managers_same_json(client, monkeypatch, admin_token, conversations,
+                            project1, project2):
+    slow, fast = _both_paths(client, monkeypatch, "/admin/managers", admin_token)
+    assert fast.json() == slow.json()
+    assert [[p["name"] for p in user["projects"]] for user in fast.json()
+            if user["role"] == "manager"] == [[project1.name, project2.name], []]
+
+
+def test_messages_same_json(client, monkeypatch, admin_token, db_session, conversations):
+    url = f"/messages/{conversations[0].id}"
+    slow, fast = _both_paths(client, monkeypatch, url, admin_token, {"limit": 4})
+    assert fast.json() == slow.json()
+    assert fast.headers["ETag"] == slow.headers["ETag"]
+
+    # Архив и горячие сообщения вместе
+    archive_lead(db_session, conversations[0].id)
+    db_session.add(Message(lead_id=conversations[0].id, sender="lead", text="после архива"))
+    db_session.commit()
+    slow, fast = _both_paths(client, monkeypatch, url, admin_token)
+    assert fast.json() == slow.json()
+    assert [m["text"] for m in fast.json()][-1] == "после архива"
@@ -0,0 +1,83 @@
+# tests/test_lead_search.py
+
+import pytest
+from backend.app.lead_search import like_escape, normalize_query, search_leads
+from backend.app.models import Lead
+
+
+def test_normalize_query():
+    assert normalize_query("  @IvanOv ") == "ivanov"
+    assert normalize_query("Иван   Петров") == "иван петров"
+    assert like_escape("50%_a\\b") == "50\\%\\_a\\\\b"
+
+
+@pytest.fixture
+def contacts(db_session, project1, bot1, manager1, manager2):
+    def lead(chat_id, manager, username, first_name, last_name=None):
+        return Lead(telegram_chat_id=chat_id, bot_id=bot1.id, project_id=project1.id,
+                    assigned_manager_id=manager.id, status="new",
+                    telegram_username=username, telegram_first_name=first_name,
+                    telegram_last_name=last_name)
+
+    leads = {
+        "ivanov": lead(1101, manager1, "ivanov_i", "Иван", "Петров"),
+        "petrov": lead(1102, manager1, "petya", "Пётр", "Иванович"),
+        "maria": lead(1103, manager1, None, "Мария"),
+        "foreign": lead(1104, manager2, "ivan_foreign", "Иван"),
+    }
+    db_session.add_all(leads.values())
+    db_session.commit()
+    return leads
+
+
+def test_prefix_matches_come_first(db_session, contacts):
+    ids = search_leads(db_session, "Иван", 10)
+    # Начинаются с "иван" - оба Ивана, новые сверху; "Пётр Иванович" - вхождение
+    assert ids == [contacts["foreign"].id, contacts["ivanov"].id, contacts["petrov"].id]
+
+
+def test_substring_and_full_name(db_session, contacts):
+    assert search_leads(db_session, "иван пет", 10) == [contacts["ivanov"].id]
+    assert search_leads(db_session, "АРИ", 10) == [contacts["maria"].id]
+    assert search_leads(db_session, "@petya", 10) == [contacts["petrov"].id]
+
+
+def test_short_query_is_prefix_only(db_session, contacts):
+    assert search_leads(db_session, "pe", 10) == [contacts["petrov"].id]
+    assert search_leads(db_session, "ya", 10) == []
+    assert search_leads(db_session, "%", 10) == []
+
+
+def test_other_dialects_fall_back_to_like(db_session, contacts, monkeypatch):
+    """Без FTS5 и pg_trgm поиск идет простым LIKE, порядок тот же"""
+    monkeypatch.setattr(db_session.get_bind().dialect, "name", "mysql")
+    assert search_leads(db_session, "iva", 10) == [contacts["foreign"].id,
+                                                   contacts["ivanov"].id]
+    assert search_leads(db_session, "etya", 10) == [contacts["petrov"].id]
+    assert search_leads(db_session, "ya", 10) == []
+    foreign = contacts["foreign"]
+    assert search_leads(db_session, "iva", 10,
+                        manager_id=foreign.assigned_manager_id) == [foreign.id]
+
+
+def test_search_follows_renames(db_session, contacts):
+    contacts["maria"].telegram_username = "masha"
+    db_session.commit()
+    assert search_leads(db_session, "mas", 10) == [contacts["maria"].id]
+
+    db_session.delete(contacts["maria"])
+    db_session.commit()
+    assert search_leads(db_session, "mas", 10) == []
+
+
+def test_search_endpoint_is_scoped_by_role(client, manager1_token, admin_token,
+                                           contacts):
+    response = client.get("/leads/search", params={"q": "ivan"},
+                          headers={"Authorization": f"Bearer {manager1_token}"})
+    assert response.status_code == 200
+    assert [lead["id"] for lead in response.json()] == [contacts["ivanov"].id]
+    assert response.json()[0]["project_name"]
+
+    response = client.get("/leads/search", params={"q": "ivan", "limit": 1},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert [lead["id"] for lead in response.json()] == [contacts["foreign"].id]
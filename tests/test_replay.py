@@ -0,0 +1,146 @@
+# tests/test_replay.py
+
+import pytest
+from datetime import datetime
+from sqlalchemy.orm import sessionmaker
+from backend.app.replay import EventIdGenerator, ReplayBuffer, DatabaseSpill
+from backend.app.websocket import ConnectionManager
+from tests.test_websocket import FakeWebSocket
+
+
+def make_events(ids):
+    return [{"type": "new_message", "event_id": i} for i in ids]
+
+
+def test_event_ids_are_monotonic():
+    ids = EventIdGenerator()
+    values = [ids.next() for _ in range(1000)]
+    assert values == sorted(set(values))
+
+
+def test_replay_from_memory():
+    buffer = ReplayBuffer(size=5, floor=10)
+    for event in make_events([11, 12, 13]):
+        buffer.append(1, event)
+
+    assert [e["event_id"] for e in buffer.since(1, 11)] == [12, 13]
+    assert buffer.since(1, 13) == []
+    assert buffer.since(2, 11) == []
+
+
+def test_gap_too_large_without_spill():
+    """Вытесненные события без spill восстановить нельзя"""
+    buffer = ReplayBuffer(size=2, floor=10)
+    for event in make_events([11, 12, 13, 14]):
+        buffer.append(1, event)
+
+    assert buffer.since(1, 11) is None
+    assert [e["event_id"] for e in buffer.since(1, 12)] == [13, 14]
+    # since до старта воркера - тоже разрыв
+    assert buffer.since(1, 5) is None
+
+
+def test_replay_through_database_spill(engine):
+    connection = engine.connect()
+    transaction = connection.begin()
+    spill = DatabaseSpill(sessionmaker(bind=connection), batch_size=2)
+    buffer = ReplayBuffer(size=2, floor=10, spill=spill)
+
+    flush_needed = [buffer.append(1, e) for e in make_events([11, 12, 13, 14])]
+    assert flush_needed == [False, False, False, True]
+    spill.flush()
+    buffer.append(1, make_events([15])[0])
+
+    # 13 вытеснено, но еще не записано - тоже должно найтись
+    assert [e["event_id"] for e in buffer.since(1, 10)] == [11, 12, 13, 14, 15]
+    assert [e["event_id"] for e in buffer.since(1, 12)] == [13, 14, 15]
+
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.mark.asyncio
+async def test_reconnect_with_since_replays_missed_events():
+    """Переподключение с since получает пропущенные события"""
+    registry = ConnectionManager()
+    first = FakeWebSocket()
+    connection_id = await registry.connect(1, first)
+
+    await registry.notify_new_message(5, 1, {"id": 1, "text": "one"})
+    await registry.drain()
+    last_seen = first.sent[-1]["event_id"]
+    registry.disconnect(1, connection_id)
+
+    await registry.notify_new_message(5, 1, {"id": 2, "text": "two"})
+    await registry.notify_new_message(5, 1, {"id": 3, "text": "three"})
+
+    second = FakeWebSocket()
+    await registry.connect(1, second, since=last_seen)
+    await registry.drain()
+
+    assert [m["message"]["id"] for m in second.sent[:2]] == [2, 3]
+    assert second.sent[2]["type"] == "replay_complete"
+    assert second.sent[2]["last_event_id"] == second.sent[1]["event_id"]
+
+    third = FakeWebSocket()
+    await registry.connect(1, third, since=0)
+    await registry.drain()
+    assert third.sent == [{"type": "resync_required", "reason": "gap_too_large"}]
+
+    await registry.close_all()
+
+
+def test_spill_keeps_equal_event_ids_from_two_workers(engine):
+    """Одинаковый event_id у двух воркеров не роняет пачку"""
+    connection = engine.connect()
+    transaction = connection.begin()
+    factory = sessionmaker(bind=connection)
+    workers = [DatabaseSpill(factory), DatabaseSpill(factory)]
+    for worker, text in zip(workers, ["first", "second"]):
+        worker.add(1, {"type": "new_message", "event_id": 20, "text": text})
+        worker.flush()
+
+    assert [e["text"] for e in workers[0].since(1, 10, 30)] == ["first", "second"]
+
+    transaction.rollback()
+    connection.close()
+
+
+def test_spill_purge_makes_older_replay_a_gap(engine):
+    """После purge повтор из-за границы хранения - разрыв, а не дыра"""
+    from datetime import timedelta
+    from backend.app.models import RealtimeEvent
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    spill = DatabaseSpill(sessionmaker(bind=connection),
+                          retention=timedelta(minutes=10))
+    now = EventIdGenerator().next()
+    old, recent = now - 20 * 60 * 10**6, now - 60 * 10**6
+    spill.add(1, {"type": "new_message", "event_id": old})
+    spill.add(1, {"type": "new_message", "event_id": recent})
+    spill.flush()
+    connection.execute(RealtimeEvent.__table__.update()
+                       .where(RealtimeEvent.event_id == old)
+                       .values(created_at=datetime.utcnow() - timedelta(minutes=20)))
+
+    assert spill.purge(spill.retention) == 1
+    assert spill.since(1, old - 1, now) is None
+    assert [e["event_id"] for e in spill.since(1, recent - 1, now)] == [recent]
+
+    transaction.rollback()
+    connection.close()
+
+
+@pytest.mark.asyncio
+async def test_event_ids_follow_delivery_order():
+    """Событие с отстающими часами отправителя не теряется при повторе"""
+    registry = ConnectionManager()
+    await registry._deliver({"manager_id": 1, "origin": "a",
+                             "message": {"type": "new_message", "event_id": 10**18}})
+    last_seen = registry.replay.last_event_id(1)
+    await registry._deliver({"manager_id": 1, "origin": "b",
+                             "message": {"type": "new_message", "event_id": 5}})
+
+    replayed = registry.replay.since(1, last_seen)
+    assert len(replayed) == 1 and replayed[0]["event_id"] > last_seen
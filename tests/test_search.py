@@ -0,0 +1,88 @@
+# tests/test_search.py
+
+import pytest
+from backend.app.models import Lead, Message
+from backend.app.search import encode_cursor, decode_cursor, fts5_query
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(1.2345678901234e-06, 42)) == (1.2345678901234e-06, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_fts5_query_neutralizes_syntax():
+    assert fts5_query('доставка "Казань" OR') == '"доставка" """Казань""" "OR"'
+    assert fts5_query("   ") == ""
+
+
+@pytest.fixture
+def conversations(db_session, project1, bot1, manager1, manager2):
+    own = Lead(telegram_chat_id=901, bot_id=bot1.id, project_id=project1.id,
+               assigned_manager_id=manager1.id, status="new")
+    foreign = Lead(telegram_chat_id=902, bot_id=bot1.id, project_id=project1.id,
+                   assigned_manager_id=manager2.id, status="new")
+    db_session.add_all([own, foreign])
+    db_session.flush()
+    db_session.add_all([
+        Message(lead_id=own.id, sender="lead", text="Сколько стоит доставка в Казань?"),
+        Message(lead_id=own.id, sender="manager", text="Доставка бесплатная"),
+        Message(lead_id=own.id, sender="lead", text="Спасибо"),
+        Message(lead_id=own.id, sender="lead",
+                text="Доставка доставка доставка, срочно нужна доставка"),
+        Message(lead_id=foreign.id, sender="lead", text="Нужна доставка в Москву"),
+    ])
+    db_session.commit()
+    return own, foreign
+
+
+def test_search_is_scoped_by_role(client, manager1_token, admin_token,
+                                  conversations):
+    """Менеджер находит только свои лиды, админ - все"""
+    own, foreign = conversations
+
+    response = client.get("/messages/search", params={"q": "доставка"},
+                          headers={"Authorization": f"Bearer {manager1_token}"})
+    assert response.status_code == 200
+    results = response.json()
+    assert {r["lead_id"] for r in results} == {own.id}
+    assert len(results) == 3
+    # Больше совпадений - выше ранг
+    assert results[0]["snippet"].count("<mark>") == 4
+    assert results == sorted(results, key=lambda r: -r["score"])
+
+    response = client.get("/messages/search", params={"q": "доставка"},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert {r["lead_id"] for r in response.json()} == {own.id, foreign.id}
+
+
+def test_search_pages_with_cursor(client, admin_token, conversations):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    seen = []
+    cursor = None
+    while True:
+        params = {"q": "доставка", "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/messages/search", params=params, headers=headers)
+        seen.extend(r["id"] for r in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if not cursor:
+            break
+
+    assert len(seen) == 4
+    assert len(set(seen)) == 4
+
+
+def test_search_rejects_bad_cursor(client, admin_token):
+    response = client.get("/messages/search",
+                          params={"q": "x", "cursor": "garbage"},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 400
+
+
+def test_search_on_unsupported_database_is_501(client, admin_token, db_session, monkeypatch):
+    monkeypatch.setattr(db_session.get_bind().dialect, "name", "mysql")
+    response = client.get("/messages/search", params={"q": "доставка"},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 501
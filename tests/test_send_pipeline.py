@@ -0,0 +1,67 @@
+# tests/test_send_pipeline.py
+
+import asyncio
+import time
+import pytest
+from backend.app.send_pipeline import KeyedPipeline
+
+
+@pytest.mark.asyncio
+async def test_same_key_runs_in_order_other_keys_in_parallel():
+    """Внутри ключа строгий порядок, разные ключи не ждут друг друга"""
+    pipeline = KeyedPipeline()
+    done = []
+
+    async def job(key, n):
+        await asyncio.sleep(0.05)
+        done.append((key, n))
+
+    started = time.perf_counter()
+    for n in range(3):
+        for key in ("a", "b", "c"):
+            assert pipeline.submit(key, lambda key=key, n=n: job(key, n))
+    await pipeline.drain()
+    elapsed = time.perf_counter() - started
+
+    for key in ("a", "b", "c"):
+        assert [n for k, n in done if k == key] == [0, 1, 2]
+    # 3 задачи по 50 мс на ключ, ключи параллельно: ~150 мс, а не 450
+    assert elapsed < 0.35
+    assert pipeline.pending("a") == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_job_does_not_stop_queue():
+    pipeline = KeyedPipeline()
+    done = []
+
+    async def broken():
+        raise RuntimeError("telegram is down")
+
+    async def ok():
+        done.append("ok")
+
+    pipeline.submit(1, broken)
+    pipeline.submit(1, ok)
+    await pipeline.drain()
+
+    assert done == ["ok"]
+
+
+@pytest.mark.asyncio
+async def test_submit_rejects_when_queue_full():
+    pipeline = KeyedPipeline(max_pending=2)
+    gate = asyncio.Event()
+
+    async def blocked():
+        await gate.wait()
+
+    assert pipeline.submit(1, blocked)
+    await asyncio.sleep(0)  # первая задача уже выполняется
+    assert pipeline.submit(1, blocked)
+    assert pipeline.submit(1, blocked)
+    assert not pipeline.submit(1, blocked)
+    assert pipeline.submit(2, blocked)
+
+    gate.set()
+    await pipeline.drain()
@@ -0,0 +1,87 @@
+# tests/test_snapshot.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from backend.app.archive import archive_lead
+from backend.app.models import Lead, Message
+from backend.app.snapshot import lead_batches, message_batches, month_partition
+
+
+@pytest.fixture
+def history(db_session, project1, bot1, manager1):
+    leads = [
+        Lead(telegram_chat_id=901 + i, bot_id=bot1.id, project_id=project1.id,
+             assigned_manager_id=manager1.id, status="closed",
+             created_at=datetime(2024, 1 + i, 5),
+             last_updated_at=datetime(2024, 1 + i, 6))
+        for i in range(3)
+    ]
+    db_session.add_all(leads)
+    db_session.flush()
+    for lead in leads:
+        db_session.add_all([
+            Message(lead_id=lead.id, sender="lead", text="привет",
+                    created_at=lead.created_at),
+            Message(lead_id=lead.id, sender="manager", text="здравствуйте",
+                    created_at=lead.created_at + timedelta(minutes=1)),
+        ])
+    db_session.commit()
+    return leads
+
+
+def test_lead_batches_resume_from_watermark(db_session, history):
+    until = datetime.utcnow()
+    batches = list(lead_batches(db_session, None, until, batch_size=2))
+    assert [len(rows) for rows, _ in batches] == [2, 1]
+    watermark = batches[-1][1]
+
+    assert list(lead_batches(db_session, watermark, until)) == []
+
+    # Измененный лид попадает в следующий запуск
+    history[0].status = "in_progress"
+    history[0].last_updated_at = datetime(2024, 6, 1)
+    db_session.commit()
+    rows, _ = next(lead_batches(db_session, watermark, datetime.utcnow()))
+    assert [(r["id"], r["status"]) for r in rows] == [(history[0].id, "in_progress")]
+
+
+def test_message_batches_include_archive_on_first_run(db_session, history):
+    archive_lead(db_session, history[0].id)
+    db_session.commit()
+    until = datetime.utcnow()
+
+    batches = list(message_batches(db_session, None, until, batch_size=10))
+    rows = [row for batch, _ in batches for row in batch]
+    assert len(rows) == 6
+    assert {row["text_length"] for row in rows} == {6, 12}
+    assert "text" not in rows[0]
+    watermark = batches[-1][1]
+
+    db_session.add(Message(lead_id=history[1].id, sender="lead", text="еще",
+                           created_at=datetime(2024, 7, 1)))
+    db_session.commit()
+    rows = [row for batch, _ in message_batches(db_session, watermark, datetime.utcnow(),
+                                                with_text=True) for row in batch]
+    assert [row["text"] for row in rows] == ["еще"]
+
+
+def test_month_partition():
+    assert month_partition(datetime(2024, 3, 31, 23, 59)) == "month=2024-03"
+    assert month_partition(None) == "month=unknown"
+
+
+def test_write_snapshot(db_session, history, tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    from backend.app.snapshot import write_snapshot
+
+    counts = write_snapshot(db_session, str(tmp_path))
+    assert counts["leads"] == 3
+    assert counts["messages"] == 6
+
+    table = pq.read_table(tmp_path / "messages")
+    assert table.num_rows == 6
+    assert sorted(p.name for p in (tmp_path / "leads").iterdir()) == [
+        "month=2024-01", "month=2024-02", "month=2024-03"]
+
+    assert write_snapshot(db_session, str(tmp_path))["messages"] == 0
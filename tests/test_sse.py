@@ -0,0 +1,85 @@
+# tests/test_sse.py
+
+import json
+import pytest
+from backend.app.sse import event_stream, format_event
+from backend.app.websocket import ConnectionManager
+from tests.test_websocket import FakeWebSocket
+
+
+def parse(frame: str) -> dict:
+    fields = dict(line.split(": ", 1) for line in frame.strip().split("\n"))
+    fields["data"] = json.loads(fields["data"])
+    return fields
+
+
+def test_format_event():
+    frame = format_event({"type": "lead_status", "lead_id": 1, "event_id": 42})
+
+    assert frame.endswith("\n\n")
+    assert parse(frame) == {
+        "id": "42",
+        "event": "lead_status",
+        "data": {"type": "lead_status", "lead_id": 1, "event_id": 42}
+    }
+    assert not format_event({"type": "resync_required"}).startswith("id:")
+
+
+@pytest.mark.asyncio
+async def test_stream_shares_fanout_with_websocket():
+    """SSE и WebSocket одного менеджера получают одно и то же событие"""
+    registry = ConnectionManager()
+    ws = FakeWebSocket()
+    await registry.connect(1, ws)
+    stream = event_stream(registry, 1, None, keepalive=0.05)
+
+    assert await stream.__anext__() == "retry: 3000\n\n"
+    assert registry.connection_count(1) == 2
+
+    await registry.notify_new_message(10, 1, {"id": 1, "text": "Hi"})
+    frame = parse(await stream.__anext__())
+    await registry.drain()
+
+    assert frame["event"] == "new_message"
+    assert frame["data"] == ws.sent[0]
+    assert frame["id"] == str(ws.sent[0]["event_id"])
+
+    await stream.aclose()
+    assert registry.connection_count(1) == 1
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_stream_sends_keepalive_and_ends_on_disconnect():
+    registry = ConnectionManager()
+    stream = event_stream(registry, 1, None, keepalive=0.01)
+    await stream.__anext__()
+
+    assert await stream.__anext__() == ": keep-alive\n\n"
+
+    connection = registry.stats()[0]
+    assert connection["transport"] == "sse"
+    registry.disconnect(1, connection["connection_id"])
+    with pytest.raises(StopAsyncIteration):
+        await stream.__anext__()
+
+
+@pytest.mark.asyncio
+async def test_stream_resumes_from_last_event_id():
+    registry = ConnectionManager()
+    for i in range(3):
+        await registry.notify_new_message(10, 1, {"id": i})
+    first_id = registry.replay.since(1, registry.replay.floor)[0]["event_id"]
+
+    stream = event_stream(registry, 1, first_id, keepalive=1)
+    await stream.__anext__()
+    frames = [parse(await stream.__anext__()) for _ in range(3)]
+
+    assert [f["data"]["message"]["id"] for f in frames[:2]] == [1, 2]
+    assert frames[2]["event"] == "replay_complete"
+    await stream.aclose()
+
+
+def test_events_endpoint_requires_token(client):
+    assert client.get("/events").status_code == 401
+    assert client.get("/events?token=garbage").status_code == 403
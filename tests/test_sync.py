@@ -0,0 +1,176 @@
+# tests/test_sync.py
+
+import base64
+
+import pytest
+from sqlalchemy import update
+from backend.app.models import Lead, Message
+from backend.app.sync import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor((7, 42))) == (7, 42)
+    assert decode_cursor(None) == (0, 0)
+    # Курсор до row_txid - только версия
+    assert decode_cursor(base64.urlsafe_b64encode(b"v1:42").decode()) == (0, 42)
+    with pytest.raises(ValueError):
+        decode_cursor("garbage")
+
+
+def test_row_version_grows_on_every_write(db_session, project1, bot1, manager1):
+    lead = Lead(telegram_chat_id=1001, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new")
+    db_session.add(lead)
+    db_session.commit()
+    created = lead.row_version
+    assert created > 0
+
+    message = Message(lead_id=lead.id, sender="lead", text="привет")
+    db_session.add(message)
+    db_session.commit()
+    assert message.row_version > created
+
+    # Массовый UPDATE мимо ORM тоже получает новую версию
+    db_session.execute(update(Lead).where(Lead.id == lead.id).values(status="read"))
+    db_session.commit()
+    db_session.refresh(lead)
+    assert lead.row_version > message.row_version
+
+
+def _sync(client, token, cursor=None, limit=None):
+    params = {}
+    if cursor:
+        params["cursor"] = cursor
+    if limit:
+        params["limit"] = limit
+    response = client.get("/sync", params=params,
+                          headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_sync_returns_only_changes(client, manager1_token, db_session,
+                                   project1, bot1, manager1, manager2):
+    own = Lead(telegram_chat_id=1002, bot_id=bot1.id, project_id=project1.id,
+               assigned_manager_id=manager1.id, status="new")
+    foreign = Lead(telegram_chat_id=1003, bot_id=bot1.id, project_id=project1.id,
+                   assigned_manager_id=manager2.id, status="new")
+    db_session.add_all([own, foreign])
+    db_session.flush()
+    db_session.add_all([Message(lead_id=own.id, sender="lead", text="один"),
+                        Message(lead_id=foreign.id, sender="lead", text="чужое")])
+    db_session.commit()
+
+    first = _sync(client, manager1_token)
+    assert [lead["id"] for lead in first["leads"]] == [own.id]
+    assert first["leads"][0]["project_name"] == project1.name
+    assert [m["text"] for m in first["messages"]] == ["один"]
+    assert first["has_more"] is False
+
+    # Без изменений - пустой ответ и тот же курсор
+    idle = _sync(client, manager1_token, first["cursor"])
+    assert idle["leads"] == [] and idle["messages"] == []
+    assert idle["cursor"] == first["cursor"]
+
+    db_session.add(Message(lead_id=own.id, sender="lead", text="два"))
+    own.status = "in_progress"
+    foreign.status = "closed"
+    db_session.commit()
+
+    delta = _sync(client, manager1_token, first["cursor"])
+    assert [(lead["id"], lead["status"]) for lead in delta["leads"]] == [
+        (own.id, "in_progress")]
+    assert [m["text"] for m in delta["messages"]] == ["два"]
+
+
+def test_sync_pages_through_changes(client, admin_token, db_session,
+                                    project1, bot1, manager1):
+    lead = Lead(telegram_chat_id=1004, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new")
+    db_session.add(lead)
+    db_session.flush()
+    db_session.add_all([Message(lead_id=lead.id, sender="lead", text=f"m{i}")
+                        for i in range(5)])
+    db_session.commit()
+
+    texts, leads, cursor = [], [], None
+    while True:
+        page = _sync(client, admin_token, cursor, limit=2)
+        assert len(page["leads"]) + len(page["messages"]) <= 2
+        texts.extend(m["text"] for m in page["messages"])
+        leads.extend(lead["id"] for lead in page["leads"])
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            break
+
+    assert texts == [f"m{i}" for i in range(5)]
+    assert leads == [lead.id]
+
+
+def test_sync_rejects_bad_cursor(client, admin_token):
+    response = client.get("/sync", params={"cursor": "garbage"},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert response.status_code == 400
+
+
+def test_sync_without_messages(client, admin_token, db_session, project1, bot1,
+                               manager1):
+    lead = Lead(telegram_chat_id=1005, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new")
+    db_session.add(lead)
+    db_session.flush()
+    db_session.add(Message(lead_id=lead.id, sender="lead", text="привет"))
+    db_session.commit()
+
+    response = client.get("/sync", params={"include_messages": False},
+                          headers={"Authorization": f"Bearer {admin_token}"})
+    assert [l["id"] for l in response.json()["leads"]] == [lead.id]
+    assert response.json()["messages"] == []
+
+
+def test_sync_revokes_reassigned_lead(client, manager1_token, db_session,
+                                      project1, bot1, manager1, manager2):
+    """Лид, переназначенный другому, приходит в revoked, вернувшийся - в leads"""
+    lead = Lead(telegram_chat_id=1006, bot_id=bot1.id, project_id=project1.id,
+                assigned_manager_id=manager1.id, status="new")
+    db_session.add(lead)
+    db_session.commit()
+    first = _sync(client, manager1_token)
+    assert first["revoked"] == []
+
+    # Массовый UPDATE мимо ORM тоже оставляет отзыв
+    db_session.execute(update(Lead).where(Lead.id == lead.id).values(
+        assigned_manager_id=manager2.id))
+    db_session.commit()
+    delta = _sync(client, manager1_token, first["cursor"])
+    assert (delta["leads"], delta["revoked"]) == ([], [lead.id])
+
+    lead.assigned_manager_id = manager1.id
+    db_session.commit()
+    back = _sync(client, manager1_token, delta["cursor"])
+    assert ([l["id"] for l in back["leads"]], back["revoked"]) == ([lead.id], [])
+
+
+def test_sync_skips_rows_of_unfinished_transactions(client, admin_token, db_session,
+                                                    monkeypatch, project1, bot1,
+                                                    manager1):
+    """Курсор не уходит за строки транзакций не старше xmin снимка"""
+    from backend.app import sync
+
+    leads = [Lead(telegram_chat_id=1007 + i, bot_id=bot1.id, project_id=project1.id,
+                  assigned_manager_id=manager1.id, status="new") for i in range(3)]
+    db_session.add_all(leads)
+    db_session.commit()
+    # Как на PostgreSQL: у второго лида транзакция младше, но версия больше
+    for lead, txid in zip(leads, [5, 9, 6]):
+        db_session.execute(update(Lead).where(Lead.id == lead.id).values(row_txid=txid))
+    db_session.commit()
+
+    monkeypatch.setattr(sync, "settled_txid", lambda db: 8)
+    page = _sync(client, admin_token)
+    assert [l["id"] for l in page["leads"]] == [leads[0].id, leads[2].id]
+    assert decode_cursor(page["cursor"])[0] == 6
+
+    monkeypatch.setattr(sync, "settled_txid", lambda db: 10)
+    page = _sync(client, admin_token, page["cursor"])
+    assert [l["id"] for l in page["leads"]] == [leads[1].id]
@@ -150,4 +150,34 @@ async def test_handle_start_bot_not_found(db_session):
     }
 
     with pytest.raises(ValueError):
-        await handle_start_command(db_session, "nonexistent", telegram_data)
\ No newline at end of file
+        await handle_start_command(db_session, "nonexistent", telegram_data)
+
+@pytest.mark.asyncio
+async def test_conversation_summary_is_maintained(db_session, project1, bot1,
+                                                  manager1):
+    """Сводка переписки на лиде обновляется вместе со вставкой сообщений"""
+    project1.managers.append(manager1)
+    db_session.commit()
+
+    await handle_start_command(db_session, "bot1", {
+        "message": {"chat": {"id": 777}, "from": {}, "text": "/start"}
+    })
+    lead = db_session.query(Lead).filter(Lead.telegram_chat_id == 777).first()
+
+    # /start от лида + автоответ бота
+    assert lead.message_count == 2
+    assert lead.unread_count == 1
+    assert lead.last_message_sender == "manager"
+    assert lead.last_message_preview == bot1.auto_reply
+
+    await handle_incoming_message(db_session, "bot1", {
+        "message": {"chat": {"id": 777}, "text": "x" * 500}
+    })
+    db_session.refresh(lead)
+
+    assert lead.message_count == 3
+    assert lead.unread_count == 2
+    assert lead.last_message_sender == "lead"
+    assert lead.last_message_preview == "x" * 200
+    assert lead.last_message_at == db_session.query(Message).filter(
+        Message.lead_id == lead.id).order_by(Message.id.desc()).first().created_at
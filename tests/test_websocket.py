@@ -0,0 +1,424 @@
+# tests/test_websocket.py
+
+import asyncio
+import time
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.websockets import WebSocketState, WebSocketDisconnect
+from backend.app.models import User, Project, Bot, Lead
+from backend.app.websocket import ConnectionManager
+
+
+class FakeWebSocket:
+    def __init__(self, fail=False, delay=0.0):
+        self.client_state = WebSocketState.CONNECTING
+        self.sent = []
+        self.fail = fail
+        self.delay = delay
+        self.subprotocol = None
+
+    async def accept(self, subprotocol=None):
+        self.client_state = WebSocketState.CONNECTED
+        self.subprotocol = subprotocol
+
+    async def close(self, code=1000):
+        self.client_state = WebSocketState.DISCONNECTED
+        self.close_code = code
+
+    async def send_json(self, data):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("socket is broken")
+        self.sent.append(data)
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+
+@pytest.mark.asyncio
+async def test_multiple_connections_per_manager():
+    """Все вкладки менеджера получают уведомление"""
+    registry = ConnectionManager()
+    ws1, ws2 = FakeWebSocket(), FakeWebSocket()
+
+    await registry.connect(1, ws1)
+    await registry.connect(1, ws2)
+    await registry.notify_new_message(10, 1, {"id": 1, "text": "Hi"})
+    await registry.drain()
+
+    assert registry.connection_count(1) == 2
+    assert len(ws1.sent) == 1
+    assert len(ws2.sent) == 1
+    assert ws1.sent[0]["lead_id"] == 10
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_disconnect_removes_only_own_connection():
+    """Отключение одного сокета не трогает остальные"""
+    registry = ConnectionManager()
+    ws1, ws2 = FakeWebSocket(), FakeWebSocket()
+
+    first = await registry.connect(1, ws1)
+    await registry.connect(1, ws2)
+    registry.disconnect(1, first)
+    await registry.send_personal_message(1, {"type": "ping"})
+    await registry.drain()
+
+    assert registry.connection_count(1) == 1
+    assert ws1.sent == []
+    assert ws2.sent == [{"type": "ping"}]
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_failing_and_slow_sockets_are_dropped():
+    """Сломанный и зависший сокеты удаляются, живой получает сообщение"""
+    registry = ConnectionManager(send_timeout=0.05)
+    healthy = FakeWebSocket()
+    broken = FakeWebSocket(fail=True)
+    slow = FakeWebSocket(delay=1)
+
+    for ws in (healthy, broken, slow):
+        await registry.connect(1, ws)
+
+    await registry.send_personal_message(1, {"type": "ping"})
+    await registry.drain()
+
+    assert healthy.sent == [{"type": "ping"}]
+    assert registry.connection_count(1) == 1
+
+    await registry.close_all()
+    assert 1 not in registry.active_connections
+
+
+@pytest.mark.asyncio
+async def test_producer_does_not_wait_for_slow_socket():
+    """Отправка в очередь не ждет медленного клиента"""
+    registry = ConnectionManager(send_timeout=5)
+    slow = FakeWebSocket(delay=1)
+    await registry.connect(1, slow)
+
+    started = time.monotonic()
+    for i in range(10):
+        await registry.send_personal_message(1, {"n": i})
+
+    assert time.monotonic() - started < 0.5
+    assert registry.stats()[0]["high_water"] >= 9
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_overflow_downgrades_to_resync():
+    """При переполнении очереди клиент получает resync_required"""
+    registry = ConnectionManager(queue_size=3, overflow_policy="resync")
+    ws = FakeWebSocket(delay=0.05)
+    await registry.connect(1, ws)
+    await asyncio.sleep(0)
+
+    for i in range(10):
+        await registry.send_personal_message(1, {"n": i})
+    await registry.drain()
+
+    assert {"type": "resync_required"} in ws.sent
+    assert len(ws.sent) < 10
+    assert registry.stats()[0]["overflows"] > 0
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_overflow_disconnects_slow_consumer():
+    registry = ConnectionManager(queue_size=2, overflow_policy="disconnect")
+    slow = FakeWebSocket(delay=1)
+    fast = FakeWebSocket()
+    await registry.connect(1, slow)
+    await registry.connect(1, fast)
+    await asyncio.sleep(0)
+
+    for i in range(5):
+        await registry.send_personal_message(1, {"n": i})
+        await asyncio.sleep(0.01)
+    await registry.drain()
+    await asyncio.sleep(0)
+
+    assert registry.connection_count(1) == 1
+    assert len(fast.sent) == 5
+    assert slow.close_code == 4008
+    await registry.close_all()
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_ws_endpoint_keeps_both_tabs(client, manager1, manager1_token):
+    """Две вкладки одного менеджера регистрируются независимо"""
+    from backend.app.websocket import manager as ws_manager
+
+    with client.websocket_connect(f"/ws?token={manager1_token}"):
+        with client.websocket_connect(f"/ws?token={manager1_token}"):
+            assert wait_for(lambda: ws_manager.connection_count(manager1.id) == 2)
+        assert wait_for(lambda: ws_manager.connection_count(manager1.id) == 1)
+    assert wait_for(lambda: ws_manager.connection_count(manager1.id) == 0)
+
+
+class HeldWebSocket(FakeWebSocket):
+    """Сокет, который висит открытым, пока тест его не отпустит"""
+
+    def __init__(self, query_params):
+        super().__init__()
+        self.query_params = query_params
+        self.scope = {"subprotocols": []}
+        self.released = asyncio.Event()
+
+    async def receive(self):
+        await self.released.wait()
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def receive_text(self):
+        await self.released.wait()
+        raise WebSocketDisconnect(code=1000)
+
+
+@pytest.mark.asyncio
+async def test_open_sockets_do_not_pin_db_connections(engine, monkeypatch):
+    """1000 открытых сокетов не держат соединения из пула на 5 соединений"""
+    from backend.app import database
+    from backend.app.auth import create_access_token, clear_ws_auth_cache
+    from backend.app.main import websocket_endpoint
+    from backend.app.api.messages import websocket_chat
+    from backend.app.websocket import manager as ws_manager
+
+    small_engine = create_engine(str(engine.url), pool_size=5, max_overflow=0,
+                                 pool_timeout=2,
+                                 connect_args={"check_same_thread": False})
+    Session = sessionmaker(bind=small_engine)
+    monkeypatch.setattr(database, "SessionLocal", Session)
+    monkeypatch.setattr(ws_manager, "max_connections_per_manager", 1000)
+    clear_ws_auth_cache()
+
+    db = Session()
+    user = User(username="pool-test-manager", password_hash="!",
+                role="manager", full_name="Pool Test", is_active=True)
+    project = Project(name="pool-test-project")
+    db.add_all([user, project])
+    db.flush()
+    bot = Bot(identifier="pool-test-bot", name="Bot", project_id=project.id,
+              token="t", auto_reply="Hi", is_active=True)
+    db.add(bot)
+    db.flush()
+    lead = Lead(telegram_chat_id=987654321, bot_id=bot.id,
+                project_id=project.id, assigned_manager_id=user.id)
+    db.add(lead)
+    db.commit()
+    user_id, lead_id = user.id, lead.id
+    bot_id, project_id = bot.id, project.id
+    token = create_access_token({"sub": user.username})
+    db.close()
+
+    try:
+        sockets = [HeldWebSocket({"token": token}) for _ in range(1000)]
+        tasks = [
+            asyncio.create_task(websocket_endpoint(ws)) for ws in sockets[:500]
+        ] + [
+            asyncio.create_task(websocket_chat(ws, lead_id)) for ws in sockets[500:]
+        ]
+
+        deadline = time.monotonic() + 20
+        while (ws_manager.connection_count(user_id) < 1000
+               and time.monotonic() < deadline):
+            await asyncio.sleep(0.01)
+
+        assert ws_manager.connection_count(user_id) == 1000
+        assert small_engine.pool.checkedout() == 0
+        assert all(ws.client_state == WebSocketState.CONNECTED for ws in sockets)
+
+        for ws in sockets:
+            ws.released.set()
+        await asyncio.gather(*tasks)
+        assert ws_manager.connection_count(user_id) == 0
+    finally:
+        db = Session()
+        db.query(Lead).filter(Lead.id == lead_id).delete()
+        db.query(Bot).filter(Bot.id == bot_id).delete()
+        db.query(Project).filter(Project.id == project_id).delete()
+        db.query(User).filter(User.id == user_id).delete()
+        db.commit()
+        db.close()
+        small_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_reaps_silent_connections():
+    """Сокет, не отвечающий на ping, отключается; отвечающий - остается"""
+    registry = ConnectionManager()
+    silent, alive = FakeWebSocket(), FakeWebSocket()
+    await registry.connect(1, silent)
+    alive_id = await registry.connect(1, alive)
+
+    for _ in range(3):
+        registry.heartbeat(max_missed=2)
+        registry.touch(1, alive_id)
+    await registry.drain()
+    await asyncio.sleep(0.01)
+
+    assert registry.connection_count(1) == 1
+    assert silent.close_code == 4009
+    assert {"type": "ping"} in alive.sent
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_connection_cap_evicts_oldest():
+    registry = ConnectionManager(max_connections_per_manager=2)
+    sockets = [FakeWebSocket() for _ in range(3)]
+    for ws in sockets:
+        await registry.connect(1, ws)
+    await asyncio.sleep(0.01)
+
+    assert registry.connection_count(1) == 2
+    assert sockets[0].close_code == 4029
+    assert sockets[1].client_state == WebSocketState.CONNECTED
+    await registry.close_all()
+
+
+def test_coalesce_keeps_last_status_per_lead():
+    from backend.app.websocket import coalesce_events
+
+    events = [
+        {"type": "lead_status", "lead_id": 1, "status": "new"},
+        {"type": "new_message", "lead_id": 1},
+        {"type": "lead_status", "lead_id": 2, "status": "read"},
+        {"type": "lead_status", "lead_id": 1, "status": "in_progress"},
+    ]
+
+    assert coalesce_events(events) == [
+        {"type": "new_message", "lead_id": 1},
+        {"type": "lead_status", "lead_id": 2, "status": "read"},
+        {"type": "lead_status", "lead_id": 1, "status": "in_progress"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_batch_mode_sends_one_frame_per_window():
+    """В режиме батчинга события окна приходят одним кадром"""
+    registry = ConnectionManager()
+    batched, plain = FakeWebSocket(), FakeWebSocket()
+    await registry.connect(1, batched, batch_ms=50)
+    await registry.connect(1, plain)
+
+    for i in range(5):
+        await registry.notify_new_message(10, 1, {"id": i})
+    for status in ("read", "in_progress", "closed"):
+        await registry.notify_lead_status(10, 1, status)
+    await registry.drain()
+
+    assert len(batched.sent) == 1
+    frame = batched.sent[0]
+    assert frame["type"] == "batch"
+    assert [e["type"] for e in frame["events"]] == ["new_message"] * 5 + ["lead_status"]
+    assert frame["events"][-1]["status"] == "closed"
+    assert len(plain.sent) == 8
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_project_subscribers_receive_project_events():
+    """Подписчики проекта получают события его лидов, остальные - нет"""
+    registry = ConnectionManager()
+    owner, admin, other_admin = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await registry.connect(1, owner)
+    admin_id = await registry.connect(100, admin)
+    other_id = await registry.connect(101, other_admin)
+    registry.subscribe(100, admin_id, 5)
+    registry.subscribe(101, other_id, 6)
+
+    await registry.notify_new_lead(10, 5, 1)
+    await registry.notify_new_message(10, 1, {"id": 1}, project_id=5)
+    await registry.notify_lead_status(10, 1, "read", project_id=5)
+    await registry.drain()
+
+    assert [e["type"] for e in admin.sent] == ["new_lead", "new_message", "lead_status"]
+    assert all(e["project_id"] == 5 for e in admin.sent)
+    assert [e["type"] for e in owner.sent] == ["new_message", "lead_status"]
+    assert other_admin.sent == []
+    # new_lead адресован только ленте проекта и в повтор менеджера не попадает
+    assert [e["type"] for e in registry.replay.since(1, registry.replay.floor)] == [
+        "new_message", "lead_status"]
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_project_subscription_is_not_duplicated_for_owner():
+    registry = ConnectionManager()
+    ws = FakeWebSocket()
+    connection_id = await registry.connect(1, ws)
+    registry.subscribe(1, connection_id, 5)
+
+    await registry.notify_lead_status(10, 1, "closed", project_id=5)
+    await registry.drain()
+
+    assert len(ws.sent) == 1
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_unsubscribe_and_disconnect_clean_project_index():
+    registry = ConnectionManager()
+    first, second = FakeWebSocket(), FakeWebSocket()
+    first_id = await registry.connect(100, first)
+    second_id = await registry.connect(100, second)
+    registry.subscribe(100, first_id, 5)
+    registry.subscribe(100, second_id, 5)
+    assert registry.subscriber_count(5) == 2
+
+    registry.unsubscribe(100, first_id, 5)
+    assert registry.subscriber_count(5) == 1
+    registry.disconnect(100, second_id)
+    assert registry.subscriber_count(5) == 0
+    assert 5 not in registry.project_subscribers
+    await registry.close_all()
+
+
+@pytest.mark.asyncio
+async def test_reassignment_notifies_both_managers():
+    registry = ConnectionManager()
+    old, new, admin = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+    await registry.connect(1, old)
+    await registry.connect(2, new)
+    admin_id = await registry.connect(100, admin)
+    registry.subscribe(100, admin_id, 5)
+
+    await registry.notify_lead_reassigned(10, 5, 1, 2)
+    await registry.drain()
+
+    for ws in (old, new, admin):
+        assert len(ws.sent) == 1
+        assert ws.sent[0]["type"] == "lead_reassigned"
+        assert ws.sent[0]["to_manager_id"] == 2
+    await registry.close_all()
+
+
+def test_ws_endpoint_project_subscription(client, admin_user, admin_token,
+                                          manager1_token, project1):
+    """Подписка на проект через /ws доступна только администратору"""
+    from backend.app.websocket import manager as ws_manager
+
+    with client.websocket_connect(f"/ws?token={admin_token}") as ws:
+        ws.send_json({"type": "subscribe", "project_id": project1.id})
+        assert ws.receive_json() == {"type": "subscribed", "project_id": project1.id}
+        assert ws_manager.subscriber_count(project1.id) == 1
+
+        ws.send_json({"type": "unsubscribe", "project_id": project1.id})
+        assert ws.receive_json()["type"] == "unsubscribed"
+        assert ws_manager.subscriber_count(project1.id) == 0
+
+    with client.websocket_connect(f"/ws?token={manager1_token}") as ws:
+        ws.send_json({"type": "subscribe", "project_id": project1.id})
+        assert ws.receive_json() == {"type": "error", "message": "Access denied"}
+    assert ws_manager.subscriber_count(project1.id) == 0
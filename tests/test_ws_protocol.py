@@ -0,0 +1,87 @@
+# tests/test_ws_protocol.py
+
+import msgpack
+import pytest
+from backend.app.ws_protocol import (compact, expand, negotiate, JsonCodec,
+                                     MsgpackCodec, decode_client_frame,
+                                     SUBPROTOCOL_JSON, SUBPROTOCOL_MSGPACK)
+from backend.app.websocket import ConnectionManager
+from tests.test_websocket import FakeWebSocket
+
+EVENT = {
+    "type": "new_message",
+    "lead_id": 42,
+    "event_id": 1700000000000001,
+    "message": {
+        "id": 7,
+        "sender": "lead",
+        "text": "Здравствуйте, сколько стоит доставка?",
+        "created_at": "2024-01-01T12:00:00"
+    }
+}
+
+
+def test_compact_round_trip():
+    """Короткие ключи и теги типов восстанавливаются без потерь"""
+    batch = {"type": "batch", "events": [EVENT, {"type": "lead_status",
+                                                 "lead_id": 1, "status": "in_progress"}]}
+
+    packed = compact(batch)
+
+    assert packed["t"] == 3
+    assert packed["ev"][0]["m"]["x"] == EVENT["message"]["text"]
+    assert expand(packed) == batch
+
+
+def test_msgpack_frame_is_smaller_than_json():
+    json_size = len(JsonCodec().encode(EVENT).encode("utf-8"))
+    msgpack_size = len(MsgpackCodec().encode(EVENT))
+
+    assert msgpack_size < json_size
+    assert MsgpackCodec().decode(MsgpackCodec().encode(EVENT)) == EVENT
+
+
+def test_negotiate_prefers_msgpack_and_defaults_to_json():
+    assert negotiate([SUBPROTOCOL_JSON, SUBPROTOCOL_MSGPACK])[0] == SUBPROTOCOL_MSGPACK
+    assert negotiate([SUBPROTOCOL_JSON])[0] == SUBPROTOCOL_JSON
+
+    subprotocol, codec = negotiate(["graphql-ws"])
+    assert subprotocol is None
+    assert isinstance(codec, JsonCodec)
+
+
+def test_decode_client_frame():
+    pong = msgpack.packb(compact({"type": "pong"}))
+
+    assert decode_client_frame({"bytes": pong}) == {"type": "pong"}
+    assert decode_client_frame({"text": '{"type": "pong"}'}) == {"type": "pong"}
+    assert decode_client_frame({"text": "not json"}) is None
+
+
+@pytest.mark.asyncio
+async def test_msgpack_connection_receives_binary_frames():
+    registry = ConnectionManager()
+    binary, text = FakeWebSocket(), FakeWebSocket()
+
+    await registry.connect(1, binary, subprotocols=[SUBPROTOCOL_MSGPACK])
+    await registry.connect(1, text)
+    await registry.notify_lead_status(5, 1, "closed")
+    await registry.drain()
+
+    assert binary.subprotocol == SUBPROTOCOL_MSGPACK
+    event = MsgpackCodec().decode(binary.sent[0])
+    assert event["type"] == "lead_status"
+    assert event["status"] == "closed"
+    assert text.subprotocol is None
+    assert text.sent[0] == event
+    await registry.close_all()
+
+
+def test_ws_endpoint_negotiates_msgpack(client, manager1_token):
+    """/ws принимает подпротокол и шлет бинарные кадры"""
+    with client.websocket_connect(f"/ws?token={manager1_token}&since=0",
+                                  subprotocols=[SUBPROTOCOL_MSGPACK]) as ws:
+        assert ws.accepted_subprotocol == SUBPROTOCOL_MSGPACK
+        event = MsgpackCodec().decode(ws.receive_bytes())
+        assert event == {"type": "resync_required", "reason": "gap_too_large"}
+        ws.send_bytes(MsgpackCodec().encode({"type": "pong"}))